@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+'''
+Tests for the Bloom filters of the handles on the lists of a list-of-lists
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+
+import pytest
+
+from tools.lib.bloom import BloomFilter
+from tools.lib.lists import ListOfLists, ListStats, ModerationList
+from tools.lib.list_cache import ListCache
+from tools.lib.lookup import normalize_handle
+
+COLLATERAL_DIR: str = 'tests/collateral'
+
+
+def measure_false_positives(bloom_filter: BloomFilter, queries: int
+                            ) -> float:
+    found: int = sum(
+        f'absent_{query}' in bloom_filter for query in range(queries)
+    )
+
+    return found / queries
+
+
+@pytest.mark.parametrize('false_positive_rate', [0.01, 0.001])
+def test_false_positive_rate(false_positive_rate: float) -> None:
+    keys: int = 20000
+    bloom_filter = BloomFilter(keys, false_positive_rate)
+    key: int
+    for key in range(keys):
+        bloom_filter.add(f'handle_{key}')
+
+    restored: BloomFilter = BloomFilter.from_bytes(bloom_filter.to_bytes())
+    assert len(restored) == keys
+    assert all(f'handle_{key}' in restored for key in range(keys))
+
+    # The hashes are deterministic, so the measured rate does not vary
+    # between runs
+    measured: float = measure_false_positives(restored, 100000)
+    assert measured < false_positive_rate * 1.5
+    assert restored.false_positive_rate == pytest.approx(
+        false_positive_rate, rel=0.1
+    )
+
+
+def cached_list_of_lists(cache_dir: str, filenames: list[str]
+                         ) -> tuple[ListOfLists, set[tuple[str, str]]]:
+    '''
+    Stores the lists in the cache, like ListOfLists.load() does
+
+    :returns: the list-of-lists and the (platform, handle) of the accounts
+    on the lists
+    '''
+
+    cache = ListCache(cache_dir)
+    lol = ListOfLists(os.path.join(cache_dir, 'list-of-lists.json'))
+    handles: set[tuple[str, str]] = set()
+    filename: str
+    for filename in filenames:
+        url: str = f'https://byomod.org/lists/{os.path.basename(filename)}'
+        with open(filename, 'r') as file_desc:
+            raw_list: str = file_desc.read()
+        cache.store(
+            url, raw_list, etag=None, last_modified=None, stats={}
+        )
+
+        mod_list: ModerationList = ModerationList.loads(raw_list)
+        for entry in mod_list.iter_blocks():
+            for account in entry.social_accounts:
+                handle: str | None = normalize_handle(
+                    account.handle or account.url
+                )
+                if handle:
+                    handles.add((account.platform.name, handle))
+        lol.list_of_lists.append(
+            ListStats(url=url, counters=mod_list.platform_counters())
+        )
+
+    return lol, handles
+
+
+def test_build_filters(tmp_path) -> None:
+    lol: ListOfLists
+    handles: set[tuple[str, str]]
+    lol, handles = cached_list_of_lists(
+        str(tmp_path),
+        [f'{COLLATERAL_DIR}/test-0.yaml', f'{COLLATERAL_DIR}/test-6.yaml']
+    )
+    filters: dict[str, BloomFilter] = lol.build_filters(str(tmp_path))
+    assert filters
+
+    platform: str
+    handle: str
+    for platform, handle in handles:
+        assert lol.may_list(platform, handle)
+
+    # The filters are sized from the counters of the lists
+    bloom_filter: BloomFilter
+    for platform, bloom_filter in filters.items():
+        capacity: int = sum(
+            list_stats.counters.get(platform, 0)
+            for list_stats in lol.list_of_lists
+        )
+        assert bloom_filter.bits == BloomFilter(capacity).bits
+
+    filter_dir: str = str(tmp_path / 'filters')
+    os.makedirs(filter_dir)
+    lol.save_filters(filter_dir)
+    loaded = ListOfLists(lol.filename)
+    loaded.load_filters(filter_dir)
+    assert all(
+        loaded.may_list(platform, handle) for platform, handle in handles
+    )
+
+
+def test_build_filters_without_stats(tmp_path) -> None:
+    lol: ListOfLists
+    lol, _ = cached_list_of_lists(
+        str(tmp_path), [f'{COLLATERAL_DIR}/test-6.yaml']
+    )
+    counters: dict[str, int] = lol.list_of_lists[0].counters
+    lol.list_of_lists[0].counters = {}
+    with pytest.raises(ValueError, match='do not count'):
+        lol.build_filters(str(tmp_path))
+
+    lol.list_of_lists[0].counters = counters
+    lol.list_of_lists.append(
+        ListStats(url='https://byomod.org/lists/unknown.yaml')
+    )
+    with pytest.raises(ValueError, match='not in the cache'):
+        lol.build_filters(str(tmp_path))
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+'''
+Tests for the delta feed of moderation lists
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+
+import pytest
+
+from tools.lib.lists import ModerationEntry, ModerationList
+from tools.lib.deltas import (
+    DeltaFeed,
+    ListState,
+    apply_delta,
+    list_state,
+    state_hash,
+)
+
+COLLATERAL_DIR: str = 'tests/collateral'
+
+
+def new_entry(name: str, handle: str,
+              categories: set[str] | None = None) -> ModerationEntry:
+    entry = ModerationEntry(
+        first_name=name, last_name=None, business_name=None,
+        business_type=None, languages=['en'],
+        categories=categories or {'troll'}, annotations=[], urls=[]
+    )
+    entry.add_account(
+        platform='twitter', handle=handle, url=f'https://x.com/{handle}',
+        is_primary=True
+    )
+
+    return entry
+
+
+def edit_list(mod_list: ModerationList, version: int) -> None:
+    '''
+    Adds an entry, changes an entry and removes an entry
+    '''
+
+    keys: list[str] = list(mod_list.blocks)
+    mod_list.add_block(new_entry(f'Added{version}', f'added{version}'))
+    mod_list.blocks[keys[version % len(keys)]].categories.add(
+        f'category{version}'
+    )
+    mod_list.remove_block(keys[(version * 7) % len(keys)])
+
+
+def publish_versions(feed: DeltaFeed, mod_list: ModerationList,
+                     versions: int) -> dict[int, ListState]:
+    states: dict[int, ListState] = {}
+    version: int
+    for version in range(1, versions + 1):
+        if version > 1:
+            edit_list(mod_list, version)
+        assert feed.publish(mod_list) == version
+        states[version] = list_state(mod_list)
+
+    return states
+
+
+def test_remove_block() -> None:
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+    entries: int = len(mod_list)
+    mod_list.add_block(new_entry('Jane', 'janedoe'))
+    block_key: str = list(mod_list.blocks)[-1]
+
+    removed: ModerationEntry = mod_list.remove_block(block_key)
+    assert removed.first_name == 'Jane'
+    assert len(mod_list) == entries
+    assert block_key not in mod_list.blocks
+
+    # The account is no longer indexed, so the same account gives a new
+    # entry instead of being merged into the removed one
+    mod_list.add_block(new_entry('Jane', 'janedoe', {'spam'}))
+    assert len(mod_list) == entries + 1
+    assert mod_list.blocks[block_key].categories == {'spam'}
+
+    mod_list.remove_block(block_key)
+    with pytest.raises(KeyError):
+        mod_list.remove_block(block_key)
+
+
+def test_round_trip(tmp_path) -> None:
+    '''
+    Applying the deltas to any earlier version gives the full snapshot of
+    the current version
+    '''
+
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+    feed = DeltaFeed(str(tmp_path))
+    states: dict[int, ListState] = publish_versions(feed, mod_list, 5)
+
+    assert feed.version == 5
+    assert len(feed.manifest['deltas']) == 4
+    expected: str = state_hash(feed.read_state())
+    assert expected == state_hash(list_state(mod_list))
+
+    version: int
+    state: ListState
+    for version, state in states.items():
+        updated: ListState
+        updated_version: int
+        updated, updated_version = feed.update(state, version)
+        assert updated_version == 5
+        assert state_hash(updated) == expected
+        assert updated == feed.read_state()
+
+    assert feed.verify()
+
+    # The snapshot can be loaded as a moderation list
+    snapshot: ModerationList = ModerationList.load(
+        os.path.join(str(tmp_path), feed.manifest['snapshot']['file']),
+        fmt='snapshot'
+    )
+    assert list_state(snapshot)['blocks'] == states[5]['blocks']
+
+    # A feed that is opened again continues from its manifest
+    assert DeltaFeed(str(tmp_path)).version == 5
+
+
+def test_unchanged_list(tmp_path) -> None:
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+    feed = DeltaFeed(str(tmp_path))
+    assert feed.publish(mod_list) == 1
+    mod_list.last_updated = mod_list.last_updated.replace(year=2030)
+    assert feed.publish(mod_list) == 1
+    assert feed.manifest['deltas'] == []
+
+
+def test_reordered_entries(tmp_path) -> None:
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+    feed = DeltaFeed(str(tmp_path))
+    feed.publish(mod_list)
+    base: ListState = list_state(mod_list)
+
+    # Removing an entry and adding it again moves it to the end
+    block_key: str = list(mod_list.blocks)[0]
+    mod_list.add_block(mod_list.remove_block(block_key))
+    assert feed.publish(mod_list) == 2
+
+    state: ListState
+    state, _ = feed.update(base, 1)
+    assert list(state['blocks']) == list(list_state(mod_list)['blocks'])
+
+
+def test_compact(tmp_path) -> None:
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+    feed = DeltaFeed(str(tmp_path))
+    states: dict[int, ListState] = publish_versions(feed, mod_list, 6)
+    delta_files: list[str] = [
+        delta_file['file'] for delta_file in feed.manifest['deltas']
+    ]
+
+    feed.compact(2)
+    assert len(feed.manifest['deltas']) == 2
+    assert feed.manifest['deltas'][0]['from_version'] == 1
+    assert feed.manifest['deltas'][0]['to_version'] == 5
+    assert feed.verify()
+
+    # The deltas that were combined are removed
+    assert not os.path.exists(os.path.join(str(tmp_path), delta_files[0]))
+
+    expected: str = state_hash(states[6])
+    version: int
+    for version in (1, 5, 6):
+        state: ListState
+        state, _ = feed.update(states[version], version)
+        assert state_hash(state) == expected
+
+    # Subscribers with a version in the combined deltas need the snapshot
+    with pytest.raises(ValueError):
+        feed.update(states[3], 3)
+
+
+def test_compact_added_and_removed(tmp_path) -> None:
+    '''
+    An entry that is added and removed again in the combined deltas is not
+    in the combined delta
+    '''
+
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+    feed = DeltaFeed(str(tmp_path))
+    feed.publish(mod_list)
+    base: ListState = list_state(mod_list)
+
+    mod_list.add_block(new_entry('Jane', 'janedoe'))
+    feed.publish(mod_list)
+    mod_list.remove_block(list(mod_list.blocks)[-1])
+    mod_list.add_block(new_entry('John', 'johndoe'))
+    feed.publish(mod_list)
+
+    feed.compact(1)
+    delta: dict[str, any] = feed.deltas_since(1)[0]
+    assert delta['removed'] == []
+    assert [entry['first_name'] for entry in delta['added'].values()] == [
+        'John'
+    ]
+    assert apply_delta(base, delta) == feed.read_state()
+
+
+def test_apply_delta_mismatch(tmp_path) -> None:
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+    feed = DeltaFeed(str(tmp_path))
+    states: dict[int, ListState] = publish_versions(feed, mod_list, 2)
+    delta: dict[str, any] = feed.deltas_since(1)[0]
+
+    with pytest.raises(ValueError):
+        apply_delta(states[2], delta)
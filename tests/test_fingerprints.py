@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+'''
+Tests for the fingerprints of the rows of a workbook and for adding only
+the rows that changed to a list with modlist.py --incremental
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import re
+import csv
+import sys
+import subprocess
+
+from tools.lib.lists import ModerationList
+from tools.lib.fingerprints import RowFingerprints
+
+COLLATERAL_DIR: str = 'tests/collateral'
+
+HEADER: list[str] = ['First name', 'Last name', 'Categories', 'Twitter']
+
+ROWS: list[list[str]] = [
+    ['Jane', 'Doe', 'troll', 'janedoe'],
+    ['John', 'Doe', 'spam', 'johndoe'],
+    ['Carol', 'Smith', 'troll', 'carolsmith'],
+]
+
+
+def write_csv(filename: str, rows: list[list[str]],
+              header: list[str] = HEADER) -> None:
+    with open(filename, 'w', newline='') as file_desc:
+        csv.writer(file_desc).writerows([header] + rows)
+
+
+def add_rows(filename: str, fingerprints: RowFingerprints) -> ModerationList:
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-0.yaml'
+    )
+    mod_list.add_csv(filename, fingerprints=fingerprints)
+
+    return mod_list
+
+
+def handles(mod_list: ModerationList) -> list[str]:
+    return sorted(
+        entry.get_account('twitter').handle
+        for entry in mod_list.iter_blocks()
+    )
+
+
+def test_unchanged_rows_are_skipped(tmp_path) -> None:
+    csv_file: str = str(tmp_path / 'rows.csv')
+    fingerprints_file: str = str(tmp_path / 'list.yaml.rows.json')
+    write_csv(csv_file, ROWS)
+
+    fingerprints = RowFingerprints(fingerprints_file)
+    mod_list: ModerationList = add_rows(csv_file, fingerprints)
+    assert (fingerprints.rows, fingerprints.changed_rows) == (3, 3)
+    assert len(mod_list) == 3
+    fingerprints.save()
+
+    # Only the rows that are not in the fingerprints of the previous run
+    # are added to the list
+    fingerprints = RowFingerprints(fingerprints_file)
+    mod_list = add_rows(csv_file, fingerprints)
+    assert (fingerprints.rows, fingerprints.changed_rows) == (3, 0)
+    assert len(mod_list) == 0
+    assert fingerprints.removed() == []
+
+    changed: list[list[str]] = [
+        ROWS[0], ['John', 'Doe', 'spam, troll', 'johndoe']
+    ]
+    write_csv(csv_file, changed)
+    fingerprints = RowFingerprints(fingerprints_file)
+    mod_list = add_rows(csv_file, fingerprints)
+    assert (fingerprints.rows, fingerprints.changed_rows) == (2, 1)
+    assert handles(mod_list) == ['johndoe']
+    assert next(mod_list.iter_blocks()).categories == {'spam', 'troll'}
+    assert fingerprints.removed() == ['Carol Smith (Twitter: carolsmith)']
+    fingerprints.save()
+
+    # The removed row is no longer in the saved fingerprints, so it is
+    # processed when it is added back, like the row that changed back
+    write_csv(csv_file, ROWS)
+    fingerprints = RowFingerprints(fingerprints_file)
+    mod_list = add_rows(csv_file, fingerprints)
+    assert (fingerprints.rows, fingerprints.changed_rows) == (3, 2)
+    assert handles(mod_list) == ['carolsmith', 'johndoe']
+
+
+def test_changed_columns(tmp_path) -> None:
+    csv_file: str = str(tmp_path / 'rows.csv')
+    fingerprints_file: str = str(tmp_path / 'list.yaml.rows.json')
+    write_csv(csv_file, ROWS)
+    fingerprints = RowFingerprints(fingerprints_file)
+    add_rows(csv_file, fingerprints)
+    fingerprints.save()
+
+    # With another header, the same values are in other columns
+    write_csv(
+        csv_file, [row + [''] for row in ROWS], HEADER + ['Facebook']
+    )
+    fingerprints = RowFingerprints(fingerprints_file)
+    mod_list: ModerationList = add_rows(csv_file, fingerprints)
+    assert (fingerprints.rows, fingerprints.changed_rows) == (3, 3)
+    assert len(mod_list) == 3
+
+
+def test_duplicate_identities(tmp_path) -> None:
+    fingerprints = RowFingerprints(str(tmp_path / 'rows.json'))
+    assert not fingerprints.is_unchanged('Jane Doe', ['troll'])
+    assert not fingerprints.is_unchanged('Jane Doe', ['spam'])
+    fingerprints.save()
+
+    fingerprints = RowFingerprints(str(tmp_path / 'rows.json'))
+    assert fingerprints.previous == {
+        'Jane Doe': RowFingerprints.content_hash(['troll']),
+        'Jane Doe #2': RowFingerprints.content_hash(['spam']),
+    }
+    assert fingerprints.is_unchanged('Jane Doe', ['troll'])
+    assert not fingerprints.is_unchanged('Jane Doe', ['hate'])
+    assert fingerprints.removed() == []
+
+
+def test_invalid_fingerprints(tmp_path) -> None:
+    filename: str = str(tmp_path / 'rows.json')
+    with open(filename, 'w') as file_desc:
+        file_desc.write('{"columns": ')
+
+    fingerprints = RowFingerprints(filename)
+    assert fingerprints.previous == {}
+    assert not fingerprints.is_unchanged('Jane Doe', ['troll'])
+
+
+def modlist(*args: str) -> tuple[int, int]:
+    '''
+    Runs modlist.py with --incremental
+
+    :returns: the number of new or changed rows and the number of rows
+    '''
+
+    result: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, '-m', 'tools.modlist', '--incremental', *args],
+        capture_output=True, text=True, check=True
+    )
+    match: re.Match | None = re.search(
+        r'Processed (\d+) new or changed rows out of (\d+) rows',
+        result.stderr
+    )
+    assert match, result.stderr
+
+    return int(match.group(1)), int(match.group(2))
+
+
+def test_incremental_modlist(tmp_path) -> None:
+    csv_file: str = str(tmp_path / 'rows.csv')
+    yaml_file: str = str(tmp_path / 'list.yaml')
+    write_csv(csv_file, ROWS)
+
+    assert modlist('--workbook', csv_file, '--yaml', yaml_file) == (3, 3)
+    assert os.path.exists(f'{yaml_file}.rows.json')
+    assert modlist('--workbook', csv_file, '--yaml', yaml_file) == (0, 3)
+
+    # A removed row is reported, but its entry is kept in the list
+    write_csv(csv_file, [['Jane', 'Doe', 'troll, hate', 'janedoe']])
+    result: subprocess.CompletedProcess = subprocess.run(
+        [
+            sys.executable, '-m', 'tools.modlist', '--incremental',
+            '--workbook', csv_file, '--yaml', yaml_file
+        ],
+        capture_output=True, text=True, check=True
+    )
+    assert 'Processed 1 new or changed rows out of 1 rows' in result.stderr
+    assert 'Row removed from the workbook: John Doe' in result.stderr
+    mod_list: ModerationList = ModerationList.load(yaml_file)
+    assert handles(mod_list) == ['carolsmith', 'janedoe', 'johndoe']
+    assert 'hate' in mod_list.categories
+
+
+def test_fingerprints_of_other_list(tmp_path) -> None:
+    '''
+    The fingerprints of a run are only used for the list that the rows of
+    that run were added to
+    '''
+
+    csv_file: str = str(tmp_path / 'rows.csv')
+    yaml_file: str = str(tmp_path / 'list.yaml')
+    snapshot_file: str = str(tmp_path / 'list.json')
+    write_csv(csv_file, ROWS)
+
+    assert modlist(
+        '--workbook', csv_file, '--yaml', yaml_file,
+        '--snapshot', snapshot_file
+    ) == (3, 3)
+    assert os.path.exists(f'{snapshot_file}.rows.json')
+    assert not os.path.exists(f'{yaml_file}.rows.json')
+
+    # Without the snapshot, the YAML list is loaded and the fingerprints
+    # that were kept with the snapshot are not used
+    assert modlist('--workbook', csv_file, '--yaml', yaml_file) == (3, 3)
+    assert modlist(
+        '--workbook', csv_file, '--yaml', yaml_file,
+        '--snapshot', snapshot_file
+    ) == (0, 3)
+
+    # The fingerprints of a list that no longer exists are not used for the
+    # new list that is created in its place
+    os.remove(yaml_file)
+    assert modlist('--workbook', csv_file, '--yaml', yaml_file) == (3, 3)
+    assert len(ModerationList.load(yaml_file)) == 3
+
+    # The fingerprints of a list are not used for a list with another name
+    other_file: str = str(tmp_path / 'other.yaml')
+    assert modlist('--workbook', csv_file, '--yaml', other_file) == (3, 3)
+    assert len(ModerationList.load(other_file)) == 3
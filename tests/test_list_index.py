@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+'''
+Tests for the index of the accounts on the lists of a list-of-lists
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import logging
+
+import orjson
+import pytest
+
+from tools.lib.list_index import (
+    LIST_INDEX_FORMAT,
+    LIST_INDEX_VERSION,
+    CrossListIndex,
+    ListAccounts,
+)
+
+LIST_URL: str = 'https://byomod.org/lists'
+
+
+def url(name: str) -> str:
+    return f'{LIST_URL}/{name}.yaml'
+
+
+LISTS: dict[str, ListAccounts] = {
+    'a': {
+        'twitter': {'janedoe': {'troll'}, 'johndoe': {'spam'}},
+        'youtube': {'janedoe': {'troll'}},
+    },
+    'b': {
+        'twitter': {'janedoe': {'troll', 'hate'}, 'carol': {'spam'}},
+    },
+    'c': {
+        'twitter': {'carol': ['conspiracy']},
+        'telegram': {'carol': ['conspiracy']},
+    },
+}
+
+
+def new_index(filename: str | None = None) -> CrossListIndex:
+    index = CrossListIndex(filename)
+    name: str
+    for name in ('a', 'b', 'c'):
+        index.set_list(url(name), f'hash-{name}', LISTS[name])
+
+    return index
+
+
+def test_find() -> None:
+    index: CrossListIndex = new_index()
+
+    # The categories are sorted and the lists are in the order they were
+    # added to the index
+    assert index.find('twitter', 'janedoe') == {
+        url('a'): ['troll'], url('b'): ['hate', 'troll'],
+    }
+    assert index.find('Twitter', '@JaneDoe') == index.find(
+        'twitter', 'janedoe'
+    )
+    assert index.find('twitter', 'https://x.com/carol') == {
+        url('b'): ['spam'], url('c'): ['conspiracy'],
+    }
+    assert index.find('telegram', 'carol') == {url('c'): ['conspiracy']}
+    assert index.find('youtube', 'carol') == {}
+    assert index.find('mastodon', 'janedoe') == {}
+
+
+def test_set_list() -> None:
+    index: CrossListIndex = new_index()
+    assert index.has_list(url('a'))
+    assert index.has_list(url('a'), 'hash-a')
+    assert not index.has_list(url('a'), 'hash-changed')
+    assert not index.has_list(url('d'))
+
+    # A list with new content replaces the accounts of the list, and the
+    # accounts that are no longer on any list are removed
+    index.set_list(
+        url('a'), 'hash-changed', {'twitter': {'carol': {'troll'}}}
+    )
+    assert index.has_list(url('a'), 'hash-changed')
+    assert not index.has_list(url('a'), 'hash-a')
+    assert index.find('twitter', 'janedoe') == {url('b'): ['hate', 'troll']}
+    assert index.find('twitter', 'johndoe') == {}
+    assert 'johndoe' not in index.accounts['twitter']
+    assert index.find('youtube', 'janedoe') == {}
+    assert index.find('twitter', 'carol') == {
+        url('b'): ['spam'], url('c'): ['conspiracy'], url('a'): ['troll'],
+    }
+    assert index.list_sizes() == {url('b'): 2, url('c'): 2, url('a'): 1}
+
+    index.remove_list(url('b'))
+    assert not index.has_list(url('b'))
+    assert index.find('twitter', 'janedoe') == {}
+    assert index.list_sizes() == {url('c'): 2, url('a'): 1}
+
+
+def test_overlap() -> None:
+    index: CrossListIndex = new_index()
+
+    assert index.overlap(url('a'), url('b')) == {
+        'accounts': 3, 'other_accounts': 2, 'shared': 1, 'jaccard': 0.25,
+    }
+    assert index.overlap(url('a'), url('c'))['shared'] == 0
+    assert index.overlap(url('a'), url('c'))['jaccard'] == 0.0
+    assert index.overlaps() == {
+        (url('a'), url('b')): 1, (url('b'), url('c')): 1,
+    }
+    assert index.list_sizes() == {url('a'): 3, url('b'): 2, url('c'): 2}
+
+    with pytest.raises(KeyError):
+        index.overlap(url('a'), url('d'))
+
+
+def test_save_and_load(tmp_path) -> None:
+    filename: str = str(tmp_path / 'index.json')
+    index: CrossListIndex = new_index(filename)
+    index.save()
+
+    loaded = CrossListIndex(filename)
+    assert loaded.lists == index.lists
+    assert loaded.list_ids == index.list_ids
+    assert loaded.accounts == index.accounts
+    assert loaded.find('twitter', 'janedoe') == {
+        url('a'): ['troll'], url('b'): ['hate', 'troll'],
+    }
+
+    # The lists that were removed are left out of the saved index and the
+    # other lists are renumbered
+    loaded.remove_list(url('a'))
+    loaded.save()
+    with open(filename, 'rb') as file_desc:
+        data: dict[str, any] = orjson.loads(file_desc.read())
+    assert data['format'] == LIST_INDEX_FORMAT
+    assert data['version'] == LIST_INDEX_VERSION
+    assert data['lists'] == [
+        {'url': url('b'), 'content_hash': 'hash-b'},
+        {'url': url('c'), 'content_hash': 'hash-c'},
+    ]
+    assert data['accounts']['twitter'] == {
+        'carol': {'0': ['spam'], '1': ['conspiracy']},
+        'janedoe': {'0': ['hate', 'troll']},
+    }
+
+    reloaded = CrossListIndex(filename)
+    assert reloaded.list_ids == {url('b'): 0, url('c'): 1}
+    assert reloaded.has_list(url('c'), 'hash-c')
+    assert reloaded.find('twitter', 'carol') == {
+        url('b'): ['spam'], url('c'): ['conspiracy'],
+    }
+    assert reloaded.list_sizes() == {url('b'): 2, url('c'): 2}
+
+    with pytest.raises(ValueError):
+        CrossListIndex().save()
+
+
+def test_invalid_index_file(tmp_path, caplog) -> None:
+    filename: str = str(tmp_path / 'index.json')
+    with open(filename, 'wb') as file_desc:
+        file_desc.write(orjson.dumps({'format': 'other', 'version': 1}))
+
+    with caplog.at_level(logging.WARNING):
+        index = CrossListIndex(filename)
+    assert 'it is not a list index' in caplog.text
+    assert index.lists == []
+
+    with open(filename, 'wb') as file_desc:
+        file_desc.write(b'{"format": ')
+    index = CrossListIndex(filename)
+    assert index.accounts == {}
+
+
+def test_retain() -> None:
+    index: CrossListIndex = new_index()
+
+    # The lists that are kept are numbered in the order of the URLs
+    index.retain([url('c'), url('d'), url('a')])
+    assert index.list_ids == {url('c'): 0, url('a'): 1}
+    assert [list_data['url'] for list_data in index.lists] == [
+        url('c'), url('a')
+    ]
+    assert index.find('twitter', 'janedoe') == {url('a'): ['troll']}
+    assert index.find('twitter', 'carol') == {url('c'): ['conspiracy']}
+    assert index.list_sizes() == {url('c'): 2, url('a'): 3}
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+'''
+Tests for downloading the lists of a list-of-lists, with the lists in
+tests/collateral served from memory
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import asyncio
+
+import httpx
+import orjson
+
+from tools.lib.lists import ListOfLists
+from tools.lib.list_cache import ListCache
+from tools.lib.list_index import CrossListIndex
+
+COLLATERAL_DIR: str = 'tests/collateral'
+TRUST_DIR: str = 'tests/collateral/trust'
+
+HOSTS: tuple[str, ...] = ('byomod.org', 'mirror.byomod.org')
+
+LIST_FILES: list[str] = [
+    f'{TRUST_DIR}/{name}.yaml' for name in ('root', 'a', 'b', 'c', 'd', 'e')
+] + [f'{COLLATERAL_DIR}/test-6.yaml']
+
+
+class FakeListServer:
+    def __init__(self, files: list[str],
+                 delays: dict[str, float] | None = None) -> None:
+        '''
+        Serves lists from any host, by the basename of their file, with an
+        ETag that is the hash of the content of the list
+
+        :param delays: The time to take to respond, by basename
+        '''
+
+        self.lists: dict[str, str] = {}
+        filename: str
+        for filename in files:
+            with open(filename, 'r') as file_desc:
+                self.lists[os.path.basename(filename)] = file_desc.read()
+
+        self.delays: dict[str, float] = delays or {}
+        self.requests: list[httpx.Request] = []
+        self.responses: list[int] = []
+
+        # The number of requests in progress and the highest number of
+        # requests in progress, per host
+        self.active: dict[str, int] = {}
+        self.max_active: dict[str, int] = {}
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        host: str = request.url.host
+        self.active[host] = self.active.get(host, 0) + 1
+        self.max_active[host] = max(
+            self.max_active.get(host, 0), self.active[host]
+        )
+        try:
+            name: str = os.path.basename(request.url.path)
+            await asyncio.sleep(self.delays.get(name, 0.01))
+            response: httpx.Response = self._respond(request, name)
+        finally:
+            self.active[host] -= 1
+
+        self.responses.append(response.status_code)
+
+        return response
+
+    def _respond(self, request: httpx.Request, name: str) -> httpx.Response:
+        raw_list: str | None = self.lists.get(name)
+        if raw_list is None:
+            return httpx.Response(404)
+
+        etag: str = f'"{ListCache.content_hash(raw_list)}"'
+        if request.headers.get('if-none-match') == etag:
+            return httpx.Response(304, headers={'etag': etag})
+
+        return httpx.Response(200, text=raw_list, headers={'etag': etag})
+
+
+def list_of_lists(directory: str, urls: list[str]) -> str:
+    filename: str = os.path.join(directory, 'list-of-lists.json')
+    with open(filename, 'wb') as file_desc:
+        file_desc.write(orjson.dumps([{'url': url} for url in urls]))
+
+    return filename
+
+
+def list_urls(files: list[str], host: str = HOSTS[0]) -> list[str]:
+    return [
+        f'https://{host}/lists/{os.path.basename(filename)}'
+        for filename in files
+    ]
+
+
+def load(server: FakeListServer, filename: str, **kwargs) -> ListOfLists:
+    return asyncio.run(
+        ListOfLists.load_async(
+            filename, transport=httpx.MockTransport(server.handler), **kwargs
+        )
+    )
+
+
+def stats_data(lol: ListOfLists) -> list[dict[str, any]]:
+    return [
+        list_stats.as_dict() | {
+            'sketches': {
+                platform: sketch.as_dict()
+                for platform, sketch in (list_stats.sketches or {}).items()
+            }
+        }
+        for list_stats in lol.list_of_lists
+    ]
+
+
+def test_order_and_host_limit(tmp_path) -> None:
+    '''
+    The stats are in the order of the list-of-lists, even when the lists
+    that come first take the longest to download
+    '''
+
+    urls: list[str] = list_urls(LIST_FILES) + list_urls(
+        LIST_FILES[:2], HOSTS[1]
+    ) + [f'https://{HOSTS[0]}/lists/missing.yaml']
+    delays: dict[str, float] = {
+        os.path.basename(filename): 0.1 - 0.01 * position
+        for position, filename in enumerate(LIST_FILES)
+    }
+    server = FakeListServer(LIST_FILES, delays)
+    lol: ListOfLists = load(
+        server, list_of_lists(str(tmp_path), urls), concurrency=5,
+        connections_per_host=2
+    )
+
+    # The list that was not found is left out
+    assert [list_stats.url for list_stats in lol.list_of_lists] == urls[:-1]
+    assert [list_stats.name for list_stats in lol.list_of_lists[:6]] == [
+        f'trust-{name}' for name in ('root', 'a', 'b', 'c', 'd', 'e')
+    ]
+    assert lol.list_of_lists[0].counters['twitter'] == 1
+    assert lol.list_of_lists[6].counters['twitter'] == 6
+
+    # Lists are downloaded concurrently, but not more than two at a time
+    # from a host
+    assert server.max_active == {HOSTS[0]: 2, HOSTS[1]: 2}
+    assert len(server.requests) == len(urls)
+
+
+def test_concurrency(tmp_path) -> None:
+    urls: list[str] = list_urls(LIST_FILES)
+    filename: str = list_of_lists(str(tmp_path), urls)
+
+    server = FakeListServer(LIST_FILES)
+    load(server, filename, concurrency=3, connections_per_host=10)
+    assert server.max_active == {HOSTS[0]: 3}
+
+    server = FakeListServer(LIST_FILES)
+    load(server, filename, concurrency=1)
+    assert server.max_active == {HOSTS[0]: 1}
+
+
+def test_revalidate_cached_lists(tmp_path) -> None:
+    cache_dir: str = str(tmp_path / 'cache')
+    os.makedirs(cache_dir)
+    urls: list[str] = list_urls(LIST_FILES)
+    filename: str = list_of_lists(str(tmp_path), urls)
+
+    server = FakeListServer(LIST_FILES)
+    first: ListOfLists = load(server, filename, cache_dir=cache_dir)
+    assert all(
+        'if-none-match' not in request.headers
+        for request in server.requests
+    )
+    assert server.responses == [200] * len(urls)
+
+    # The lists are revalidated with their ETag and the stats of the lists
+    # that were not modified are taken from the cache
+    server.requests = []
+    server.responses = []
+    server.lists['c.yaml'] = server.lists['c.yaml'].replace(
+        'Carol', 'Caroline'
+    )
+    second: ListOfLists = load(server, filename, cache_dir=cache_dir)
+    assert all(
+        'if-none-match' in request.headers for request in server.requests
+    )
+    assert sorted(server.responses) == [200] + [304] * (len(urls) - 1)
+    assert stats_data(second) == stats_data(first)
+
+    cache = ListCache(cache_dir)
+    with open(cache.body_path(urls[3]), 'r') as file_desc:
+        assert 'Caroline' in file_desc.read()
+    assert cache.get(urls[3]).content_hash == ListCache.content_hash(
+        server.lists['c.yaml']
+    )
+
+
+def test_index_cached_lists(tmp_path) -> None:
+    '''
+    Lists that were not modified are parsed again if the index does not
+    have their accounts
+    '''
+
+    cache_dir: str = str(tmp_path / 'cache')
+    os.makedirs(cache_dir)
+    urls: list[str] = list_urls(LIST_FILES)
+    filename: str = list_of_lists(str(tmp_path), urls)
+
+    server = FakeListServer(LIST_FILES)
+    load(server, filename, cache_dir=cache_dir)
+
+    index = CrossListIndex()
+    lol: ListOfLists = load(
+        server, filename, cache_dir=cache_dir, index=index
+    )
+    assert server.responses[len(urls):] == [304] * len(urls)
+    assert all(index.has_list(url) for url in urls)
+    assert index.find('twitter', 'carol') == {urls[3]: ['troll']}
+    assert lol.index is index
+
+
+def test_worker_processes(tmp_path) -> None:
+    '''
+    Lists parsed in worker processes give the same stats and index as
+    lists parsed in the threads of the event loop
+    '''
+
+    urls: list[str] = list_urls(LIST_FILES)
+    filename: str = list_of_lists(str(tmp_path), urls)
+
+    threads_index = CrossListIndex()
+    threads: ListOfLists = load(
+        FakeListServer(LIST_FILES), filename, index=threads_index,
+        sketches=True
+    )
+    workers_index = CrossListIndex()
+    workers: ListOfLists = load(
+        FakeListServer(LIST_FILES), filename, workers=2,
+        index=workers_index, sketches=True
+    )
+
+    assert stats_data(workers) == stats_data(threads)
+    assert all(list_stats.sketches for list_stats in workers.list_of_lists)
+    assert workers_index.lists == threads_index.lists
+    assert workers_index.accounts == threads_index.accounts
@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+
+'''
+Tests for moderation lists and their entries
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import zipfile
+import warnings
+
+import pytest
+
+from datetime import UTC
+from datetime import datetime
+
+from ruamel.yaml import YAML
+
+from openpyxl import load_workbook
+from openpyxl.cell.cell import MergedCell
+from openpyxl.worksheet.hyperlink import Hyperlink
+
+from tools.lib.lists import (
+    AccountStat,
+    ListStats,
+    ModerationEntry,
+    ModerationList,
+    SocialAccount,
+    parse_list,
+)
+
+COLLATERAL_DIR: str = 'tests/collateral'
+EXCEL_FILE: str = f'{COLLATERAL_DIR}/content-moderation-excel.xlsx'
+
+# Entries 1 and 2 share a Twitter account and are merged, entry 3 has the
+# same Twitter handle as entry 1 but a different name and is not merged,
+# and entries 4 and 5 have no accounts on the IDENTITY_PLATFORMS and are
+# merged as they have the same name
+DUPLICATES_YAML: str = '''
+meta:
+  list_name: duplicates
+  author_name: Test
+  author_email: test@byomod.org
+  author_url: https://byomod.org
+  download_url: https://byomod.org/lists/duplicates.yaml
+  last_updated: 2024-07-01T00:00:00+00:00
+  categories:
+    troll: Trolls
+block_list:
+- first_name: Jane
+  last_name: Doe
+  categories: [troll]
+  languages: [en]
+  urls: []
+  social_accounts:
+  - {platform: Twitter, handle: janedoe, url: 'https://x.com/janedoe'}
+  - {platform: YouTube, handle: janedoe, url: null}
+- first_name: Jane
+  categories: [spam]
+  languages: [en]
+  urls: []
+  social_accounts:
+  - {platform: Twitter, handle: janedoe, url: 'https://x.com/janedoe'}
+  - {platform: Twitter, handle: janedoe2, url: 'https://x.com/janedoe2'}
+  - {platform: Telegram, handle: janedoe, url: null}
+- first_name: John
+  last_name: Doe
+  languages: [en]
+  urls: []
+  social_accounts:
+  - {platform: Twitter, handle: janedoe, url: 'https://x.com/johndoe'}
+- business_name: Doe Inc
+  languages: [en]
+  urls: []
+  social_accounts:
+  - {platform: TikTok, handle: doeinc, url: null}
+- business_name: Doe Inc
+  categories: [spam]
+  languages: [en]
+  urls: []
+  social_accounts:
+  - {platform: Telegram, handle: doeinc, url: null}
+  - {platform: TikTok, handle: doeinc, url: null}
+trust_list: []
+'''
+
+
+def load_raw(raw_list: str) -> dict[str, any]:
+    return YAML(typ='safe').load(raw_list)
+
+
+def test_lazy_list_with_duplicates() -> None:
+    raw_data: dict[str, any] = load_raw(DUPLICATES_YAML)
+    eager: ModerationList = ModerationList.from_dict(raw_data)
+    assert len(eager) == 3
+
+    lazy: ModerationList = ModerationList.from_dict(
+        load_raw(DUPLICATES_YAML), lazy=True
+    )
+    assert lazy.platform_counters() == eager.platform_counters()
+    assert lazy.platform_counters()['twitter'] == 3
+    assert lazy.platform_accounts() == eager.platform_accounts()
+    assert (
+        [entry.as_dict() for entry in lazy.iter_blocks()]
+        == [entry.as_dict() for entry in eager.iter_blocks()]
+    )
+
+
+def test_lazy_list_without_duplicates() -> None:
+    eager: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+
+    lazy: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml', lazy=True
+    )
+    assert lazy.platform_counters() == eager.platform_counters()
+    assert lazy.platform_accounts() == eager.platform_accounts()
+    assert (
+        [entry.as_dict() for entry in lazy.iter_blocks()]
+        == [entry.as_dict() for entry in eager.iter_blocks()]
+    )
+
+    # The counters were taken from the raw data
+    assert lazy._pending_blocks is not None
+
+
+def test_lazy_list_unknown_platform() -> None:
+    raw_list: str = DUPLICATES_YAML.replace('Telegram', 'Friendster')
+    with pytest.raises(KeyError):
+        ModerationList.from_dict(load_raw(raw_list))
+
+    lazy: ModerationList = ModerationList.from_dict(
+        load_raw(raw_list), lazy=True
+    )
+    with pytest.raises(KeyError):
+        lazy.platform_counters()
+    with pytest.raises(KeyError):
+        lazy.platform_accounts()
+
+
+def test_social_accounts_view() -> None:
+    entry: ModerationEntry = ModerationEntry(
+        first_name='Jane', last_name='Doe', business_name=None,
+        business_type=None, languages=['en'], categories={'troll'},
+        annotations=[], urls=[]
+    )
+    account = SocialAccount('twitter', 'janedoe', 'https://x.com/janedoe')
+    entry.social_accounts.add(account)
+    entry.social_accounts.add(
+        SocialAccount('twitter', 'janedoe', 'https://x.com/janedoe')
+    )
+    entry.social_accounts.add(
+        SocialAccount('youtube', 'janedoe', None)
+    )
+
+    assert len(entry.social_accounts) == 2
+    assert account in entry.social_accounts
+    assert entry.get_account('twitter') is account
+    assert len(entry.as_dict()['social_accounts']) == 2
+
+    entry.social_accounts.discard(account)
+    assert account not in entry.social_accounts
+    assert entry.get_account('twitter') is None
+    assert [
+        account.platform.name for account in entry.social_accounts
+    ] == ['YouTube']
+
+
+def test_top_accounts() -> None:
+    mod_list: ModerationList = ModerationList.from_dict(
+        load_raw(DUPLICATES_YAML)
+    )
+    accounts: list[SocialAccount] = [
+        account
+        for entry in mod_list.blocks.values()
+        for account in entry.social_accounts
+    ]
+    for followers, account in enumerate(accounts):
+        account.account_stats.append(
+            AccountStat(timestamp=1700000000, followers=followers + 0.4)
+        )
+
+    # The float values are rounded
+    top: list[tuple[SocialAccount, int]] = mod_list.top_accounts(2)
+    assert top == [
+        (accounts[-1], len(accounts) - 1), (accounts[-2], len(accounts) - 2)
+    ]
+
+    # An earlier data point does not change the latest value and a later
+    # one is seen by the next query
+    accounts[0].account_stats.append(
+        AccountStat(timestamp=1600000000, followers=1000)
+    )
+    assert mod_list.top_accounts(1)[0][0] is accounts[-1]
+    accounts[0].account_stats.append(
+        AccountStat(timestamp=1800000000, followers=1000)
+    )
+    assert mod_list.top_accounts(1) == [(accounts[0], 1000)]
+    assert mod_list.top_accounts(1, platform='twitter') == [
+        (accounts[0], 1000)
+    ]
+    assert accounts[0].account_stats.growth() == 0
+    assert accounts[0].account_stats.growth(
+        until=datetime.fromtimestamp(1700000000, tz=UTC)
+    ) == -1000
+
+
+def test_load_omap_list(tmp_path) -> None:
+    '''
+    Lists saved by earlier versions of save() are '!!omap' documents
+    '''
+
+    filepath: str = f'{COLLATERAL_DIR}/test-6.yaml'
+    mod_list: ModerationList = ModerationList.load(filepath)
+
+    yaml = YAML(typ='safe')
+    yaml.default_flow_style = False
+    yaml.indent(mapping=2, sequence=4, offset=2)
+    yaml.explicit_start = True
+    yaml.explicit_end = True
+    yaml.allow_unicode = True
+    omap_file: str = str(tmp_path / 'omap.yaml')
+    with open(omap_file, 'w') as file_desc:
+        yaml.dump(mod_list.as_dict(), file_desc)
+    with open(omap_file) as file_desc:
+        raw_list: str = file_desc.read()
+    assert raw_list.startswith('--- !!omap')
+
+    expected: list[dict[str, any]] = [
+        entry.as_dict() for entry in mod_list.iter_blocks()
+    ]
+    omap_list: ModerationList
+    for omap_list in (
+            ModerationList.load(omap_file),
+            ModerationList.load(omap_file, lazy=True),
+            ModerationList.loads(raw_list)):
+        assert omap_list.list_name == mod_list.list_name
+        assert omap_list.categories == mod_list.categories
+        assert len(omap_list.trusts) == len(mod_list.trusts)
+        assert [
+            entry.as_dict() for entry in omap_list.iter_blocks()
+        ] == expected
+
+
+def test_entry_from_row() -> None:
+    headers: list[str] = [
+        'First name', 'Last name', 'Languages', 'Categories', 'Twitter',
+        'Twitter-2', 'YouTube'
+    ]
+    column_map: dict[str, set[int]] = ModerationList.discover_columns(
+        headers
+    )
+    assert column_map['twitter'] == {4, 5}
+
+    row: list[str | None] = [
+        'Jane', 'Doe', 'nl, en', 'troll', 'janedoe',
+        'https://x.com/janedoe2 - suspended', None
+    ]
+    entry: ModerationEntry = ModerationList.entry_from_row(
+        ModerationList.discover_row_plan(headers), row
+    )
+    assert entry.languages == {'nl', 'en'}
+    assert entry.categories == {'troll'}
+    assert entry.get_account('twitter').handle == 'janedoe'
+    assert len(entry.social_accounts) == 2
+
+    # Without a value in the languages column, the default is English
+    row[2] = None
+    assert ModerationList.entry_from_row(column_map, row).languages == {
+        'en'
+    }
+
+    mod_list: ModerationList = ModerationList.from_dict(
+        load_raw(DUPLICATES_YAML)
+    )
+    compat_entry: ModerationEntry = ModerationEntry(
+        first_name='Jane', last_name='Doe', business_name=None,
+        business_type=None, languages=['en'], categories={'troll'},
+        annotations=[], urls=[]
+    )
+    mod_list.add_social_from_row(
+        compat_entry, row, 'twitter', column_map['twitter']
+    )
+    assert [
+        (account.handle, account.is_primary, account.status)
+        for account in sorted(
+            compat_entry.social_accounts, key=lambda a: a.handle
+        )
+    ] == [
+        ('https://x.com/janedoe2 - suspended', False, 'suspended'),
+        ('janedoe', True, 'active'),
+    ]
+
+
+def test_add_csv_workers(tmp_path) -> None:
+    '''
+    The rows of the shards are read like the rows of the sequential reader,
+    including quoted newlines and non-ASCII names
+    '''
+
+    csv_file: str = str(tmp_path / 'list.csv')
+    with open(csv_file, 'w', encoding='utf-8', newline='') as file_desc:
+        file_desc.write('First name,Last name,Categories,Twitter\r\n')
+        index: int
+        for index in range(200):
+            file_desc.write(
+                f'"Jöh\r\nn {index}",Döe,troll,johndoe{index}\r\n'
+            )
+
+    sequential: ModerationList = ModerationList.from_dict(
+        load_raw(DUPLICATES_YAML)
+    )
+    sequential.add_csv(csv_file)
+    parallel: ModerationList = ModerationList.from_dict(
+        load_raw(DUPLICATES_YAML)
+    )
+    parallel.add_csv(csv_file, workers=2)
+
+    assert len(sequential) == 203
+    assert sequential.as_dict()['block_list'] == \
+        parallel.as_dict()['block_list']
+    assert 'Jöh\r\nn 0' in [
+        entry.first_name for entry in parallel.iter_blocks()
+    ]
+
+
+def test_parse_list_sketches() -> None:
+    '''
+    The accounts and sketches of a list are only collected when asked for
+    '''
+
+    list_stats: ListStats
+    accounts: dict[str, dict[str, set[str]]] | None
+    list_stats, accounts = parse_list(
+        ListStats(url='https://byomod.org/lists/duplicates.yaml'),
+        DUPLICATES_YAML
+    )
+    assert list_stats.counters['twitter'] == 3
+    assert list_stats.sketches is None
+    assert accounts is None
+
+    list_stats, accounts = parse_list(
+        ListStats(url='https://byomod.org/lists/duplicates.yaml'),
+        DUPLICATES_YAML, sketches=True
+    )
+    assert accounts is None
+    assert sorted(list_stats.sketches) == [
+        'telegram', 'tiktok', 'twitter', 'youtube'
+    ]
+
+
+def test_top_accounts_per_list() -> None:
+    '''
+    Changes to a list only rebuild the columns of the statistics of that
+    list
+    '''
+
+    lists: list[ModerationList] = [
+        ModerationList.from_dict(load_raw(DUPLICATES_YAML))
+        for _ in range(2)
+    ]
+    mod_list: ModerationList
+    for mod_list in lists:
+        followers: int
+        account: SocialAccount
+        for followers, account in enumerate(
+                account for entry in mod_list.iter_blocks()
+                for account in entry.social_accounts):
+            account.account_stats.append(
+                AccountStat(timestamp=1700000000, followers=followers)
+            )
+
+    first: ModerationList
+    second: ModerationList
+    first, second = lists
+    top: list[tuple[SocialAccount, int]] = first.top_accounts(1)
+    columns = first._stats_columns
+
+    entry: ModerationEntry = next(second.iter_blocks())
+    account = entry.get_account('twitter')
+    account.account_stats.append(
+        AccountStat(timestamp=1800000000, followers=1000)
+    )
+    entry.add_account(
+        platform='twitter', handle='janedoe3', url='https://x.com/janedoe3',
+        is_primary=False
+    )
+    second.remove_block(list(second.blocks)[-1])
+    assert first.top_accounts(1) == top
+    assert first._stats_columns is columns
+    assert second.top_accounts(1) == [(account, 1000)]
+
+    # A data point of an account of the list rebuilds its columns
+    account = next(first.iter_blocks()).get_account('twitter')
+    account.account_stats.append(
+        AccountStat(timestamp=1800000000, followers=2000)
+    )
+    assert first.top_accounts(1) == [(account, 2000)]
+
+    # As does an account that is added to an entry of the list
+    entry = next(first.iter_blocks())
+    entry.social_accounts.add(
+        SocialAccount('youtube', 'janedoe4', None, followers=3000)
+    )
+    assert first.top_accounts(1)[0][1] == 3000
+
+    # An entry that was removed from the list no longer affects it
+    removed: ModerationEntry = first.remove_block(list(first.blocks)[0])
+    first.top_accounts(1)
+    columns = first._stats_columns
+    removed.get_account('twitter').account_stats.append(
+        AccountStat(timestamp=1900000000, followers=5000)
+    )
+    assert first._stats_columns is columns
+
+
+def new_list() -> ModerationList:
+    return ModerationList(
+        list_name='test', author_name='Test', author_email=None,
+        author_url=None, list_url=None, download_url=None, categories={},
+        last_updated=None
+    )
+
+
+def load_full_mode(filename: str) -> ModerationList:
+    '''
+    Loads a workbook like add_excel() did before it used the read-only
+    mode of openpyxl. The cells of merged cells other than the top-left
+    cell have no value, like in read-only mode.
+    '''
+
+    mod_list: ModerationList = new_list()
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', category=UserWarning)
+        workbook = load_workbook(filename=filename)
+    sheet = workbook['moderation']
+    column_map: dict[str, set[int]] = ModerationList.discover_excel_columns(
+        next(sheet.rows)
+    )
+    for row_columns in sheet.rows:
+        mod_list.add_excel_row(
+            column_map, [
+                None if isinstance(cell, MergedCell) else cell
+                for cell in row_columns
+            ]
+        )
+
+    return mod_list
+
+
+def hyperlinked_workbook(filename: str) -> None:
+    '''
+    Saves a copy of the collateral workbook with entries that have
+    hyperlinks: a link with another text than its target, a link to a
+    location in the workbook, a link to a cell of merged cells that is not
+    the top-left cell and a link for a range of cells
+    '''
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', category=UserWarning)
+        workbook = load_workbook(filename=EXCEL_FILE)
+    sheet = workbook['moderation']
+    sheet['A2'] = 'Jane'
+    sheet['F2'] = 'troll'
+    sheet['G2'] = 'janedoe'
+    sheet['H2'] = 'Jane on X'
+    sheet['H2'].hyperlink = 'https://x.com/janedoe'
+    sheet['A3'] = 'John'
+    sheet['F3'] = 'troll'
+    sheet['G3'] = 'johndoe'
+    sheet['G3'].hyperlink = Hyperlink(ref='G3', location="'Info'!A1")
+    sheet['H3'] = 'johndoe'
+    sheet['A4'] = 'Merged'
+    sheet['F4'] = 'spam'
+    sheet['H4'] = 'merged'
+    sheet['H4'].hyperlink = 'https://x.com/merged'
+    sheet.merge_cells('H4:I4')
+    sheet['A5'] = 'Range'
+    sheet['F5'] = 'troll'
+    sheet['I5'] = 'range'
+    sheet['J5'] = 'range'
+    workbook.save(filename)
+
+    # openpyxl writes links to the top-left cell of merged cells and for
+    # single cells, so the links that Excel may also write are edited in
+    with zipfile.ZipFile(filename) as archive:
+        sheet_path: str = ModerationList._excel_sheet_path(
+            archive, 'moderation'
+        )
+        contents: dict[str, bytes] = {
+            name: archive.read(name) for name in archive.namelist()
+        }
+    sheet_xml: str = contents[sheet_path].decode('utf-8')
+    assert 'ref="H4" r:id="rId2"' in sheet_xml
+    sheet_xml = sheet_xml.replace(
+        'ref="H4" r:id="rId2"', 'ref="I4" r:id="rId2"'
+    ).replace(
+        '</hyperlinks>',
+        '<hyperlink xmlns:r="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships" ref="I5:J5" r:id="rId2" />'
+        '</hyperlinks>'
+    )
+    contents[sheet_path] = sheet_xml.encode('utf-8')
+    with zipfile.ZipFile(filename, 'w') as archive:
+        for name, content in contents.items():
+            archive.writestr(name, content)
+
+
+@pytest.mark.parametrize('hyperlinks', [False, True])
+def test_add_excel(tmp_path, hyperlinks: bool) -> None:
+    '''
+    Reading a workbook in read-only mode, with the hyperlinks read from the
+    XML of the sheet, gives the same list as reading it in full mode
+    '''
+
+    filename: str = EXCEL_FILE
+    if hyperlinks:
+        filename = str(tmp_path / 'hyperlinks.xlsx')
+        hyperlinked_workbook(filename)
+
+    mod_list: ModerationList = new_list()
+    mod_list.add_excel(filename)
+    expected: ModerationList = load_full_mode(filename)
+
+    assert mod_list.as_dict()['block_list'] == \
+        expected.as_dict()['block_list']
+    assert mod_list.categories == expected.categories
+
+    if hyperlinks:
+        assert ModerationList.read_excel_hyperlinks(
+            filename, 'moderation'
+        ) == {
+            (2, 8): 'https://x.com/janedoe',
+            (3, 7): None,
+            (4, 8): 'https://x.com/merged',
+            (5, 9): 'https://x.com/merged',
+            (5, 10): 'https://x.com/merged',
+        }
+        # The target of a link replaces the text of its cell
+        entries: dict[str, ModerationEntry] = {
+            entry.first_name: entry for entry in mod_list.iter_blocks()
+        }
+        assert entries['Jane'].get_account('twitter').handle == \
+            'https://x.com/janedoe'
+        assert entries['Merged'].get_account('twitter').handle == \
+            'https://x.com/merged'
+        assert entries['John'].get_account('youtube') is None
+        assert entries['Range'].get_account('instagram').handle == \
+            'https://x.com/merged'
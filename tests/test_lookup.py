@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+'''
+Tests for the lookup tables of moderation lists
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import orjson
+
+from tools.lib.lists import ModerationEntry, ModerationList
+from tools.lib.lookup import LookupTable, normalize_handle
+
+COLLATERAL_DIR: str = 'tests/collateral'
+
+
+def test_normalize_handle() -> None:
+    assert normalize_handle('@JaneDoe - suspended') == 'janedoe'
+    assert normalize_handle('https://rumble.com/c/JaneDoe') == 'janedoe'
+    assert normalize_handle(12345) == '12345'
+    assert normalize_handle('') is None
+    assert normalize_handle(None) is None
+
+
+def test_export_lookup(tmp_path) -> None:
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+    filenames: dict[str, str] = mod_list.export_lookup(str(tmp_path))
+    table: LookupTable = LookupTable.load(filenames['twitter'])
+
+    entry: ModerationEntry
+    for entry in mod_list.iter_blocks():
+        account = entry.get_account('twitter')
+        if account:
+            assert set(entry.categories) <= set(table.get(account.handle))
+
+
+def test_many_categories(tmp_path) -> None:
+    '''
+    Lists with more categories than fit in the 31 bits of a mask
+    '''
+
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+    index: int
+    for index in range(70):
+        entry = ModerationEntry(
+            first_name=f'Jane{index}', last_name=None, business_name=None,
+            business_type=None, languages=['en'],
+            categories={f'category{index:02d}', 'troll'}, annotations=[],
+            urls=[]
+        )
+        entry.add_account(
+            platform='twitter', handle=index,
+            url=f'https://x.com/{index}', is_primary=True
+        )
+        mod_list.add_block(entry)
+
+    filenames: dict[str, str] = mod_list.export_lookup(str(tmp_path))
+    with open(filenames['twitter'], 'rb') as file_desc:
+        data: dict[str, any] = orjson.loads(file_desc.read())
+    assert data['mask_words'] == -(-len(data['categories']) // 31)
+    assert all(
+        len(words) == data['mask_words']
+        and all(0 <= word < 1 << 31 for word in words)
+        for words in data['masks']
+    )
+
+    table: LookupTable = LookupTable.load(filenames['twitter'])
+    assert sorted(table.get('69')) == ['category69', 'troll']
+    assert sorted(table.get('@0')) == ['category00', 'troll']
+    assert table.mask('unknown') == 0
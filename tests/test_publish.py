@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+'''
+Tests for publishing files with content-hashed names and compressed
+variants
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import gzip
+import shutil
+import hashlib
+import logging
+
+from typing import Callable
+
+import orjson
+import pytest
+
+from tools.lib import publish
+from tools.lib.publish import (
+    HASH_LENGTH,
+    PUBLISH_FORMAT,
+    PUBLISH_VERSION,
+    PUBLISH_MANIFEST,
+    PUBLISH_ENCODINGS,
+    Publisher,
+    PublishedFile,
+)
+
+COLLATERAL_DIR: str = 'tests/collateral'
+
+
+def decompressors() -> dict[str, Callable[[bytes], bytes]]:
+    decompress: dict[str, Callable[[bytes], bytes]] = {
+        'gzip': gzip.decompress,
+    }
+    if publish.zstandard:
+        decompress['zstd'] = publish.zstandard.ZstdDecompressor().decompress
+    if publish.brotli:
+        decompress['br'] = publish.brotli.decompress
+
+    return decompress
+
+
+def read(directory: str, file: str) -> bytes:
+    with open(os.path.join(directory, file), 'rb') as file_desc:
+        return file_desc.read()
+
+
+def read_manifest(directory: str) -> dict[str, any]:
+    return orjson.loads(read(directory, PUBLISH_MANIFEST))
+
+
+def copy_list(directory: str, list_file: str = 'test-6.yaml') -> str:
+    filename: str = os.path.join(directory, 'lists', 'list.yaml')
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    shutil.copyfile(os.path.join(COLLATERAL_DIR, list_file), filename)
+
+    return filename
+
+
+def test_publish(tmp_path) -> None:
+    directory: str = str(tmp_path / 'publish')
+    os.makedirs(directory)
+    filename: str = copy_list(str(tmp_path))
+    with open(filename, 'rb') as file_desc:
+        content: bytes = file_desc.read()
+    content_hash: str = hashlib.sha256(content).hexdigest()
+
+    publisher = Publisher(directory)
+    published: PublishedFile = publisher.publish(filename)
+
+    # The name of the published copy has the hash of its content
+    assert published.name == 'list.yaml'
+    assert published.file == f'list.{content_hash[:HASH_LENGTH]}.yaml'
+    assert published.hash == content_hash
+    assert published.size == len(content)
+    assert read(directory, published.file) == content
+
+    # Each available compression has a variant that decompresses to the
+    # content of the file
+    decompress: dict[str, Callable[[bytes], bytes]] = decompressors()
+    assert set(published.encodings) == set(decompress)
+    encoding: str
+    for encoding, data in published.encodings.items():
+        compressed: bytes = read(directory, data['file'])
+        assert data['file'].startswith(published.file)
+        assert data['size'] == len(compressed)
+        assert decompress[encoding](compressed) == content
+
+    # The compressed variants only depend on the content
+    assert published.encodings['gzip']['file'] == f'{published.file}.gz'
+    assert gzip.compress(content, compresslevel=9, mtime=0) == read(
+        directory, published.encodings['gzip']['file']
+    )
+
+    manifest: dict[str, any] = read_manifest(directory)
+    assert manifest == {
+        'format': PUBLISH_FORMAT,
+        'version': PUBLISH_VERSION,
+        'files': {
+            'list.yaml': {
+                'name': 'list.yaml',
+                'file': published.file,
+                'hash': content_hash,
+                'size': len(content),
+                'encodings': published.encodings,
+                'previous': [],
+            }
+        },
+    }
+    assert sorted(os.listdir(directory)) == sorted(
+        published.files() + [PUBLISH_MANIFEST]
+    )
+
+
+def test_publish_new_version(tmp_path) -> None:
+    directory: str = str(tmp_path / 'publish')
+    os.makedirs(directory)
+    filename: str = copy_list(str(tmp_path))
+
+    first: PublishedFile = Publisher(directory).publish(filename)
+
+    # Publishing the same content again does not change the files
+    publisher = Publisher(directory)
+    assert publisher.publish(filename) == first
+
+    # The files of the previous version are kept, those of the version
+    # before that are removed
+    second: PublishedFile = publisher.publish(
+        copy_list(str(tmp_path), 'dathes.yaml')
+    )
+    assert second.file != first.file
+    assert second.previous == first.files()
+    third: PublishedFile = publisher.publish(copy_list(str(tmp_path)))
+    assert third.file == first.file
+    assert third.previous == second.files()
+    assert sorted(os.listdir(directory)) == sorted(
+        first.files() + second.files() + [PUBLISH_MANIFEST]
+    )
+
+    manifest: dict[str, any] = read_manifest(directory)
+    assert manifest['files']['list.yaml']['file'] == first.file
+    assert manifest['files']['list.yaml']['previous'] == second.files()
+
+
+def test_missing_compression_packages(tmp_path, caplog, monkeypatch) -> None:
+    monkeypatch.setattr(publish, 'zstandard', None)
+    monkeypatch.setattr(publish, 'brotli', None)
+
+    directory: str = str(tmp_path / 'publish')
+    os.makedirs(directory)
+    with caplog.at_level(logging.WARNING):
+        publisher = Publisher(directory, encodings=PUBLISH_ENCODINGS)
+    assert 'Not publishing zstd variants' in caplog.text
+    assert 'install the zstandard package' in caplog.text
+    assert 'Not publishing br variants' in caplog.text
+    assert 'install the brotli package' in caplog.text
+
+    # The variants of the available compressions are still published
+    published: PublishedFile = publisher.publish(copy_list(str(tmp_path)))
+    assert list(published.encodings) == ['gzip']
+
+    # Without the packages, asking for only gzip does not log warnings
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        Publisher(directory, encodings=('gzip',))
+    assert caplog.text == ''
+
+
+def test_invalid_arguments(tmp_path) -> None:
+    with pytest.raises(ValueError):
+        Publisher(str(tmp_path / 'missing'))
+
+    with pytest.raises(ValueError):
+        Publisher(str(tmp_path), encodings=('gzip', 'lzma'))
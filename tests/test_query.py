@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+'''
+Tests for querying the social accounts of a moderation list with a
+ListIndex, checked against a scan of all the accounts of the list
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import pytest
+
+from ruamel.yaml import YAML
+
+from tools.lib.lists import (
+    AccountStat,
+    ModerationEntry,
+    ModerationList,
+    SocialAccount,
+)
+from tools.lib.query import (
+    Annotation,
+    Category,
+    FieldIs,
+    Followers,
+    Language,
+    ListIndex,
+    Platform,
+    Predicate,
+    QueryPage,
+    Status,
+)
+
+# Entries without languages are in English
+QUERY_YAML: str = '''
+meta:
+  list_name: query
+  author_name: Test
+  author_email: test@byomod.org
+  author_url: https://byomod.org
+  download_url: https://byomod.org/lists/query.yaml
+  last_updated: 2024-07-01T00:00:00+00:00
+  categories:
+    troll: Trolls
+    spam: Spam
+    conspiracy: Conspiracies
+block_list:
+- first_name: Jane
+  last_name: Doe
+  categories: [troll]
+  languages: [en]
+  annotations: [politician]
+  urls: []
+  social_accounts:
+  - {platform: Twitter, handle: janedoe, url: 'https://x.com/janedoe'}
+  - {platform: YouTube, handle: janedoe, url: null}
+- first_name: John
+  last_name: Smith
+  categories: [spam]
+  languages: [de]
+  annotations: []
+  urls: []
+  social_accounts:
+  - {platform: Twitter, handle: johnsmith, url: null, status: suspended}
+  - {platform: Facebook, handle: johnsmith, url: null}
+- business_name: Acme
+  categories: [conspiracy, spam]
+  languages: [de, en]
+  annotations: []
+  urls: []
+  social_accounts:
+  - {platform: Twitter, handle: acme, url: null}
+  - {platform: Instagram, handle: acme, url: null, status: private}
+- first_name: Carol
+  categories: [troll, conspiracy]
+  languages: []
+  annotations: [journalist]
+  urls: []
+  social_accounts:
+  - {platform: Bluesky, handle: carol, url: null}
+  - {platform: Telegram, handle: carol, url: null}
+trust_list: []
+'''
+
+FOLLOWERS: dict[str, int] = {
+    'janedoe': 5000, 'johnsmith': 100, 'acme': 20000, 'carol': 5000,
+}
+
+AccountKey = tuple[str, str, str]
+
+
+def query_list() -> ModerationList:
+    mod_list: ModerationList = ModerationList.from_dict(
+        YAML(typ='safe').load(QUERY_YAML)
+    )
+
+    # Only the Twitter and Bluesky accounts have a follower count
+    entry: ModerationEntry
+    for entry in mod_list.iter_blocks():
+        account: SocialAccount
+        for account in entry.social_accounts:
+            if account.platform.name in ('Twitter', 'Bluesky'):
+                account.account_stats.append(
+                    AccountStat(
+                        timestamp=1700000000,
+                        followers=FOLLOWERS[account.handle]
+                    )
+                )
+
+    return mod_list
+
+
+def scan(mod_list: ModerationList, predicate: Predicate | None
+         ) -> set[AccountKey]:
+    '''
+    Finds the accounts that match a predicate without the index
+    '''
+
+    return {
+        (block_key, account.platform.name, account.handle)
+        for block_key, entry in mod_list.blocks.items()
+        for account in entry.social_accounts
+        if predicate is None or predicate.matches(entry, account)
+    }
+
+
+def query(index: ListIndex, predicate: Predicate | None) -> set[AccountKey]:
+    page: QueryPage = index.query(predicate, limit=1000)
+    accounts: set[AccountKey] = {
+        (result.block_key, result.account.platform.name,
+         result.account.handle)
+        for result in page.results
+    }
+    assert page.total == len(accounts) == len(page.results)
+
+    return accounts
+
+
+def handles(accounts: set[AccountKey]) -> list[str]:
+    return sorted(f'{platform}/{handle}' for _, platform, handle in accounts)
+
+
+PREDICATES: list[tuple[Predicate, list[str]]] = [
+    (Category('troll'), [
+        'Bluesky/carol', 'Telegram/carol', 'Twitter/janedoe', 'YouTube/janedoe'
+    ]),
+    (Language('de'), [
+        'Facebook/johnsmith', 'Instagram/acme', 'Twitter/acme',
+        'Twitter/johnsmith'
+    ]),
+    (Language('en'), [
+        'Bluesky/carol', 'Instagram/acme', 'Telegram/carol', 'Twitter/acme',
+        'Twitter/janedoe', 'YouTube/janedoe'
+    ]),
+    (Platform('Twitter'), [
+        'Twitter/acme', 'Twitter/janedoe', 'Twitter/johnsmith'
+    ]),
+    (Status('suspended'), ['Twitter/johnsmith']),
+    (Status('private'), ['Instagram/acme']),
+    (Annotation('journalist'), ['Bluesky/carol', 'Telegram/carol']),
+    (Followers(minimum=5000), [
+        'Bluesky/carol', 'Twitter/acme', 'Twitter/janedoe'
+    ]),
+    (Followers(maximum=5000), [
+        'Bluesky/carol', 'Twitter/janedoe', 'Twitter/johnsmith'
+    ]),
+    (Followers(minimum=101, maximum=19999), [
+        'Bluesky/carol', 'Twitter/janedoe'
+    ]),
+    (Category('hate'), []),
+]
+
+
+@pytest.mark.parametrize(
+    'predicate,expected', PREDICATES,
+    ids=[repr(predicate) for predicate, _ in PREDICATES]
+)
+def test_predicate(predicate: Predicate, expected: list[str]) -> None:
+    mod_list: ModerationList = query_list()
+    index = ListIndex(mod_list)
+
+    assert handles(query(index, predicate)) == expected
+    assert query(index, predicate) == scan(mod_list, predicate)
+
+
+def test_composition() -> None:
+    mod_list: ModerationList = query_list()
+    index = ListIndex(mod_list)
+
+    predicate: Predicate = Platform('twitter') & Category('spam')
+    assert handles(query(index, predicate)) == [
+        'Twitter/acme', 'Twitter/johnsmith'
+    ]
+
+    predicate = Category('troll') | Status('private')
+    assert handles(query(index, predicate)) == [
+        'Bluesky/carol', 'Instagram/acme', 'Telegram/carol', 'Twitter/janedoe',
+        'YouTube/janedoe'
+    ]
+
+    # Accounts without a follower count do not match Followers(), so they
+    # match its negation
+    predicate = ~Followers(minimum=1000)
+    assert handles(query(index, predicate)) == [
+        'Facebook/johnsmith', 'Instagram/acme', 'Telegram/carol',
+        'Twitter/johnsmith', 'YouTube/janedoe'
+    ]
+
+    predicate = (
+        (Category('conspiracy') | Annotation('politician'))
+        & ~Language('de') & Followers(minimum=1000)
+    )
+    assert handles(query(index, predicate)) == [
+        'Bluesky/carol', 'Twitter/janedoe'
+    ]
+
+    predicates: list[Predicate] = [
+        Platform('twitter') & Status('active') & Category('spam')
+        & Language('de') & Followers(minimum=10000),
+        ~(Category('troll') | Language('de')),
+        ~~Category('spam') & ~Platform('facebook'),
+        Category('troll') & Category('spam'),
+    ]
+    for predicate in predicates:
+        assert query(index, predicate) == scan(mod_list, predicate)
+
+    assert query(index, None) == scan(mod_list, None)
+    assert len(query(index, None)) == len(index) == 8
+
+
+def test_pages() -> None:
+    index = ListIndex(query_list())
+
+    page: QueryPage = index.query(Language('en'), limit=4, sort='followers')
+    assert page.total == 6
+    assert page.next_offset == 4
+    assert [result.followers for result in page.results] == [
+        20000, 5000, 5000, None
+    ]
+    page = index.query(Language('en'), offset=4, limit=4, sort='followers')
+    assert page.next_offset is None
+    assert [result.followers for result in page.results] == [None, None]
+
+    with pytest.raises(ValueError):
+        index.query(offset=-1)
+    with pytest.raises(ValueError):
+        index.query(sort='handle')
+    with pytest.raises(ValueError):
+        FieldIs('handle', 'janedoe')
+
+
+def test_index_follows_list_changes() -> None:
+    '''
+    The results of the index are the same as those of a scan after
+    entries are merged into and removed from the list
+    '''
+
+    mod_list: ModerationList = query_list()
+    index = ListIndex(mod_list)
+    predicates: list[Predicate] = [
+        predicate for predicate, _ in PREDICATES
+    ] + [
+        Category('hate'), Language('fr'), Category('hate') & Language('de'),
+        ~Category('troll'), Platform('telegram') | Followers(minimum=1),
+    ]
+
+    def check() -> None:
+        predicate: Predicate
+        for predicate in predicates:
+            assert query(index, predicate) == scan(mod_list, predicate), \
+                repr(predicate)
+
+    # An entry that shares the Twitter account of Jane is merged into her
+    # entry, and the accounts of her entry get its category and language
+    entry = ModerationEntry(
+        first_name='Jane', last_name=None, business_name=None,
+        business_type=None, languages=['fr'], categories={'hate'},
+        annotations=[], urls=[]
+    )
+    entry.add_account(
+        platform='twitter', handle='janedoe', url='https://x.com/janedoe'
+    )
+    entry.add_account(platform='telegram', handle='janedoe', url=None)
+    mod_list.add_block(entry)
+    assert len(mod_list) == 4
+    assert handles(query(index, Category('hate'))) == [
+        'Telegram/janedoe', 'Twitter/janedoe', 'YouTube/janedoe'
+    ]
+    check()
+
+    # An entry without names that shares accounts with John and with Acme
+    # merges them into the entry of John
+    entry = ModerationEntry(
+        first_name=None, last_name=None, business_name=None,
+        business_type=None, languages=['de'], categories={'hate'},
+        annotations=[], urls=[]
+    )
+    entry.add_account(platform='facebook', handle='johnsmith', url=None)
+    entry.add_account(platform='instagram', handle='acme', url=None)
+    mod_list.add_block(entry)
+    assert len(mod_list) == 3
+    assert handles(query(index, Category('hate') & Language('de'))) == [
+        'Facebook/johnsmith', 'Instagram/acme', 'Twitter/acme',
+        'Twitter/johnsmith'
+    ]
+    check()
+
+    # The accounts of a removed entry are no longer found
+    block_key: str = next(
+        block_key for block_key, entry in mod_list.blocks.items()
+        if entry.first_name == 'Carol'
+    )
+    mod_list.remove_block(block_key)
+    assert handles(query(index, Platform('bluesky'))) == []
+    assert handles(query(index, Followers(minimum=5000))) == [
+        'Twitter/acme', 'Twitter/janedoe'
+    ]
+    check()
+
+    # After the index is closed, it no longer follows the list
+    accounts: int = len(index)
+    index.close()
+    mod_list.remove_block(next(iter(mod_list.blocks)))
+    assert len(index) == accounts
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+'''
+Tests for the SQLite store of moderation lists
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import sqlite3
+
+from tools.lib.lists import ModerationEntry, ModerationList
+from tools.lib.store import ListStore
+
+COLLATERAL_DIR: str = 'tests/collateral'
+
+
+def read(filename: str) -> str:
+    with open(filename, 'r') as file_desc:
+        return file_desc.read()
+
+
+def unconverted(store: ListStore) -> int:
+    return store.connection.execute(
+        'SELECT COUNT(*) FROM entries WHERE yaml IS NULL'
+    ).fetchone()[0]
+
+
+def test_export_yaml(tmp_path) -> None:
+    '''
+    The YAML export from the store is the same as saving the list of the
+    store and only converts the entries that changed
+    '''
+
+    mod_list: ModerationList = ModerationList.load(
+        f'{COLLATERAL_DIR}/test-6.yaml'
+    )
+    exported: str = str(tmp_path / 'exported.yaml')
+    saved: str = str(tmp_path / 'saved.yaml')
+    with ListStore(str(tmp_path / 'list.db')) as store:
+        store.import_list(mod_list)
+        assert unconverted(store) == len(mod_list)
+
+        store.export(exported)
+        store.to_list().save(saved)
+        assert read(exported) == read(saved)
+        assert unconverted(store) == 0
+
+        entry = ModerationEntry(
+            first_name='Jane', last_name='Doe', business_name=None,
+            business_type=None, languages=['en'], categories={'troll'},
+            annotations=[], urls=[]
+        )
+        entry.add_account(
+            platform='twitter', handle='janedoe',
+            url='https://x.com/janedoe', is_primary=True
+        )
+        store.add_block(entry)
+        store.remove_block(next(store.iter_blocks())[0])
+        assert unconverted(store) == 1
+
+        store.export(exported)
+        store.to_list().save(saved)
+        assert read(exported) == read(saved)
+        assert ModerationList.load(exported).as_dict() == \
+            store.to_list().as_dict()
+
+    # A list without entries
+    with ListStore(str(tmp_path / 'empty.db')) as store:
+        store.import_list(
+            ModerationList.load(f'{COLLATERAL_DIR}/test-0.yaml')
+        )
+        store.export(exported)
+        store.to_list().save(saved)
+        assert read(exported) == read(saved)
+
+
+def test_store_without_yaml_column(tmp_path) -> None:
+    '''
+    Stores created before the YAML of the entries was kept are upgraded
+    '''
+
+    filename: str = str(tmp_path / 'list.db')
+    with ListStore(filename) as store:
+        store.import_list(
+            ModerationList.load(f'{COLLATERAL_DIR}/test-6.yaml')
+        )
+    connection = sqlite3.connect(filename)
+    connection.execute('ALTER TABLE entries DROP COLUMN yaml')
+    connection.commit()
+    connection.close()
+
+    with ListStore(filename) as store:
+        store.export(str(tmp_path / 'exported.yaml'))
+        store.to_list().save(str(tmp_path / 'saved.yaml'))
+    assert read(str(tmp_path / 'exported.yaml')) == \
+        read(str(tmp_path / 'saved.yaml'))
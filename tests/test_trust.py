@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+'''
+Tests for resolving the trust lists of moderation lists, with the lists
+in tests/collateral/trust served from memory
+
+root trusts a, b, a list that does not exist and a list that is not valid
+YAML. a trusts c and root, b trusts c and a mirror of c, c trusts d and d
+trusts e.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import asyncio
+
+import httpx
+import pytest
+
+from tools.lib.lists import ModerationList
+from tools.lib.trust import ResolvedTrust, TrustResolver
+
+TRUST_DIR: str = 'tests/collateral/trust'
+
+LIST_URL: str = 'https://byomod.org/lists'
+MIRROR_URL: str = 'https://mirror.byomod.org/lists'
+
+
+def url(name: str) -> str:
+    return f'{LIST_URL}/{name}.yaml'
+
+
+class FakeListServer:
+    def __init__(self) -> None:
+        '''
+        Serves the lists in the trust directory from the list URL and from
+        the mirror URL
+        '''
+
+        self.requests: list[str] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(str(request.url))
+        filename: str = os.path.join(
+            TRUST_DIR, os.path.basename(request.url.path)
+        )
+        if not os.path.exists(filename):
+            return httpx.Response(404)
+
+        with open(filename, 'r') as file_desc:
+            return httpx.Response(200, text=file_desc.read())
+
+    def resolver(self, **kwargs) -> TrustResolver:
+        return TrustResolver(
+            transport=httpx.MockTransport(self.handler), **kwargs
+        )
+
+
+@pytest.mark.parametrize('workers', [None, 1])
+def test_resolve(workers: int | None) -> None:
+    server = FakeListServer()
+    resolved: ResolvedTrust = asyncio.run(
+        server.resolver(workers=workers).resolve(url('root'))
+    )
+
+    assert [
+        (trusted_list.url, trusted_list.depth, trusted_list.trusted_by)
+        for trusted_list in resolved.lists
+    ] == [
+        (url('root'), 0, None),
+        (url('a'), 1, url('root')),
+        (url('b'), 1, url('root')),
+        (url('c'), 2, url('a')),
+        (f'{MIRROR_URL}/c.yaml', 2, url('b')),
+        (url('d'), 3, url('c')),
+    ]
+
+    # Only the trust relation from a back to root is a cycle, b trusting c
+    # after a did is not
+    assert resolved.cycles == [(url('a'), url('root'))]
+
+    # e is beyond the default depth of 3
+    assert resolved.skipped == [url('e')]
+    assert sorted(resolved.errors) == [url('invalid'), url('missing')]
+    assert resolved.errors[url('missing')] == 'HTTP status 404'
+
+    first_names: list[str] = sorted(
+        entry.first_name for entry in resolved.mod_list.iter_blocks()
+    )
+    assert first_names == [
+        'Alice', 'Bob', 'Carol', 'Dave', 'Root', 'Shared'
+    ]
+    block_key: str
+    for block_key, entry in resolved.mod_list.blocks.items():
+        if entry.first_name == 'Shared':
+            assert entry.categories == {'troll', 'spam'}
+            assert resolved.provenance[block_key] == [url('a'), url('b')]
+        if entry.first_name == 'Carol':
+            assert resolved.provenance[block_key] == [
+                url('c'), f'{MIRROR_URL}/c.yaml'
+            ]
+
+    # The merged list has the meta data of the root list
+    assert resolved.mod_list.list_name == 'trust-root'
+
+
+def test_budgets() -> None:
+    server = FakeListServer()
+    resolved: ResolvedTrust = asyncio.run(
+        server.resolver(max_depth=1).resolve(url('root'))
+    )
+    assert [trusted_list.url for trusted_list in resolved.lists] == [
+        url('root'), url('a'), url('b')
+    ]
+    assert resolved.skipped == [url('c'), f'{MIRROR_URL}/c.yaml']
+
+    resolved = asyncio.run(server.resolver(max_lists=2).resolve(url('root')))
+    assert [trusted_list.url for trusted_list in resolved.lists] == [
+        url('root'), url('a'), url('b')
+    ]
+    assert resolved.skipped == [
+        url('missing'), url('invalid'), url('c'), f'{MIRROR_URL}/c.yaml'
+    ]
+    assert resolved.errors == {}
+
+    resolved = asyncio.run(server.resolver(max_depth=0).resolve(url('root')))
+    assert len(resolved.lists) == 1
+    assert len(resolved.mod_list) == 1
+
+    with pytest.raises(ValueError):
+        TrustResolver(max_depth=-1)
+
+
+def test_failed_root_list() -> None:
+    server = FakeListServer()
+    with pytest.raises(ValueError):
+        asyncio.run(server.resolver().resolve(url('missing')))
+
+
+def test_parsed_lists_are_kept() -> None:
+    server = FakeListServer()
+    resolver: TrustResolver = server.resolver()
+    asyncio.run(resolver.resolve(url('root')))
+
+    # The content of c that is served from the mirror is parsed once
+    assert resolver.parse_count == 5
+    assert len(resolver.parsed) == 5
+
+    requests: int = len(server.requests)
+    resolved: ResolvedTrust = asyncio.run(resolver.resolve(url('root')))
+    assert len(server.requests) == 2 * requests
+    assert resolver.parse_count == 5
+    assert len(resolved.mod_list) == 6
+
+    # The kept lists are not changed by merging them
+    assert len(resolved.lists[0].mod_list) == 1
+
+
+def test_resolve_list() -> None:
+    server = FakeListServer()
+    mod_list: ModerationList = ModerationList.load(
+        os.path.join(TRUST_DIR, 'b.yaml')
+    )
+    resolved: ResolvedTrust = asyncio.run(
+        server.resolver().resolve_list(mod_list)
+    )
+    assert [trusted_list.url for trusted_list in resolved.lists] == [
+        url('b'), url('c'), f'{MIRROR_URL}/c.yaml', url('d'), url('e')
+    ]
+    assert resolved.cycles == []
+    assert url('b') not in server.requests
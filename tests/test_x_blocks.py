@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+'''
+Tests for importing the blocks of an X user from a fake X API
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import logging
+
+import httpx
+import orjson
+import pytest
+
+from tools.lib.lists import ModerationList
+from tools.lib.x_blocks import (
+    X_RATE_LIMIT_FALLBACK_WAIT,
+    X_RATE_LIMIT_MARGIN,
+    XBlockImporter,
+    XImportResult,
+)
+
+COLLATERAL_DIR: str = 'tests/collateral'
+
+
+class FakeXApi:
+    def __init__(self, users: int, page_size: int,
+                 window_requests: int = 15, window: float = 900.0,
+                 errors: dict[int, tuple[int, dict[str, str]]] | None = None
+                 ) -> None:
+        '''
+        Simulates the blocks/list.json endpoint of the X API on a fake
+        clock, with pages of blocked users and a rate limit of a number of
+        requests per window
+
+        :param errors: The status code and the headers of the responses to
+        send instead of a page, by the number of the request
+        '''
+
+        self.users: list[dict[str, any]] = [
+            {
+                'id_str': str(user_id), 'screen_name': f'blocked_{user_id}',
+                'name': f'Blocked {user_id}', 'followers_count': user_id,
+                'statuses_count': 10 * user_id,
+            }
+            for user_id in range(users)
+        ]
+        self.page_size: int = page_size
+        self.window_requests: int = window_requests
+        self.window: float = window
+        self.errors: dict[int, tuple[int, dict[str, str]]] = errors or {}
+
+        self.now: float = 1700000000.0
+        self.window_end: float = self.now + window
+        self.remaining: int = window_requests
+        self.requests: int = 0
+        self.cursors: list[int] = []
+        # Requests that were made while the rate limit was used up
+        self.violations: int = 0
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+    def clock(self) -> float:
+        return self.now
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.now += 0.05
+        self.requests += 1
+        if self.now >= self.window_end:
+            self.window_end = self.now + self.window
+            self.remaining = self.window_requests
+
+        if self.requests in self.errors:
+            status_code: int
+            headers: dict[str, str]
+            status_code, headers = self.errors[self.requests]
+            return httpx.Response(status_code, headers=headers)
+
+        headers = {
+            'x-rate-limit-limit': str(self.window_requests),
+            'x-rate-limit-reset': str(int(self.window_end)),
+        }
+        if self.remaining == 0:
+            self.violations += 1
+            headers['x-rate-limit-remaining'] = '0'
+            return httpx.Response(429, headers=headers)
+
+        self.remaining -= 1
+        headers['x-rate-limit-remaining'] = str(self.remaining)
+
+        # The cursor is the offset of the page, -1 for the first page
+        cursor: int = int(request.url.params['cursor'])
+        self.cursors.append(cursor)
+        offset: int = max(cursor, 0)
+        end: int = offset + self.page_size
+        next_cursor: int = end if end < len(self.users) else 0
+
+        return httpx.Response(
+            200, headers=headers,
+            json={
+                'users': self.users[offset:end],
+                'next_cursor': next_cursor,
+                'next_cursor_str': str(next_cursor),
+                'previous_cursor': 0,
+            }
+        )
+
+    def importer(self, checkpoint: str | None = None, **kwargs
+                 ) -> XBlockImporter:
+        return XBlockImporter(
+            {}, checkpoint=checkpoint,
+            transport=httpx.MockTransport(self.handler), sleep=self.sleep,
+            clock=self.clock, **kwargs
+        )
+
+
+def empty_list() -> ModerationList:
+    return ModerationList.load(f'{COLLATERAL_DIR}/test-0.yaml')
+
+
+def handles(mod_list: ModerationList) -> list[str]:
+    return [
+        entry.get_account('twitter').handle
+        for entry in mod_list.iter_blocks()
+    ]
+
+
+def test_pagination() -> None:
+    api = FakeXApi(users=25, page_size=10)
+    mod_list: ModerationList = empty_list()
+    result: XImportResult = api.importer().import_blocks(
+        mod_list, categories={'troll'}
+    )
+
+    assert api.cursors == [-1, 10, 20]
+    assert result.pages == 3
+    assert result.requests == 3
+    assert result.users == 25
+    assert result.complete
+    assert result.waited == 0
+    assert handles(mod_list) == [f'blocked_{user}' for user in range(25)]
+    assert 'troll' in mod_list.categories
+
+    entry = next(mod_list.iter_blocks())
+    assert entry.categories == {'troll'}
+    assert entry.get_account('twitter').url == 'https://x.com/blocked_0'
+
+
+def test_rate_limit_window() -> None:
+    '''
+    The importer waits for the reset of the window when it has no requests
+    left, instead of making a request that is rate limited
+    '''
+
+    api = FakeXApi(users=50, page_size=10, window_requests=2, window=60.0)
+    result: XImportResult = api.importer().import_blocks(empty_list())
+
+    assert result.complete
+    assert result.pages == 5
+    assert result.requests == 5
+    assert api.violations == 0
+    assert 2 * 60.0 - 1 < result.waited < 2 * (60.0 + X_RATE_LIMIT_MARGIN)
+
+
+def test_429_with_retry_after() -> None:
+    api = FakeXApi(
+        users=25, page_size=10,
+        errors={2: (429, {'retry-after': '7'})}
+    )
+    mod_list: ModerationList = empty_list()
+    result: XImportResult = api.importer().import_blocks(mod_list)
+
+    assert result.complete
+    assert result.requests == 4
+    assert result.waited == pytest.approx(7)
+    assert api.cursors == [-1, 10, 20]
+    assert len(mod_list) == 25
+
+
+def test_429_without_retry_after() -> None:
+    # Without the rate-limit headers, the importer waits the fallback time
+    api = FakeXApi(users=25, page_size=10, errors={2: (429, {})})
+    result: XImportResult = api.importer().import_blocks(empty_list())
+    assert result.complete
+    assert result.waited == pytest.approx(X_RATE_LIMIT_FALLBACK_WAIT)
+
+    # With the rate-limit headers, it waits for the reset of the window
+    reset: int = int(api.now) + 100
+    api = FakeXApi(
+        users=25, page_size=10,
+        errors={2: (429, {'x-rate-limit-reset': str(reset)})}
+    )
+    result = api.importer().import_blocks(empty_list())
+    assert result.complete
+    assert api.now > reset + X_RATE_LIMIT_MARGIN
+    assert result.waited == pytest.approx(
+        reset + X_RATE_LIMIT_MARGIN - 1700000000.1
+    )
+
+
+def test_server_error_backoff() -> None:
+    api = FakeXApi(
+        users=25, page_size=10,
+        errors={2: (503, {}), 3: (500, {}), 4: (502, {})}
+    )
+    result: XImportResult = api.importer().import_blocks(empty_list())
+
+    # The waits double after every error
+    assert result.complete
+    assert result.requests == 6
+    assert result.waited == pytest.approx(1 + 2 + 4)
+    assert api.cursors == [-1, 10, 20]
+
+    # The importer gives up after the maximum number of retries
+    api = FakeXApi(
+        users=25, page_size=10,
+        errors={request: (503, {}) for request in range(2, 10)}
+    )
+    with pytest.raises(httpx.HTTPStatusError):
+        api.importer(max_retries=3).import_blocks(empty_list())
+    assert api.requests == 5
+
+    # Other client errors are not retried
+    api = FakeXApi(users=25, page_size=10, errors={1: (401, {})})
+    with pytest.raises(httpx.HTTPStatusError):
+        api.importer().import_blocks(empty_list())
+    assert api.requests == 1
+
+
+def test_resume_from_checkpoint(tmp_path, caplog) -> None:
+    checkpoint: str = str(tmp_path / 'blocks.jsonl')
+    api = FakeXApi(users=55, page_size=10)
+
+    partial: XImportResult = api.importer(checkpoint).import_blocks(
+        empty_list(), categories={'troll'}, max_pages=3
+    )
+    assert partial.pages == 3
+    assert not partial.complete
+
+    # An interruption while a page is written leaves a partial line
+    with open(checkpoint, 'ab') as file_desc:
+        file_desc.write(b'{"cursor": 30, "next_cur')
+
+    mod_list: ModerationList = empty_list()
+    with caplog.at_level(logging.WARNING):
+        resumed: XImportResult = api.importer(checkpoint).import_blocks(
+            mod_list, categories={'troll'}
+        )
+    assert 'Removing partial page' in caplog.text
+
+    assert resumed.complete
+    assert resumed.resumed_pages == 3
+    assert resumed.pages == 3
+    assert resumed.users == 55
+    assert api.cursors == [-1, 10, 20, 30, 40, 50]
+    assert handles(mod_list) == [f'blocked_{user}' for user in range(55)]
+
+    # The checkpoint has the header and a line for each page
+    with open(checkpoint, 'rb') as file_desc:
+        lines: list[bytes] = file_desc.read().splitlines()
+    assert len(lines) == 7
+    assert [orjson.loads(line)['cursor'] for line in lines[1:]] == [
+        -1, 10, 20, 30, 40, 50
+    ]
+
+    # A complete checkpoint makes no requests
+    requests: int = api.requests
+    result: XImportResult = api.importer(checkpoint).import_blocks(
+        empty_list()
+    )
+    assert result.complete
+    assert result.resumed_pages == 6
+    assert api.requests == requests
+
+
+def test_empty_checkpoint(tmp_path, caplog) -> None:
+    checkpoint: str = str(tmp_path / 'blocks.jsonl')
+    open(checkpoint, 'wb').close()
+
+    api = FakeXApi(users=5, page_size=10)
+    with caplog.at_level(logging.WARNING):
+        result: XImportResult = api.importer(checkpoint).import_blocks(
+            empty_list()
+        )
+    assert caplog.text == ''
+    assert result.complete
+    assert result.resumed_pages == 0
+    assert result.users == 5
+
+
+def test_checkpoint_for_other_url(tmp_path) -> None:
+    checkpoint: str = str(tmp_path / 'blocks.jsonl')
+    api = FakeXApi(users=25, page_size=10)
+    api.importer(checkpoint).import_blocks(empty_list(), max_pages=1)
+
+    with pytest.raises(ValueError):
+        api.importer(
+            checkpoint, url='https://api.x.com/2/blocks'
+        ).import_blocks(empty_list())
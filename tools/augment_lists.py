@@ -10,12 +10,17 @@ Updates the List of Lists file with data downloaded from the URLs
 
 import os
 import sys
+import asyncio
 import logging
 import argparse
 
 from logging import Logger, getLogger
 
 from tools.lib.lists import ListOfLists
+from tools.lib.lists import LIST_DOWNLOAD_CONCURRENCY
+from tools.lib.bloom import BLOOM_FALSE_POSITIVE_RATE
+from tools.lib.list_index import CrossListIndex
+from tools.lib.publish import Publisher
 
 
 _LOGGER: Logger = getLogger(__name__)
@@ -30,6 +35,37 @@ if __name__ == '__main__':
     parser.add_argument(
         '--cache-dir', '-c', type=str, default='/tmp/list_of_lists'
     )
+    parser.add_argument(
+        '--concurrency', type=int, default=LIST_DOWNLOAD_CONCURRENCY,
+        help='Maximum number of lists to download concurrently'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='Number of worker processes to parse the downloaded lists with, '
+        'by default they are parsed in threads'
+    )
+    parser.add_argument(
+        '--publish', '-p', type=str, default=None,
+        help='Directory to publish the list of lists to, with '
+        'content-hashed and compressed files'
+    )
+    parser.add_argument(
+        '--filters', type=str, default=None,
+        help='Directory to save Bloom filters of the handles on all lists to'
+    )
+    parser.add_argument(
+        '--false-positive-rate', type=float,
+        default=BLOOM_FALSE_POSITIVE_RATE,
+        help='False-positive rate of the Bloom filters'
+    )
+    parser.add_argument(
+        '--index', '-i', type=str, default=None,
+        help='File with the index of the accounts on the lists to update'
+    )
+    parser.add_argument(
+        '--sketches', '-s', type=str, default=None,
+        help='File to save the sketches of the handles on the lists to'
+    )
     args: argparse.Namespace = parser.parse_args(sys.argv[1:])
     if args.output is None:
         args.output = args.file
@@ -38,5 +74,32 @@ if __name__ == '__main__':
 
     if args.cache_dir and not os.path.exists(args.cache_dir):
         os.makedirs(args.cache_dir)
-    lol: ListOfLists = ListOfLists.load(args.file, args.cache_dir)
+    index: CrossListIndex | None = None
+    if args.index:
+        index = CrossListIndex(args.index)
+
+    lol: ListOfLists = asyncio.run(
+        ListOfLists.load_async(
+            args.file, args.cache_dir, concurrency=args.concurrency,
+            workers=args.workers, index=index,
+            sketches=bool(args.sketches)
+        )
+    )
     lol.save(args.output)
+    if index:
+        index.save()
+    if args.sketches:
+        lol.sketches(args.sketches).save()
+
+    if args.filters:
+        if not args.cache_dir:
+            parser.error('--filters requires --cache-dir')
+        if not os.path.exists(args.filters):
+            os.makedirs(args.filters)
+        lol.build_filters(args.cache_dir, args.false_positive_rate)
+        lol.save_filters(args.filters)
+
+    if args.publish:
+        if not os.path.exists(args.publish):
+            os.makedirs(args.publish)
+        Publisher(args.publish).publish(args.output)
@@ -0,0 +1,946 @@
+#!/usr/bin/env python3
+
+'''
+Benchmarks for the moderation list tooling
+
+    pipenv run python -m tools.benchmark memory --accounts 1000000
+    pipenv run python -m tools.benchmark snapshot --repeat 3
+    pipenv run python -m tools.benchmark excel --excel <file>
+    pipenv run python -m tools.benchmark csv --rows 100000
+    pipenv run python -m tools.benchmark deltas --versions 10
+    pipenv run python -m tools.benchmark lookup --repeat 3
+    pipenv run python -m tools.benchmark bloom --keys 200000 --fpr 0.001
+    pipenv run python -m tools.benchmark store --accounts 100000
+    pipenv run python -m tools.benchmark query --accounts 1000000
+    pipenv run python -m tools.benchmark sketches --lists 100
+    pipenv run python -m tools.benchmark trust --lists 15 --latency 0.05
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import io
+import os
+import sys
+import csv
+import random
+import logging
+import argparse
+import asyncio
+import tempfile
+import tracemalloc
+
+from time import perf_counter
+from typing import Callable
+from logging import Logger, getLogger
+
+import httpx
+
+from tools.lib.lists import (
+    AccountStat,
+    ListOfLists,
+    ListStats,
+    ModerationList,
+    ModerationEntry,
+    SocialAccount,
+    UserEntry,
+)
+from tools.lib.list_cache import ListCache
+from tools.lib.bloom import BloomFilter
+from tools.lib.store import ListStore
+from tools.lib.sketches import (
+    SKETCH_SIZE,
+    ListSketches,
+    MinHashSketch,
+    OverlapEstimate,
+)
+from tools.lib.query import (
+    Category,
+    Followers,
+    ListIndex,
+    Platform,
+    Predicate,
+    Status,
+)
+from tools.lib.trust import ResolvedTrust, TrustResolver
+from tools.lib.deltas import (
+    DeltaFeed,
+    ListState,
+    list_state,
+    state_hash,
+)
+from tools.lib.lookup import LookupTable, normalize_handle
+
+
+_LOGGER: Logger = getLogger(__name__)
+
+TEST_YAML: str = 'tests/collateral/dathes.yaml'
+TEST_EXCEL: str = 'tests/collateral/content-moderation-excel.xlsx'
+
+CATEGORIES: list[str] = [
+    'alt-right', 'bot', 'conspiracy', 'disinformation', 'troll'
+]
+
+
+def synthetic_list(accounts: int, accounts_per_entry: int = 2,
+                   handle_prefix: str = 'handle') -> ModerationList:
+    '''
+    Creates a moderation list with the requested number of social accounts,
+    each with a data point for its statistics
+    '''
+
+    mod_list = ModerationList(
+        list_name='synthetic', author_name='benchmark',
+        author_email='benchmark@example.org',
+        author_url='https://example.org/', list_url=None,
+        download_url='https://example.org/synthetic.yaml',
+        categories={category: '' for category in CATEGORIES},
+        last_updated=None
+    )
+
+    platforms: list[str] = ['twitter', 'youtube', 'facebook', 'instagram']
+    for entry_id in range(accounts // accounts_per_entry):
+        entry = ModerationEntry(
+            first_name=f'First{entry_id}', last_name=f'Last{entry_id}',
+            business_name=None, business_type=None, languages='en',
+            categories=CATEGORIES[entry_id % len(CATEGORIES)],
+            annotations=[], urls=[]
+        )
+        for account_id in range(accounts_per_entry):
+            platform: str = platforms[account_id % len(platforms)]
+            handle: str = f'{handle_prefix}_{entry_id}_{account_id}'
+            account = SocialAccount(
+                platform=platform, handle=handle,
+                url=f'https://x.com/{handle}' if platform == 'twitter'
+                else f'https://www.{platform}.com/{handle}',
+                is_primary=True
+            )
+            account.account_stats.append(
+                AccountStat(
+                    timestamp=1700000000 + entry_id, followers=entry_id
+                )
+            )
+            entry.add_social_account(account)
+
+        mod_list.add_block(entry)
+
+    return mod_list
+
+
+def bench_memory(args: argparse.Namespace) -> None:
+    '''
+    Measures the memory used by a moderation list with synthetic entries
+    '''
+
+    tracemalloc.start()
+    start: float = perf_counter()
+    mod_list: ModerationList = synthetic_list(args.accounts)
+    elapsed: float = perf_counter() - start
+    current: int
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    entries: int = len(mod_list)
+    print(
+        f'{args.accounts} accounts in {entries} entries: '
+        f'{current / 2**20:.1f} MiB, '
+        f'{current / entries:.0f} bytes per entry, '
+        f'{current / args.accounts:.0f} bytes per account, '
+        f'built in {elapsed:.1f}s'
+    )
+
+
+def timed(func: Callable, repeat: int) -> tuple[float, any]:
+    '''
+    Runs the function repeatedly
+
+    :returns: the fastest run in seconds and the result of the last run
+    '''
+
+    best: float | None = None
+    result: any = None
+    for _ in range(repeat):
+        start: float = perf_counter()
+        result = func()
+        elapsed: float = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, result
+
+
+def bench_snapshot(args: argparse.Namespace) -> None:
+    '''
+    Compares loading and saving a moderation list as YAML and as snapshot
+    '''
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yaml_file: str = os.path.join(tmp_dir, 'list.yaml')
+        snapshot_file: str = os.path.join(tmp_dir, 'list.json')
+
+        yaml_load: float
+        mod_list: ModerationList
+        yaml_load, mod_list = timed(
+            lambda: ModerationList.load(args.yaml), args.repeat
+        )
+        yaml_save: float
+        yaml_save, _ = timed(lambda: mod_list.save(yaml_file), args.repeat)
+        snapshot_save: float
+        snapshot_save, _ = timed(
+            lambda: mod_list.save(snapshot_file), args.repeat
+        )
+        snapshot_load: float
+        snapshot_load, _ = timed(
+            lambda: ModerationList.load(snapshot_file), args.repeat
+        )
+
+        print(f'{args.yaml}: {len(mod_list)} entries')
+        print(
+            f'load: YAML {yaml_load:.3f}s, snapshot {snapshot_load:.3f}s, '
+            f'{yaml_load / snapshot_load:.1f}x faster'
+        )
+        print(
+            f'save: YAML {yaml_save:.3f}s, snapshot {snapshot_save:.3f}s, '
+            f'{yaml_save / snapshot_save:.1f}x faster'
+        )
+        print(
+            f'size: YAML {os.path.getsize(yaml_file)} bytes, '
+            f'snapshot {os.path.getsize(snapshot_file)} bytes'
+        )
+
+
+def bench_excel(args: argparse.Namespace) -> None:
+    '''
+    Measures the time and peak memory of importing an Excel workbook
+    '''
+
+    tracemalloc.start()
+    start: float = perf_counter()
+    mod_list: ModerationList = ModerationList.from_workbook(
+        args.excel, 'benchmark', None, None, None, None, None
+    )
+    elapsed: float = perf_counter() - start
+    peak: int
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f'{args.excel}: {len(mod_list)} entries in {elapsed:.1f}s, '
+        f'peak memory {peak / 2**20:.1f} MiB'
+    )
+
+
+def synthetic_csv(filename: str, rows: int) -> None:
+    '''
+    Writes a CSV file with moderation entries, using the columns of the
+    Excel template
+    '''
+
+    with open(filename, 'w', newline='') as file_desc:
+        writer = csv.writer(file_desc)
+        writer.writerow(
+            [
+                'First Name', 'Last Name', 'Business Name', 'categories',
+                'politician', 'web', 'twitter', 'youtube-1', 'youtube-2',
+                'facebook', 'instagram', 'tiktok', 'rumble', 'telegram'
+            ]
+        )
+        for row in range(rows):
+            writer.writerow(
+                [
+                    f'First{row}', f'Last{row}', '',
+                    CATEGORIES[row % len(CATEGORIES)],
+                    'x' if row % 10 == 0 else '', f'https://example.org/{row}',
+                    f'handle_{row}', f'channel_{row}',
+                    f'backup_{row} - suspended' if row % 4 == 0 else '',
+                    f'https://www.facebook.com/page_{row}',
+                    f'insta_{row}' if row % 2 else '',
+                    f'tiktok_{row}' if row % 3 == 0 else '', '',
+                    f'telegram_{row}' if row % 5 == 0 else ''
+                ]
+            )
+
+
+def bench_csv(args: argparse.Namespace) -> None:
+    '''
+    Measures the time to import the rows of a CSV file
+    '''
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file: str = os.path.join(tmp_dir, 'list.csv')
+        synthetic_csv(csv_file, args.rows)
+
+        def import_csv() -> ModerationList:
+            mod_list: ModerationList = synthetic_list(0)
+            mod_list.add_csv(csv_file, workers=args.workers)
+            return mod_list
+
+        elapsed: float
+        mod_list: ModerationList
+        elapsed, mod_list = timed(import_csv, args.repeat)
+
+    print(
+        f'{args.rows} rows with {args.workers} workers in {elapsed:.2f}s, '
+        f'{args.rows / elapsed:.0f} rows/s, {len(mod_list)} entries'
+    )
+
+
+def edit_list(mod_list: ModerationList, rand: random.Random, version: int,
+              edits: int) -> None:
+    '''
+    Adds, changes and removes a few entries of the list
+    '''
+
+    for edit in range(edits):
+        keys: list[str] = list(mod_list.blocks)
+        action: int = rand.randrange(3)
+        if action == 0 or not keys:
+            entry = ModerationEntry(
+                first_name=f'First{version}', last_name=f'Last{edit}',
+                business_name=None, business_type=None, languages='en',
+                categories=rand.choice(CATEGORIES), annotations=[], urls=[]
+            )
+            entry.add_account(
+                platform='twitter', handle=f'handle_{version}_{edit}',
+                url=f'https://x.com/handle_{version}_{edit}',
+                is_primary=True
+            )
+            mod_list.add_block(entry)
+        elif action == 1:
+            mod_list.blocks[rand.choice(keys)].categories.add(
+                rand.choice(CATEGORIES)
+            )
+        else:
+            mod_list.remove_block(rand.choice(keys))
+
+
+def bench_deltas(args: argparse.Namespace) -> None:
+    '''
+    Publishes versions of a list to a delta feed and checks that every
+    version can be updated to the current version with the deltas
+    '''
+
+    rand = random.Random(args.seed)
+    mod_list: ModerationList = ModerationList.load(args.yaml)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        feed = DeltaFeed(tmp_dir)
+        states: dict[int, ListState] = {}
+
+        publish_time: float = 0
+        for version in range(1, args.versions + 1):
+            if version > 1:
+                edit_list(mod_list, rand, version, args.edits)
+            start: float = perf_counter()
+            published: int = feed.publish(mod_list)
+            publish_time += perf_counter() - start
+            states[published] = list_state(mod_list)
+
+        expected: str = state_hash(states[feed.version])
+        start = perf_counter()
+        for version, state in states.items():
+            state, _ = feed.update(state, version)
+            if state_hash(state) != expected:
+                raise ValueError(f'Update from version {version} failed')
+        update_time: float = perf_counter() - start
+
+        delta_sizes: list[int] = [
+            delta['size'] for delta in feed.manifest['deltas']
+        ]
+        print(
+            f'{feed.version} versions, snapshot '
+            f'{feed.manifest["snapshot"]["size"]} bytes, '
+            f'deltas {min(delta_sizes)}-{max(delta_sizes)} bytes'
+        )
+        print(
+            f'publish {publish_time / feed.version:.3f}s per version, '
+            f'update {update_time / len(states):.3f}s per version'
+        )
+        print(f'verified: {feed.verify()}')
+
+        feed.compact(args.max_deltas)
+        base: int = feed.manifest['base']['version']
+        state, _ = feed.update(states[base], base)
+        print(
+            f'compacted to {len(feed.manifest["deltas"])} deltas, '
+            f'verified: {feed.verify() and state_hash(state) == expected}'
+        )
+
+
+def bench_lookup(args: argparse.Namespace) -> None:
+    '''
+    Compares loading the lookup tables of a moderation list with loading
+    the list itself and checks that the tables have every account of the
+    list with the categories of its entries
+    '''
+
+    mod_list: ModerationList = ModerationList.load(args.yaml)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filenames: dict[str, str] = mod_list.export_lookup(tmp_dir)
+
+        yaml_load: float
+        yaml_load, _ = timed(
+            lambda: ModerationList.load(args.yaml), args.repeat
+        )
+        lookup_load: float
+        tables: list[LookupTable]
+        lookup_load, tables = timed(
+            lambda: [
+                LookupTable.load(filename) for filename in filenames.values()
+            ],
+            args.repeat
+        )
+
+        lookup_size: int = sum(
+            os.path.getsize(filename) for filename in filenames.values()
+        )
+        print(
+            f'{args.yaml}: {len(mod_list)} entries, '
+            f'{sum(len(table) for table in tables)} handles on '
+            f'{len(tables)} platforms'
+        )
+        print(
+            f'load: YAML {yaml_load:.3f}s, lookup tables '
+            f'{lookup_load:.4f}s, {yaml_load / lookup_load:.0f}x faster'
+        )
+        print(
+            f'size: YAML {os.path.getsize(args.yaml)} bytes, lookup tables '
+            f'{lookup_size} bytes'
+        )
+
+    platform_tables: dict[str, LookupTable] = {
+        table.platform: table for table in tables
+    }
+    missing: int = 0
+    entry: ModerationEntry
+    for entry in mod_list.blocks.values():
+        account: SocialAccount
+        for account in entry.social_accounts:
+            handle: str = account.handle or account.url
+            if not normalize_handle(handle):
+                continue
+
+            table: LookupTable = platform_tables[
+                account.platform.name.lower().replace(' ', '')
+            ]
+            if not entry.categories.issubset(table.get(handle) or []):
+                missing += 1
+
+    print(f'verified: {missing == 0}')
+
+
+def measure_false_positives(bloom_filter: BloomFilter, queries: int) -> float:
+    '''
+    Measures the false-positive rate of a filter with keys that were not
+    added to it
+    '''
+
+    found: int = sum(
+        f'absent_{query}' in bloom_filter for query in range(queries)
+    )
+
+    return found / queries
+
+
+def bench_bloom(args: argparse.Namespace) -> None:
+    '''
+    Builds the Bloom filters for synthetic lists in a list-of-lists and
+    checks that every handle on the lists is found and that the measured
+    false-positive rate is close to the requested rate
+    '''
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = ListCache(tmp_dir)
+        lol = ListOfLists(os.path.join(tmp_dir, 'list-of-lists.json'))
+        handles: set[tuple[str, str]] = set()
+        for list_id in range(args.lists):
+            mod_list: ModerationList = synthetic_list(
+                args.accounts, handle_prefix=f'list{list_id}'
+            )
+            for entry in mod_list.blocks.values():
+                for account in entry.social_accounts:
+                    handles.add(
+                        (account.platform.name.lower(), account.handle)
+                    )
+
+            url: str = f'https://example.org/list{list_id}.yaml'
+            raw_list = io.StringIO()
+            mod_list.write_yaml(raw_list)
+            cache.store(
+                url, raw_list.getvalue(), etag=None, last_modified=None,
+                stats={'name': mod_list.list_name}
+            )
+            lol.list_of_lists.append(
+                ListStats(url=url, counters=mod_list.platform_counters())
+            )
+
+        start: float = perf_counter()
+        lol.build_filters(tmp_dir, args.fpr)
+        elapsed: float = perf_counter() - start
+
+        filter_dir: str = os.path.join(tmp_dir, 'filters')
+        os.makedirs(filter_dir)
+        lol.save_filters(filter_dir)
+        loaded = ListOfLists(lol.filename)
+        loaded.load_filters(filter_dir)
+
+        list_missing: int = sum(
+            not loaded.may_list(platform, handle)
+            for platform, handle in handles
+        )
+        print(
+            f'{args.lists} lists, {len(handles)} handles: filters built in '
+            f'{elapsed:.2f}s, {list_missing} handles missing'
+        )
+        for platform, bloom_filter in loaded.filters.items():
+            measured: float = measure_false_positives(
+                bloom_filter, args.queries
+            )
+            print(
+                f'{platform}: {len(bloom_filter)} handles, '
+                f'{len(bloom_filter.to_bytes())} bytes, '
+                f'false positives {measured:.4%}'
+            )
+
+    bloom_filter = BloomFilter(args.keys, args.fpr)
+    keys: list[str] = [f'handle_{key}' for key in range(args.keys)]
+    start = perf_counter()
+    for key in keys:
+        bloom_filter.add(key)
+    elapsed = perf_counter() - start
+    exact_size: int = sys.getsizeof(set(keys)) + sum(
+        sys.getsizeof(key) for key in keys
+    )
+    data: bytes = bloom_filter.to_bytes()
+    restored: BloomFilter = BloomFilter.from_bytes(data)
+    missing: int = sum(key not in restored for key in keys)
+    measured = measure_false_positives(restored, args.queries)
+
+    print(
+        f'{args.keys} keys added in {elapsed:.2f}s: {len(data)} bytes, '
+        f'{len(data) / args.keys:.2f} bytes per key, exact set '
+        f'{exact_size / args.keys:.0f} bytes per key, {missing} keys missing'
+    )
+    print(
+        f'false positives: {measured:.4%} measured, '
+        f'{bloom_filter.false_positive_rate:.4%} expected, '
+        f'{args.fpr:.4%} requested'
+    )
+    # With many queries, the measured rate is close to the expected rate
+    verified: bool = (
+        list_missing == 0 and missing == 0 and measured < args.fpr * 1.5
+    )
+    print(f'verified: {verified}')
+
+
+def bench_store(args: argparse.Namespace) -> None:
+    '''
+    Compares adding an entry to a list in a store with loading, editing
+    and saving the list as a snapshot, and checks that the list exported
+    from the store is the same as the edited list
+    '''
+
+    mod_list: ModerationList = synthetic_list(args.accounts)
+    entry = ModerationEntry(
+        first_name='First1', last_name='Last1', business_name=None,
+        business_type=None, languages='en', categories='troll',
+        annotations=[], urls=[]
+    )
+    entry.add_social_account(
+        SocialAccount('twitter', 'handle_1_0', 'https://x.com/handle_1_0')
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_file: str = os.path.join(tmp_dir, 'list.db')
+        snapshot_file: str = os.path.join(tmp_dir, 'list.json')
+        mod_list.save(snapshot_file)
+
+        start: float = perf_counter()
+        with ListStore(store_file) as store:
+            store.import_list(mod_list)
+        import_time: float = perf_counter() - start
+
+        start = perf_counter()
+        edited: ModerationList = ModerationList.load(snapshot_file)
+        edited.add_block(entry)
+        edited.save(snapshot_file)
+        snapshot_time: float = perf_counter() - start
+
+        with ListStore(store_file) as store:
+            start = perf_counter()
+            store.add_block(entry)
+            store_time: float = perf_counter() - start
+
+            exported: ModerationList = store.to_list()
+
+    print(
+        f'{len(mod_list)} entries: import {import_time:.2f}s, edit with '
+        f'snapshot {snapshot_time:.3f}s, edit with store {store_time:.4f}s'
+    )
+    print(
+        'verified: '
+        f'{exported.as_dict()["block_list"] == edited.as_dict()["block_list"]}'
+    )
+
+
+def bench_query(args: argparse.Namespace) -> None:
+    '''
+    Measures building the query index of a list and running queries with
+    it, and checks the results against a scan of the entries of the list
+    '''
+
+    mod_list: ModerationList = synthetic_list(args.accounts)
+
+    start: float = perf_counter()
+    index = ListIndex(mod_list)
+    elapsed: float = perf_counter() - start
+    print(f'{len(index)} accounts indexed in {elapsed:.2f}s')
+
+    # An entry that is merged with an existing entry is re-indexed
+    entry = ModerationEntry(
+        first_name='First10', last_name='Last10', business_name=None,
+        business_type=None, languages='de', categories='troll',
+        annotations=[], urls=[]
+    )
+    entry.add_social_account(
+        SocialAccount('twitter', 'handle_10_0', 'https://x.com/handle_10_0')
+    )
+    start = perf_counter()
+    mod_list.add_block(entry)
+    elapsed = perf_counter() - start
+    print(f'add_block with the index in {elapsed * 1000:.2f}ms')
+
+    verified: bool = True
+    predicate: Predicate
+    for predicate in (
+            Platform('twitter') & Category('troll'),
+            Platform('youtube') & Status('active')
+            & Followers(minimum=args.accounts // 4),
+            ~Category('bot') & Followers(maximum=100)):
+        start = perf_counter()
+        total: int = index.query(predicate, limit=10).total
+        elapsed = perf_counter() - start
+
+        expected: int = sum(
+            predicate.matches(entry, account)
+            for entry in mod_list.blocks.values()
+            for account in entry.social_accounts
+        )
+        verified = verified and total == expected
+        print(f'{predicate!r}: {total} accounts in {elapsed * 1000:.1f}ms')
+
+    print(f'verified: {verified}')
+
+
+def bench_sketches(args: argparse.Namespace) -> None:
+    '''
+    Compares the overlap of lists estimated from their sketches with the
+    exact overlap, for lists that share a varying part of their handles
+    '''
+
+    # List n has the handles n * shift .. n * shift + accounts - 1, so
+    # neighbouring lists overlap most
+    shift: int = max(args.accounts // args.lists, 1)
+    handle_sets: dict[str, set[str]] = {}
+    list_sketches = ListSketches()
+    start: float = perf_counter()
+    for list_id in range(args.lists):
+        url: str = f'https://example.org/list{list_id}.yaml'
+        first: int = list_id * shift
+        handle_sets[url] = {
+            f'handle_{handle}'
+            for handle in range(first, first + args.accounts)
+        }
+        list_sketches.set_list(
+            url,
+            {'twitter': MinHashSketch.from_handles(
+                handle_sets[url], args.size
+            )}
+        )
+    elapsed: float = perf_counter() - start
+    print(
+        f'{args.lists} sketches of {args.accounts} handles built in '
+        f'{elapsed:.2f}s'
+    )
+
+    urls: list[str] = list(handle_sets)
+    pairs: list[tuple[str, str]] = [
+        (url, other_url)
+        for position, url in enumerate(urls)
+        for other_url in urls[position + 1:]
+    ]
+    start = perf_counter()
+    estimates: list[OverlapEstimate] = [
+        list_sketches.estimate([url, other_url]) for url, other_url in pairs
+    ]
+    elapsed = perf_counter() - start
+
+    exact_start: float = perf_counter()
+    max_error: float = 0.0
+    max_union_error: float = 0.0
+    estimate: OverlapEstimate
+    for (url, other_url), estimate in zip(pairs, estimates):
+        shared: int = len(handle_sets[url] & handle_sets[other_url])
+        union: int = len(handle_sets[url] | handle_sets[other_url])
+        max_error = max(max_error, abs(estimate.jaccard - shared / union))
+        max_union_error = max(
+            max_union_error, abs(estimate.union - union) / union
+        )
+    exact_elapsed: float = perf_counter() - exact_start
+    print(
+        f'{len(pairs)} pairs estimated in {elapsed:.2f}s, '
+        f'{elapsed / len(pairs) * 1e6:.0f}us per pair, exact overlaps in '
+        f'{exact_elapsed:.2f}s, max Jaccard error {max_error:.3f}, '
+        f'max union error {max_union_error:.1%}'
+    )
+
+    start = perf_counter()
+    similar: list[tuple[str, OverlapEstimate]] = list_sketches.similar(
+        urls[0], count=3
+    )
+    elapsed = perf_counter() - start
+    print(
+        f'lists similar to {urls[0]} in {elapsed * 1000:.1f}ms: '
+        + ', '.join(
+            f'{url} ({estimate.jaccard:.2f})' for url, estimate in similar
+        )
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename: str = os.path.join(tmp_dir, 'list-sketches.json')
+        list_sketches.save(filename)
+        loaded = ListSketches(filename)
+        size: int = os.path.getsize(filename)
+    print(f'sketches file: {size} bytes, {size / args.lists:.0f} per list')
+
+    # The standard error of the Jaccard estimate is at most 0.5 / sqrt(k),
+    # so all estimates are within four standard errors
+    verified: bool = (
+        loaded.lists == list_sketches.lists
+        and max_error < 2 / args.size ** 0.5
+    )
+    print(f'verified: {verified}')
+
+
+def trust_transport(lists: int, accounts: int, latency: float
+                    ) -> httpx.MockTransport:
+    '''
+    Serves a trust graph of synthetic lists from memory. List n trusts lists
+    2n + 1 and 2n + 2, list 3 also trusts list 2, the last list trusts the
+    first list and the first list trusts a list that does not exist. Lists
+    2n and 2n + 1 have the same entries.
+    '''
+
+    raw_lists: dict[str, str] = {}
+    for list_id in range(lists):
+        mod_list: ModerationList = synthetic_list(
+            accounts, handle_prefix=f'list{list_id // 2}'
+        )
+        trusted: list[int] = [
+            trusted_id for trusted_id in (2 * list_id + 1, 2 * list_id + 2)
+            if trusted_id < lists
+        ]
+        if list_id == 3:
+            trusted.append(2)
+        if list_id == lists - 1:
+            trusted.append(0)
+        for trusted_id in trusted:
+            mod_list.add_trust(
+                UserEntry(
+                    name=f'user{trusted_id}', email=None,
+                    url=trust_url(trusted_id)
+                )
+            )
+        if list_id == 0:
+            mod_list.add_trust(
+                UserEntry(name='missing', email=None, url=trust_url(lists))
+            )
+
+        raw_list = io.StringIO()
+        mod_list.write_yaml(raw_list)
+        raw_lists[trust_url(list_id)] = raw_list.getvalue()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        raw_list: str | None = raw_lists.get(str(request.url))
+        if raw_list is None:
+            return httpx.Response(404)
+
+        return httpx.Response(200, text=raw_list)
+
+    return httpx.MockTransport(handler)
+
+
+def trust_url(list_id: int) -> str:
+    return f'https://lists.example.org/list{list_id}.yaml'
+
+
+def bench_trust(args: argparse.Namespace) -> None:
+    '''
+    Resolves the trust graph of synthetic lists served from memory, with
+    a latency for each download, and checks the merged list, its
+    provenance and the cycles and errors that were found
+    '''
+
+    transport: httpx.MockTransport = trust_transport(
+        args.lists, args.accounts, args.latency
+    )
+
+    resolver = TrustResolver(
+        max_depth=args.lists, concurrency=args.concurrency,
+        transport=transport, workers=args.workers
+    )
+    start: float = perf_counter()
+    resolved: ResolvedTrust = asyncio.run(resolver.resolve(trust_url(0)))
+    elapsed: float = perf_counter() - start
+    print(
+        f'{len(resolved.lists)} lists resolved in {elapsed:.2f}s, '
+        f'{resolver.parse_count} lists parsed, '
+        f'{len(resolved.mod_list)} entries'
+    )
+
+    # Resolving again only downloads the lists, so the time depends on the
+    # number of concurrent downloads
+    parse_count: int = resolver.parse_count
+    for concurrency in (1, args.concurrency):
+        resolver.concurrency = concurrency
+        start = perf_counter()
+        asyncio.run(resolver.resolve(trust_url(0)))
+        elapsed = perf_counter() - start
+        print(
+            f'resolved again with concurrency {concurrency} in '
+            f'{elapsed:.2f}s'
+        )
+
+    depth_limited: ResolvedTrust = asyncio.run(
+        TrustResolver(max_depth=1, transport=transport).resolve(trust_url(0))
+    )
+    print(
+        f'max depth 1: {len(depth_limited.lists)} lists, '
+        f'{len(depth_limited.skipped)} skipped'
+    )
+
+    entries_per_list: int = args.accounts // 2
+    provenance_ok: bool = True
+    for block_key, entry in resolved.mod_list.blocks.items():
+        pair: int = int(
+            entry.get_account('twitter').handle.split('_')[0][len('list'):]
+        )
+        expected: list[str] = [
+            trust_url(list_id) for list_id in (2 * pair, 2 * pair + 1)
+            if list_id < args.lists
+        ]
+        provenance_ok = (
+            provenance_ok and resolved.provenance[block_key] == expected
+        )
+
+    verified: bool = (
+        len(resolved.lists) == args.lists
+        and len(resolved.mod_list)
+        == (args.lists + 1) // 2 * entries_per_list
+        and provenance_ok
+        and resolved.cycles == [(trust_url(args.lists - 1), trust_url(0))]
+        and list(resolved.errors) == [trust_url(args.lists)]
+        and resolver.parse_count == parse_count == args.lists
+        and len(depth_limited.lists) == 3
+    )
+    print(f'verified: {verified}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    memory_parser = subparsers.add_parser(
+        'memory', help='Memory used by the entries of a moderation list'
+    )
+    memory_parser.add_argument(
+        '--accounts', '-a', type=int, default=1000000
+    )
+    memory_parser.set_defaults(func=bench_memory)
+
+    snapshot_parser = subparsers.add_parser(
+        'snapshot', help='Load and save a moderation list as YAML or snapshot'
+    )
+    snapshot_parser.add_argument('--yaml', '-y', type=str, default=TEST_YAML)
+    snapshot_parser.add_argument('--repeat', '-r', type=int, default=3)
+    snapshot_parser.set_defaults(func=bench_snapshot)
+
+    excel_parser = subparsers.add_parser(
+        'excel', help='Import a moderation list from an Excel workbook'
+    )
+    excel_parser.add_argument('--excel', '-e', type=str, default=TEST_EXCEL)
+    excel_parser.set_defaults(func=bench_excel)
+
+    csv_parser = subparsers.add_parser(
+        'csv', help='Import a moderation list from a CSV file'
+    )
+    csv_parser.add_argument('--rows', type=int, default=100000)
+    csv_parser.add_argument('--repeat', '-r', type=int, default=3)
+    csv_parser.add_argument('--workers', '-w', type=int, default=1)
+    csv_parser.set_defaults(func=bench_csv)
+
+    deltas_parser = subparsers.add_parser(
+        'deltas', help='Publish and apply the deltas of a moderation list'
+    )
+    deltas_parser.add_argument('--yaml', '-y', type=str, default=TEST_YAML)
+    deltas_parser.add_argument('--versions', '-v', type=int, default=10)
+    deltas_parser.add_argument('--edits', '-e', type=int, default=5)
+    deltas_parser.add_argument('--max-deltas', type=int, default=3)
+    deltas_parser.add_argument('--seed', type=int, default=1)
+    deltas_parser.set_defaults(func=bench_deltas)
+
+    lookup_parser = subparsers.add_parser(
+        'lookup', help='Load the lookup tables or the moderation list'
+    )
+    lookup_parser.add_argument('--yaml', '-y', type=str, default=TEST_YAML)
+    lookup_parser.add_argument('--repeat', '-r', type=int, default=3)
+    lookup_parser.set_defaults(func=bench_lookup)
+
+    bloom_parser = subparsers.add_parser(
+        'bloom', help='Build and query Bloom filters for a list-of-lists'
+    )
+    bloom_parser.add_argument('--lists', type=int, default=3)
+    bloom_parser.add_argument('--accounts', '-a', type=int, default=1000)
+    bloom_parser.add_argument('--keys', '-k', type=int, default=200000)
+    bloom_parser.add_argument('--fpr', type=float, default=0.001)
+    bloom_parser.add_argument('--queries', '-q', type=int, default=100000)
+    bloom_parser.set_defaults(func=bench_bloom)
+
+    store_parser = subparsers.add_parser(
+        'store', help='Edit a moderation list in a SQLite store'
+    )
+    store_parser.add_argument('--accounts', '-a', type=int, default=100000)
+    store_parser.set_defaults(func=bench_store)
+
+    query_parser = subparsers.add_parser(
+        'query', help='Query the accounts of a moderation list'
+    )
+    query_parser.add_argument('--accounts', '-a', type=int, default=1000000)
+    query_parser.set_defaults(func=bench_query)
+
+    sketches_parser = subparsers.add_parser(
+        'sketches', help='Estimate the overlap of lists with sketches'
+    )
+    sketches_parser.add_argument('--lists', type=int, default=100)
+    sketches_parser.add_argument('--accounts', '-a', type=int, default=10000)
+    sketches_parser.add_argument('--size', type=int, default=SKETCH_SIZE)
+    sketches_parser.set_defaults(func=bench_sketches)
+
+    trust_parser = subparsers.add_parser(
+        'trust', help='Resolve a trust graph of lists'
+    )
+    trust_parser.add_argument('--lists', type=int, default=15)
+    trust_parser.add_argument('--accounts', '-a', type=int, default=200)
+    trust_parser.add_argument('--latency', type=float, default=0.05)
+    trust_parser.add_argument('--concurrency', type=int, default=10)
+    trust_parser.add_argument('--workers', '-w', type=int, default=None)
+    trust_parser.set_defaults(func=bench_trust)
+
+    args: argparse.Namespace = parser.parse_args(sys.argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+
+    args.func(args)
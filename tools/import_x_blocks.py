@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+'''
+Adds the accounts that you block on X to a moderation list
+
+The tokens of a logged-in X session in your browser are read from the
+X_BEARER_TOKEN, X_CSRF_TOKEN (the 'ct0' cookie) and X_AUTH_TOKEN (the
+'auth_token' cookie) environment variables:
+    X_BEARER_TOKEN=... X_CSRF_TOKEN=... X_AUTH_TOKEN=... \
+        pipenv run python tools/import_x_blocks.py --yaml my_blocklist.yaml \
+        --category troll
+
+The downloaded pages are kept in a checkpoint file, by default next to the
+list, so running the same command again after an interruption continues
+where the import stopped. The checkpoint is removed when the import is
+complete.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import sys
+import logging
+import argparse
+
+from logging import Logger, getLogger
+
+from tools.lib.lists import ModerationList
+from tools.lib.x_blocks import (
+    X_BLOCKS_URL,
+    XBlockImporter,
+    XImportResult,
+    x_headers,
+)
+from tools.modlist import new_list
+
+
+_LOGGER: Logger = getLogger(__name__)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--yaml', '-y', type=str, required=True,
+        help='The moderation list to add the accounts to, which is created '
+        'if it does not exist'
+    )
+    parser.add_argument('--output', '-o', type=str, default=None)
+    parser.add_argument(
+        '--category', '-c', action='append',
+        help='Category of the blocked accounts'
+    )
+    parser.add_argument('--language', '-l', action='append')
+    parser.add_argument(
+        '--checkpoint', type=str, default=None,
+        help='File to keep the downloaded pages in, defaults to the list '
+        'with the .x-blocks.jsonl extension'
+    )
+    parser.add_argument(
+        '--max-pages', type=int, default=None,
+        help='Stop after downloading this many pages'
+    )
+    parser.add_argument('--url', type=str, default=X_BLOCKS_URL)
+    args: argparse.Namespace = parser.parse_args(sys.argv[1:])
+    if args.output is None:
+        args.output = args.yaml
+    if args.checkpoint is None:
+        args.checkpoint = f'{args.output}.x-blocks.jsonl'
+
+    logging.basicConfig(level=logging.INFO)
+
+    tokens: dict[str, str | None] = {
+        name: os.environ.get(name)
+        for name in ('X_BEARER_TOKEN', 'X_CSRF_TOKEN', 'X_AUTH_TOKEN')
+    }
+    missing: list[str] = [name for name, value in tokens.items() if not value]
+    if missing:
+        parser.error(f'Set the environment variables {", ".join(missing)}')
+
+    mod_list: ModerationList
+    if os.path.exists(args.yaml):
+        mod_list = ModerationList.load(args.yaml)
+    else:
+        _LOGGER.info(f'Creating a new moderation list: {args.output}')
+        mod_list = new_list()
+
+    importer = XBlockImporter(
+        x_headers(
+            tokens['X_BEARER_TOKEN'], tokens['X_CSRF_TOKEN'],
+            tokens['X_AUTH_TOKEN']
+        ),
+        checkpoint=args.checkpoint, url=args.url
+    )
+    result: XImportResult = importer.import_blocks(
+        mod_list, categories=set(args.category or []),
+        languages=set(args.language or []), max_pages=args.max_pages
+    )
+    _LOGGER.info(
+        f'Imported {result.users} blocked accounts from {result.pages} '
+        f'pages, {result.resumed_pages} pages from the checkpoint, with '
+        f'{result.requests} requests, waited {result.waited:.0f}s for the '
+        'rate limit'
+    )
+
+    mod_list.save(args.output)
+    if not result.complete:
+        _LOGGER.info(
+            f'Run again to continue the import from {args.checkpoint}'
+        )
+    elif os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
@@ -0,0 +1,145 @@
+'''
+Bloom filters for checking whether a handle is on any of the moderation
+lists in a list-of-lists, without keeping all the handles in memory
+
+A Bloom filter for n keys with false-positive rate p has
+m = -n * ln(p) / ln(2)^2 bits and sets k = m / n * ln(2) bits for each
+key, so a rate of 0.1% costs less than two bytes per key. A key that was
+added is always found. A key that was not added is found with probability
+p.
+
+The bits for a key are derived from the first 16 bytes of the SHA-256 hash
+of the key, so that the filter can be queried by any client that has
+SHA-256. The two halves h1 and h2 of those bytes, read as little-endian
+64-bit integers, give the bits (h1 + i * h2) mod m for i in 0..k-1. Bit j
+of the filter is bit j % 8 of byte j // 8.
+
+A filter is stored as a 24-byte header, with the 'BMBF' magic, the format
+version, k, m and the number of keys, followed by the bytes of the filter.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import math
+import struct
+import hashlib
+
+from typing import Self
+from logging import Logger, getLogger
+
+_LOGGER: Logger = getLogger(__name__)
+
+BLOOM_MAGIC: bytes = b'BMBF'
+BLOOM_VERSION: int = 1
+
+# magic, version, k, padding, m, number of keys
+_BLOOM_HEADER: struct.Struct = struct.Struct('<4sBB2xQQ')
+
+BLOOM_FALSE_POSITIVE_RATE: float = 0.001
+
+_MASK_64: int = 2**64 - 1
+
+
+class BloomFilter:
+    def __init__(self, capacity: int,
+                 false_positive_rate: float = BLOOM_FALSE_POSITIVE_RATE
+                 ) -> None:
+        '''
+        A Bloom filter sized for a number of keys
+
+        :param capacity: The number of keys that will be added. With more
+        keys, the false-positive rate is higher than requested
+        :param false_positive_rate: The probability that a key that was not
+        added is found
+        '''
+
+        if not 0 < false_positive_rate < 1:
+            raise ValueError('The false-positive rate must be between 0 and 1')
+
+        capacity = max(capacity, 1)
+        bits: int = math.ceil(
+            -capacity * math.log(false_positive_rate) / math.log(2) ** 2
+        )
+        self.bits: int = max(bits, 8)
+        self.hashes: int = max(round(self.bits / capacity * math.log(2)), 1)
+        self.count: int = 0
+        self.data: bytearray = bytearray((self.bits + 7) // 8)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _positions(self, key: str) -> list[int]:
+        digest: bytes = hashlib.sha256(key.encode('utf-8')).digest()
+        hash1: int = int.from_bytes(digest[:8], 'little')
+        hash2: int = int.from_bytes(digest[8:16], 'little')
+
+        return [
+            ((hash1 + index * hash2) & _MASK_64) % self.bits
+            for index in range(self.hashes)
+        ]
+
+    def add(self, key: str) -> None:
+        position: int
+        for position in self._positions(key):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.data[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    @property
+    def false_positive_rate(self) -> float:
+        '''
+        The expected false-positive rate for the number of keys that were
+        added
+        '''
+
+        return (
+            1 - math.exp(-self.hashes * self.count / self.bits)
+        ) ** self.hashes
+
+    def to_bytes(self) -> bytes:
+        return _BLOOM_HEADER.pack(
+            BLOOM_MAGIC, BLOOM_VERSION, self.hashes, self.bits, self.count
+        ) + bytes(self.data)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> Self:
+        if len(data) < _BLOOM_HEADER.size:
+            raise ValueError('Data is too short for a Bloom filter')
+
+        magic: bytes
+        version: int
+        hashes: int
+        bits: int
+        count: int
+        magic, version, hashes, bits, count = _BLOOM_HEADER.unpack_from(data)
+        if magic != BLOOM_MAGIC or version != BLOOM_VERSION:
+            raise ValueError('Data is not a Bloom filter')
+        if len(data) != _BLOOM_HEADER.size + (bits + 7) // 8:
+            raise ValueError('Data of the Bloom filter has the wrong length')
+
+        bloom_filter: BloomFilter = BloomFilter.__new__(BloomFilter)
+        bloom_filter.bits = bits
+        bloom_filter.hashes = hashes
+        bloom_filter.count = count
+        bloom_filter.data = bytearray(data[_BLOOM_HEADER.size:])
+
+        return bloom_filter
+
+    def save(self, filename: str) -> None:
+        with open(f'{filename}.tmp', 'wb') as file_desc:
+            file_desc.write(self.to_bytes())
+        os.replace(f'{filename}.tmp', filename)
+
+    @staticmethod
+    def load(filename: str) -> Self:
+        with open(filename, 'rb') as file_desc:
+            return BloomFilter.from_bytes(file_desc.read())
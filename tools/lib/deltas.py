@@ -0,0 +1,517 @@
+'''
+Delta feed for moderation lists
+
+Subscribers of a list that already have version N of the list only need
+the entries that were added, changed or removed since version N. A delta
+feed is a directory with:
+
+    manifest.json: the current version of the list, the files of the
+    feed and their SHA-256 hashes
+    snapshot-<version>.json: the full list as a snapshot, with the keys
+    of the entries of the block list and the version of the list
+    delta-<from>-<to>.json: the changes between two versions of the list
+
+The feed also keeps the snapshot of its base version, the oldest version
+that the deltas start from, so that it can verify that applying the
+deltas to the base gives the current snapshot.
+
+The entries in the deltas are identified by their key in the block list
+of the list. Applying a delta removes entries, replaces changed entries
+and appends added entries, in that order. When that does not give the
+order of the entries in the new version, the delta has the keys of all
+entries in the new order.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import hashlib
+
+from logging import Logger, getLogger
+
+import orjson
+
+from tools.lib.lists import (
+    ModerationList,
+    SNAPSHOT_FORMAT,
+    SNAPSHOT_VERSION,
+)
+
+_LOGGER: Logger = getLogger(__name__)
+
+DELTA_FEED_FORMAT: str = 'byomod-deltas'
+DELTA_FORMAT: str = 'byomod-delta'
+DELTA_FEED_VERSION: int = 1
+
+MANIFEST_FILE: str = 'manifest.json'
+
+# The state of a list: its meta data, the entries of its block list by
+# their key and its trust list, as they are stored in JSON
+ListState = dict[str, any]
+
+
+def list_state(mod_list: ModerationList) -> ListState:
+    '''
+    Gets the state of a moderation list, with the data of the list as it
+    is stored in a snapshot
+    '''
+
+    return orjson.loads(
+        orjson.dumps(
+            {
+                'meta': mod_list.meta_as_dict(),
+                'blocks': {
+                    key: entry.as_dict()
+                    for key, entry in mod_list.blocks.items()
+                },
+                'trust_list': [entry.as_dict() for entry in mod_list.trusts],
+            }
+        )
+    )
+
+
+def state_hash(state: ListState) -> str:
+    '''
+    Gets the SHA-256 hash of the state of a list, which includes the order
+    of the entries of its block list
+    '''
+
+    return hashlib.sha256(
+        orjson.dumps(
+            [
+                state['meta'], list(state['blocks'].items()),
+                state['trust_list']
+            ],
+            option=orjson.OPT_SORT_KEYS
+        )
+    ).hexdigest()
+
+
+def diff_states(old: ListState, new: ListState, from_version: int,
+                to_version: int) -> dict[str, any]:
+    '''
+    Creates the delta between two states of a list
+    '''
+
+    old_blocks: dict[str, dict] = old['blocks']
+    new_blocks: dict[str, dict] = new['blocks']
+
+    removed: list[str] = [key for key in old_blocks if key not in new_blocks]
+    changed: dict[str, dict] = {
+        key: entry for key, entry in new_blocks.items()
+        if key in old_blocks and old_blocks[key] != entry
+    }
+    added: dict[str, dict] = {
+        key: entry for key, entry in new_blocks.items()
+        if key not in old_blocks
+    }
+
+    delta: dict[str, any] = {
+        'format': DELTA_FORMAT,
+        'version': DELTA_FEED_VERSION,
+        'from_version': from_version,
+        'to_version': to_version,
+        'meta': new['meta'],
+        'trust_list': new['trust_list'],
+        'removed': removed,
+        'changed': changed,
+        'added': added,
+        'order': None,
+        'state_hash': state_hash(new),
+    }
+
+    natural_order: list[str] = [
+        key for key in old_blocks if key in new_blocks
+    ] + list(added)
+    if natural_order != list(new_blocks):
+        delta['order'] = list(new_blocks)
+
+    return delta
+
+
+def apply_delta(state: ListState, delta: dict[str, any]) -> ListState:
+    '''
+    Applies a delta to the state of a list
+
+    :returns: the new state, the state that is passed in is not modified
+    :raises: ValueError if the delta does not apply to the state
+    '''
+
+    if delta.get('format') != DELTA_FORMAT:
+        raise ValueError('Not a moderation list delta')
+
+    blocks: dict[str, dict] = dict(state['blocks'])
+
+    key: str
+    for key in delta['removed']:
+        if key not in blocks:
+            raise ValueError(f'Delta removes unknown entry: {key}')
+        del blocks[key]
+
+    entry: dict[str, any]
+    for key, entry in delta['changed'].items():
+        if key not in blocks:
+            raise ValueError(f'Delta changes unknown entry: {key}')
+        blocks[key] = entry
+
+    for key, entry in delta['added'].items():
+        if key in blocks:
+            raise ValueError(f'Delta adds existing entry: {key}')
+        blocks[key] = entry
+
+    if delta.get('order') is not None:
+        if set(delta['order']) != set(blocks):
+            raise ValueError('Delta has an invalid order of entries')
+        blocks = {key: blocks[key] for key in delta['order']}
+
+    new_state: ListState = {
+        'meta': delta['meta'],
+        'blocks': blocks,
+        'trust_list': delta['trust_list'],
+    }
+
+    if state_hash(new_state) != delta['state_hash']:
+        raise ValueError(
+            f'Applying the delta to version {delta["to_version"]} did not '
+            'give the expected list'
+        )
+
+    return new_state
+
+
+def compose_deltas(first: dict[str, any], second: dict[str, any]
+                   ) -> dict[str, any]:
+    '''
+    Combines two consecutive deltas into a single delta
+    '''
+
+    if first['to_version'] != second['from_version']:
+        raise ValueError(
+            f'Delta to version {first["to_version"]} is not followed by '
+            f'delta from version {second["from_version"]}'
+        )
+
+    removed_later: set[str] = set(second['removed'])
+
+    # Entries added by the first delta and removed by the second never
+    # existed for the combined delta
+    removed: list[str] = list(first['removed']) + [
+        key for key in second['removed'] if key not in first['added']
+    ]
+
+    changed: dict[str, dict] = {}
+    key: str
+    entry: dict[str, any]
+    for key, entry in first['changed'].items():
+        if key not in removed_later:
+            changed[key] = second['changed'].get(key, entry)
+    for key, entry in second['changed'].items():
+        if key not in first['added']:
+            changed[key] = entry
+
+    added: dict[str, dict] = {}
+    for key, entry in first['added'].items():
+        if key not in removed_later:
+            added[key] = second['changed'].get(key, entry)
+    for key, entry in second['added'].items():
+        # An entry that was removed and added again by the second delta
+        # moves to the end of the list
+        added.pop(key, None)
+        added[key] = entry
+
+    order: list[str] | None = second.get('order')
+    if order is None and first.get('order') is not None:
+        order = [
+            key for key in first['order'] if key not in removed_later
+        ] + list(second['added'])
+
+    return {
+        'format': DELTA_FORMAT,
+        'version': DELTA_FEED_VERSION,
+        'from_version': first['from_version'],
+        'to_version': second['to_version'],
+        'meta': second['meta'],
+        'trust_list': second['trust_list'],
+        'removed': removed,
+        'changed': changed,
+        'added': added,
+        'order': order,
+        'state_hash': second['state_hash'],
+    }
+
+
+class DeltaFeed:
+    def __init__(self, directory: str) -> None:
+        '''
+        Feed with the snapshot of a moderation list and the deltas between
+        its versions
+
+        :param directory: The directory for the files of the feed, which
+        must already exist
+        '''
+
+        if not os.path.isdir(directory):
+            raise ValueError(
+                f'Delta feed directory {directory} does not exist'
+            )
+
+        self.directory: str = directory
+        self.manifest: dict[str, any] | None = None
+
+        manifest_path: str = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'rb') as file_desc:
+                self.manifest = orjson.loads(file_desc.read())
+            if self.manifest.get('format') != DELTA_FEED_FORMAT:
+                raise ValueError(f'Not a delta feed manifest: {manifest_path}')
+
+    @property
+    def version(self) -> int:
+        '''
+        The current version of the list in the feed, 0 for a new feed
+        '''
+
+        if not self.manifest:
+            return 0
+
+        return self.manifest['list_version']
+
+    def publish(self, mod_list: ModerationList) -> int:
+        '''
+        Publishes a new version of the list, if it differs from the current
+        version in the feed. Only the time the list was last updated does
+        not make a new version.
+
+        :returns: the version of the list in the feed
+        '''
+
+        new_state: ListState = list_state(mod_list)
+
+        if not self.manifest:
+            snapshot: dict[str, any] = self._write_snapshot(new_state, 1)
+            self.manifest = {
+                'format': DELTA_FEED_FORMAT,
+                'version': DELTA_FEED_VERSION,
+                'list_version': 1,
+                'snapshot': snapshot,
+                'base': snapshot,
+                'deltas': [],
+            }
+            self._write_manifest()
+            return 1
+
+        version: int = self.version
+        old_state: ListState = self.read_state(version)
+        # The order of the entries is part of the list, so the blocks are
+        # compared as lists of items
+        if (list(old_state['blocks'].items())
+                == list(new_state['blocks'].items())
+                and old_state['trust_list'] == new_state['trust_list']
+                and DeltaFeed._meta_without_timestamp(old_state['meta'])
+                == DeltaFeed._meta_without_timestamp(new_state['meta'])):
+            _LOGGER.info(f'List is unchanged since version {version}')
+            return version
+
+        delta: dict[str, any] = diff_states(
+            old_state, new_state, version, version + 1
+        )
+        self.manifest['deltas'].append(self._write_delta(delta))
+
+        old_snapshot: dict[str, any] = self.manifest['snapshot']
+        self.manifest['snapshot'] = self._write_snapshot(
+            new_state, version + 1
+        )
+        self.manifest['list_version'] = version + 1
+        self._write_manifest()
+
+        if old_snapshot['file'] != self.manifest['base']['file']:
+            self._remove(old_snapshot['file'])
+
+        _LOGGER.info(
+            f'Published version {version + 1} with '
+            f'{len(delta["added"])} added, {len(delta["changed"])} changed '
+            f'and {len(delta["removed"])} removed entries'
+        )
+
+        return version + 1
+
+    def read_state(self, version: int | None = None) -> ListState:
+        '''
+        Reads the state of the list from a snapshot in the feed
+
+        :param version: The current version or the base version of the
+        feed, by default the current version
+        '''
+
+        snapshot: dict[str, any] = self.manifest['snapshot']
+        if version is not None and version != self.version:
+            if version != self.manifest['base']['version']:
+                raise ValueError(f'No snapshot for version {version}')
+            snapshot = self.manifest['base']
+
+        data: dict[str, any] = self._read_file(snapshot)
+        raw_list: dict[str, any] = data['list']
+
+        return {
+            'meta': raw_list['meta'],
+            'blocks': dict(zip(data['block_keys'], raw_list['block_list'])),
+            'trust_list': raw_list['trust_list'],
+        }
+
+    def deltas_since(self, version: int) -> list[dict[str, any]]:
+        '''
+        Reads the deltas to update the list from a version to the current
+        version
+
+        :returns: the deltas, in the order to apply them
+        :raises: ValueError if the feed does not have the deltas to update
+        from the version, in which case the snapshot has to be used
+        '''
+
+        deltas: list[dict[str, any]] = []
+        delta_file: dict[str, any]
+        for delta_file in self.manifest['deltas']:
+            if delta_file['from_version'] < version:
+                continue
+            if delta_file['from_version'] != version:
+                break
+
+            deltas.append(self._read_file(delta_file))
+            version = delta_file['to_version']
+
+        if version != self.version:
+            raise ValueError(f'No deltas to update from version {version}')
+
+        return deltas
+
+    def update(self, state: ListState, version: int
+               ) -> tuple[ListState, int]:
+        '''
+        Updates the state of a list to the current version of the feed
+
+        :returns: the updated state and its version
+        '''
+
+        delta: dict[str, any]
+        for delta in self.deltas_since(version):
+            state = apply_delta(state, delta)
+
+        return state, self.version
+
+    def compact(self, max_deltas: int) -> None:
+        '''
+        Combines the oldest deltas into a single delta, so that the feed
+        has at most max_deltas deltas. Subscribers with a version between
+        the versions of the combined deltas have to download the snapshot.
+        '''
+
+        deltas: list[dict[str, any]] = self.manifest['deltas']
+        if max_deltas < 1 or len(deltas) <= max_deltas:
+            return
+
+        combine: list[dict[str, any]] = deltas[:len(deltas) - max_deltas + 1]
+        delta: dict[str, any] = self._read_file(combine[0])
+        delta_file: dict[str, any]
+        for delta_file in combine[1:]:
+            delta = compose_deltas(delta, self._read_file(delta_file))
+
+        self.manifest['deltas'] = [self._write_delta(delta)] + \
+            deltas[len(combine):]
+        self._write_manifest()
+
+        for delta_file in combine:
+            self._remove(delta_file['file'])
+
+        _LOGGER.info(
+            f'Combined {len(combine)} deltas into delta from version '
+            f'{delta["from_version"]} to {delta["to_version"]}'
+        )
+
+    def verify(self) -> bool:
+        '''
+        Verifies that applying the deltas to the base snapshot of the feed
+        gives the current snapshot
+        '''
+
+        base_version: int = self.manifest['base']['version']
+        state: ListState = self.read_state(base_version)
+        try:
+            state, _ = self.update(state, base_version)
+        except ValueError as exc:
+            _LOGGER.warning(f'Delta feed does not verify: {exc}')
+            return False
+
+        return state_hash(state) == state_hash(self.read_state())
+
+    @staticmethod
+    def _meta_without_timestamp(meta: dict[str, any]) -> dict[str, any]:
+        return {
+            key: value for key, value in meta.items()
+            if key != 'last_updated'
+        }
+
+    def _write_snapshot(self, state: ListState, version: int
+                        ) -> dict[str, any]:
+        # The snapshot can also be loaded with ModerationList.load()
+        snapshot: dict[str, any] = {
+            'format': SNAPSHOT_FORMAT,
+            'version': SNAPSHOT_VERSION,
+            'list': {
+                'meta': state['meta'],
+                'block_list': list(state['blocks'].values()),
+                'trust_list': state['trust_list'],
+            },
+            'list_version': version,
+            'block_keys': list(state['blocks']),
+        }
+        file_info: dict[str, any] = self._write_file(
+            f'snapshot-{version}.json', snapshot
+        )
+        file_info['version'] = version
+
+        return file_info
+
+    def _write_delta(self, delta: dict[str, any]) -> dict[str, any]:
+        file_info: dict[str, any] = self._write_file(
+            f'delta-{delta["from_version"]}-{delta["to_version"]}.json',
+            delta
+        )
+        file_info['from_version'] = delta['from_version']
+        file_info['to_version'] = delta['to_version']
+
+        return file_info
+
+    def _write_file(self, filename: str, data: dict[str, any]
+                    ) -> dict[str, any]:
+        content: bytes = orjson.dumps(data)
+        path: str = os.path.join(self.directory, filename)
+        with open(f'{path}.tmp', 'wb') as file_desc:
+            file_desc.write(content)
+        os.replace(f'{path}.tmp', path)
+
+        return {
+            'file': filename,
+            'hash': hashlib.sha256(content).hexdigest(),
+            'size': len(content),
+        }
+
+    def _read_file(self, file_info: dict[str, any]) -> dict[str, any]:
+        with open(os.path.join(self.directory, file_info['file']), 'rb'
+                  ) as file_desc:
+            content: bytes = file_desc.read()
+
+        if hashlib.sha256(content).hexdigest() != file_info['hash']:
+            raise ValueError(f'Hash mismatch for {file_info["file"]}')
+
+        return orjson.loads(content)
+
+    def _write_manifest(self) -> None:
+        self._write_file(MANIFEST_FILE, self.manifest)
+
+    def _remove(self, filename: str) -> None:
+        try:
+            os.remove(os.path.join(self.directory, filename))
+        except FileNotFoundError:
+            pass
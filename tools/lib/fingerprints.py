@@ -0,0 +1,128 @@
+'''
+Fingerprints of the rows of a workbook, to only process the rows that
+changed since the previous time the workbook was added to a list
+
+The fingerprints are stored in a JSON file next to the moderation list.
+For each row, the file has the SHA-256 hash of the values of the row,
+keyed by the identity of the row: the name and the primary social
+accounts of the entry in the row. A hash of the header of the workbook
+is stored as well, as the fingerprints of the rows are no longer valid
+when the columns of the workbook change.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import hashlib
+
+from logging import Logger, getLogger
+
+import orjson
+
+_LOGGER: Logger = getLogger(__name__)
+
+
+class RowFingerprints:
+    def __init__(self, filename: str) -> None:
+        '''
+        Fingerprints of the rows of a workbook
+
+        :param filename: The file with the fingerprints of the previous run,
+        which does not have to exist
+        '''
+
+        self.filename: str = filename
+
+        self.columns_hash: str | None = None
+        self.previous: dict[str, str] = {}
+        self.current: dict[str, str] = {}
+
+        self.rows: int = 0
+        self.changed_rows: int = 0
+
+        try:
+            with open(filename, 'rb') as file_desc:
+                data: dict[str, any] = orjson.loads(file_desc.read())
+            self.columns_hash = data.get('columns')
+            self.previous = data.get('rows') or {}
+        except FileNotFoundError:
+            pass
+        except (OSError, orjson.JSONDecodeError) as exc:
+            _LOGGER.warning(f'Ignoring invalid row fingerprints: {exc}')
+
+    @staticmethod
+    def content_hash(values: list[any]) -> str:
+        return hashlib.sha256(orjson.dumps(values, default=str)).hexdigest()
+
+    def clear(self) -> None:
+        '''
+        Forgets the fingerprints of the previous run, so all rows are
+        processed
+        '''
+
+        self.previous = {}
+
+    def set_columns(self, columns: list[str]) -> None:
+        '''
+        Sets the header of the workbook. If the header differs from the
+        previous run, all rows are processed.
+        '''
+
+        columns_hash: str = RowFingerprints.content_hash(columns)
+        if columns_hash != self.columns_hash:
+            if self.previous:
+                _LOGGER.info('The columns changed, processing all rows')
+            self.clear()
+
+        self.columns_hash = columns_hash
+
+    def is_unchanged(self, identity: str, values: list[any]) -> bool:
+        '''
+        Records the fingerprint of a row
+
+        :param identity: The identity of the row
+        :param values: The values of the row
+        :returns: whether the row is the same as in the previous run
+        '''
+
+        # Rows with the same identity are told apart by the order in which
+        # they appear
+        key: str = identity
+        occurrence: int = 1
+        while key in self.current:
+            occurrence += 1
+            key = f'{identity} #{occurrence}'
+
+        content_hash: str = RowFingerprints.content_hash(values)
+        self.current[key] = content_hash
+        self.rows += 1
+
+        if self.previous.get(key) == content_hash:
+            return True
+
+        self.changed_rows += 1
+
+        return False
+
+    def removed(self) -> list[str]:
+        '''
+        Gets the identities of the rows of the previous run that are no
+        longer in the workbook
+        '''
+
+        return [key for key in self.previous if key not in self.current]
+
+    def save(self) -> None:
+        '''
+        Saves the fingerprints of the rows that were seen in this run
+        '''
+
+        data: dict[str, any] = {
+            'columns': self.columns_hash,
+            'rows': self.current,
+        }
+        with open(f'{self.filename}.tmp', 'wb') as file_desc:
+            file_desc.write(orjson.dumps(data))
+        os.replace(f'{self.filename}.tmp', self.filename)
@@ -0,0 +1,146 @@
+'''
+HTTP revalidation cache for downloaded moderation lists
+
+The body of each downloaded list is stored in the cache directory under
+the basename of its URL. Next to it, a '<basename>.meta.json' file
+keeps the ETag and Last-Modified headers of the response, the SHA-256
+hash of the body and the stats that were computed from it, so that a
+'304 Not Modified' response (or an unchanged body) does not require the
+list to be parsed again.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import hashlib
+
+from dataclasses import field, dataclass
+from logging import Logger, getLogger
+
+import orjson
+
+_LOGGER: Logger = getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    etag: str | None = field(default=None)
+    last_modified: str | None = field(default=None)
+    content_hash: str | None = field(default=None)
+    stats: dict[str, any] = field(default_factory=dict)
+
+
+class ListCache:
+    def __init__(self, cache_dir: str) -> None:
+        '''
+        Cache for downloaded lists, with the data needed to revalidate
+        them using conditional GET requests
+
+        :param cache_dir: The directory to store the lists in, which must
+        already exist
+        '''
+
+        if not os.path.isdir(cache_dir):
+            raise ValueError(f'Cache directory {cache_dir} does not exist')
+
+        self.cache_dir: str = cache_dir
+
+    @staticmethod
+    def content_hash(raw_list: str) -> str:
+        return hashlib.sha256(raw_list.encode('utf-8')).hexdigest()
+
+    def body_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, url.split('/')[-1])
+
+    def meta_path(self, url: str) -> str:
+        return f'{self.body_path(url)}.meta.json'
+
+    def get(self, url: str) -> CacheEntry | None:
+        '''
+        Gets the cached metadata for the URL
+
+        :returns: the cache entry or None if the URL is not in the cache
+        '''
+
+        try:
+            with open(self.meta_path(url), 'rb') as file_desc:
+                data: dict[str, any] = orjson.loads(file_desc.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, orjson.JSONDecodeError) as exc:
+            _LOGGER.warning(
+                f'Ignoring unreadable cache entry for {url}: {exc}'
+            )
+            return None
+
+        # Different URLs can share the same basename
+        if data.get('url') != url:
+            return None
+
+        return CacheEntry(**data)
+
+    def request_headers(self, url: str) -> dict[str, str]:
+        '''
+        Gets the headers for a conditional GET request for the URL
+        '''
+
+        return ListCache.revalidation_headers(self.get(url))
+
+    @staticmethod
+    def revalidation_headers(entry: CacheEntry | None) -> dict[str, str]:
+        '''
+        Gets the headers for a conditional GET request from a cache entry
+        that was already read with get()
+        '''
+
+        if not entry or not entry.stats:
+            return {}
+
+        headers: dict[str, str] = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+        return headers
+
+    def store(self, url: str, raw_list: str, etag: str | None,
+              last_modified: str | None, stats: dict[str, any]) -> None:
+        '''
+        Stores the downloaded list and its metadata in the cache
+        '''
+
+        entry = CacheEntry(
+            url=url, etag=etag, last_modified=last_modified,
+            content_hash=ListCache.content_hash(raw_list), stats=stats
+        )
+
+        body_path: str = self.body_path(url)
+        with open(f'{body_path}.tmp', 'w') as file_desc:
+            file_desc.write(raw_list)
+        os.replace(f'{body_path}.tmp', body_path)
+
+        self._write_meta(entry)
+
+    def update_stats(self, url: str, stats: dict[str, any]) -> None:
+        '''
+        Replaces the stats of a list that is in the cache
+        '''
+
+        entry: CacheEntry | None = self.get(url)
+        if entry is None:
+            raise ValueError(f'List {url} is not in the cache')
+
+        entry.stats = stats
+        self._write_meta(entry)
+
+    def _write_meta(self, entry: CacheEntry) -> None:
+        meta_path: str = self.meta_path(entry.url)
+        with open(f'{meta_path}.tmp', 'wb') as file_desc:
+            file_desc.write(
+                orjson.dumps(entry.__dict__, option=orjson.OPT_INDENT_2)
+            )
+        os.replace(f'{meta_path}.tmp', meta_path)
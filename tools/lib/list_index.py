@@ -0,0 +1,323 @@
+'''
+Index of the accounts on the lists of a list-of-lists, to find the lists
+that have an account and how much lists overlap
+
+For each normalised (platform, handle), the index has the lists that have
+the account, with the categories that the list assigns to it. The lists
+are numbered in the order they were added to the index and the index is
+stored as a JSON file:
+
+    {
+        "format": "byomod-list-index", "version": 1,
+        "lists": [{"url": "...", "content_hash": "..."}, ...],
+        "accounts": {"twitter": {"<handle>": {"<list id>": [...]}}}
+    }
+
+The content hash of each list is the hash of the list in the ListCache, so
+ListOfLists only updates the accounts of a list when the list changed.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+
+from logging import Logger, getLogger
+
+import orjson
+
+from tools.lib.lookup import normalize_handle
+
+_LOGGER: Logger = getLogger(__name__)
+
+LIST_INDEX_FORMAT: str = 'byomod-list-index'
+LIST_INDEX_VERSION: int = 1
+
+# The accounts of a list, by platform and normalised handle, with their
+# categories
+ListAccounts = dict[str, dict[str, set[str] | list[str]]]
+
+
+class CrossListIndex:
+    def __init__(self, filename: str | None = None) -> None:
+        '''
+        Index of the accounts on multiple lists
+
+        :param filename: The file that the index is loaded from, if it
+        exists, and saved to
+        '''
+
+        self.filename: str | None = filename
+
+        # The URL and content hash of each list, by list id. The id of a
+        # list that was removed is not reused until the index is saved
+        self.lists: list[dict[str, str | None] | None] = []
+        self.list_ids: dict[str, int] = {}
+
+        # platform -> handle -> list id -> categories
+        self.accounts: dict[str, dict[str, dict[int, list[str]]]] = {}
+
+        if filename:
+            self.load(filename)
+
+    def load(self, filename: str) -> None:
+        try:
+            with open(filename, 'rb') as file_desc:
+                data: dict[str, any] = orjson.loads(file_desc.read())
+        except FileNotFoundError:
+            return
+        except (OSError, orjson.JSONDecodeError) as exc:
+            _LOGGER.warning(f'Ignoring invalid list index: {exc}')
+            return
+
+        if (data.get('format') != LIST_INDEX_FORMAT
+                or data.get('version') != LIST_INDEX_VERSION):
+            _LOGGER.warning(f'Ignoring {filename}, it is not a list index')
+            return
+
+        self.lists = data['lists']
+        self.list_ids = {
+            list_data['url']: list_id
+            for list_id, list_data in enumerate(self.lists)
+        }
+        self.accounts = {
+            platform: {
+                handle: {
+                    int(list_id): categories
+                    for list_id, categories in postings.items()
+                }
+                for handle, postings in handles.items()
+            }
+            for platform, handles in data['accounts'].items()
+        }
+
+    def save(self, filename: str | None = None) -> None:
+        '''
+        Saves the index, with the ids of the lists renumbered to leave out
+        the lists that were removed
+        '''
+
+        filename = filename or self.filename
+        if not filename:
+            raise ValueError('No filename for the list index')
+
+        self._renumber(
+            [
+                list_id for list_id, list_data in enumerate(self.lists)
+                if list_data is not None
+            ]
+        )
+
+        data: dict[str, any] = {
+            'format': LIST_INDEX_FORMAT,
+            'version': LIST_INDEX_VERSION,
+            'lists': self.lists,
+            'accounts': {
+                platform: {
+                    handle: {
+                        str(list_id): categories
+                        for list_id, categories in sorted(postings.items())
+                    }
+                    for handle, postings in sorted(handles.items())
+                }
+                for platform, handles in sorted(self.accounts.items())
+            },
+        }
+        with open(f'{filename}.tmp', 'wb') as file_desc:
+            file_desc.write(orjson.dumps(data))
+        os.replace(f'{filename}.tmp', filename)
+
+    def _renumber(self, list_ids: list[int]) -> None:
+        '''
+        Renumbers the lists, so that the list with id list_ids[n] gets id n.
+        The lists that are not in list_ids must have been removed.
+        '''
+
+        renumbered: dict[int, int] = {
+            list_id: new_id for new_id, list_id in enumerate(list_ids)
+        }
+        self.lists = [self.lists[list_id] for list_id in list_ids]
+        self.list_ids = {
+            list_data['url']: list_id
+            for list_id, list_data in enumerate(self.lists)
+        }
+        self.accounts = {
+            platform: {
+                handle: {
+                    renumbered[list_id]: categories
+                    for list_id, categories in postings.items()
+                }
+                for handle, postings in handles.items()
+            }
+            for platform, handles in self.accounts.items()
+        }
+
+    def has_list(self, url: str, content_hash: str | None = None) -> bool:
+        '''
+        Checks whether the index has the accounts of a list
+
+        :param url: The URL of the list
+        :param content_hash: If set, only return True if the accounts of
+        the list were indexed from the list with this content hash
+        '''
+
+        list_id: int | None = self.list_ids.get(url)
+        if list_id is None:
+            return False
+
+        return (
+            content_hash is None
+            or self.lists[list_id]['content_hash'] == content_hash
+        )
+
+    def set_list(self, url: str, content_hash: str | None,
+                 accounts: ListAccounts) -> None:
+        '''
+        Replaces the accounts of a list in the index
+
+        :param url: The URL of the list
+        :param content_hash: The hash of the content of the list
+        :param accounts: The accounts of the list, see
+        ModerationList.platform_accounts()
+        '''
+
+        self.remove_list(url)
+
+        list_id: int = len(self.lists)
+        self.lists.append({'url': url, 'content_hash': content_hash})
+        self.list_ids[url] = list_id
+
+        platform: str
+        handles: dict[str, set[str] | list[str]]
+        for platform, handles in accounts.items():
+            platform_accounts: dict[str, dict[int, list[str]]] = \
+                self.accounts.setdefault(platform, {})
+            handle: str
+            categories: set[str] | list[str]
+            for handle, categories in handles.items():
+                platform_accounts.setdefault(handle, {})[list_id] = sorted(
+                    categories
+                )
+
+    def remove_list(self, url: str) -> None:
+        list_id: int | None = self.list_ids.pop(url, None)
+        if list_id is None:
+            return
+
+        self.lists[list_id] = None
+        handles: dict[str, dict[int, list[str]]]
+        for handles in self.accounts.values():
+            removed: list[str] = []
+            handle: str
+            postings: dict[int, list[str]]
+            for handle, postings in handles.items():
+                if postings.pop(list_id, None) is not None and not postings:
+                    removed.append(handle)
+
+            for handle in removed:
+                del handles[handle]
+
+    def retain(self, urls: list[str]) -> None:
+        '''
+        Removes the lists that are not in the URLs from the index and
+        numbers the lists in the order of the URLs
+        '''
+
+        for url in set(self.list_ids) - set(urls):
+            self.remove_list(url)
+
+        self._renumber(
+            [self.list_ids[url] for url in urls if url in self.list_ids]
+        )
+
+    def find(self, platform: str, handle: str) -> dict[str, list[str]]:
+        '''
+        Finds the lists that have an account
+
+        :param platform: The social platform
+        :param handle: The handle or the URL of the account
+        :returns: the categories that each list assigns to the account, by
+        the URL of the list
+        '''
+
+        handle = normalize_handle(handle)
+        postings: dict[int, list[str]] = self.accounts.get(
+            platform.lower().replace(' ', ''), {}
+        ).get(handle, {})
+
+        return {
+            self.lists[list_id]['url']: categories
+            for list_id, categories in sorted(postings.items())
+        }
+
+    def overlap(self, url: str, other_url: str) -> dict[str, int | float]:
+        '''
+        Compares the accounts of two lists
+
+        :returns: the number of accounts of each list, the number of
+        accounts on both lists and the Jaccard similarity of the lists
+        '''
+
+        list_id: int = self.list_ids[url]
+        other_id: int = self.list_ids[other_url]
+
+        accounts: int = 0
+        other_accounts: int = 0
+        shared: int = 0
+        for handles in self.accounts.values():
+            for postings in handles.values():
+                in_list: bool = list_id in postings
+                in_other: bool = other_id in postings
+                accounts += in_list
+                other_accounts += in_other
+                shared += in_list and in_other
+
+        union: int = accounts + other_accounts - shared
+
+        return {
+            'accounts': accounts,
+            'other_accounts': other_accounts,
+            'shared': shared,
+            'jaccard': shared / union if union else 0.0,
+        }
+
+    def list_sizes(self) -> dict[str, int]:
+        '''
+        Counts the accounts of each list
+        '''
+
+        sizes: dict[int, int] = {}
+        for handles in self.accounts.values():
+            for postings in handles.values():
+                for list_id in postings:
+                    sizes[list_id] = sizes.get(list_id, 0) + 1
+
+        return {
+            list_data['url']: sizes.get(list_id, 0)
+            for list_id, list_data in enumerate(self.lists)
+            if list_data is not None
+        }
+
+    def overlaps(self) -> dict[tuple[str, str], int]:
+        '''
+        Counts the accounts that each pair of lists have in common, in a
+        single pass over the index
+
+        :returns: the number of shared accounts, by the pair of URLs of the
+        lists, for the pairs that share accounts
+        '''
+
+        counts: dict[tuple[int, int], int] = {}
+        for handles in self.accounts.values():
+            for postings in handles.values():
+                list_ids: list[int] = sorted(postings)
+                for position, list_id in enumerate(list_ids):
+                    for other_id in list_ids[position + 1:]:
+                        pair: tuple[int, int] = (list_id, other_id)
+                        counts[pair] = counts.get(pair, 0) + 1
+
+        return {
+            (self.lists[list_id]['url'], self.lists[other_id]['url']): count
+            for (list_id, other_id), count in sorted(counts.items())
+        }
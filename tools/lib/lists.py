@@ -1,20 +1,41 @@
 '''
 Classes for working with moderation lists
 
+The timestamps of the statistics of social accounts are returned as
+timezone-aware datetimes in UTC. Naive datetimes that are assigned to them
+are considered to be in UTC.
+
 :maintainer: Steven Hessing
 :copyright: Copyright 2024
 :licence: GPLv3.0
 '''
 
+import io
 import os
+import sys
 import csv
+import mmap
+import bisect
+import asyncio
+import zipfile
 import warnings
 
+from array import array
 from typing import Self
+from typing import Iterator
+from typing import Iterable
+from typing import TextIO
+from typing import KeysView
+from typing import Protocol
 from datetime import UTC
 from datetime import datetime
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import field, dataclass
 from collections import OrderedDict
+from collections.abc import MutableSet
+from urllib.parse import urlparse
+from xml.parsers import expat
 from logging import Logger, getLogger
 
 import httpx
@@ -24,14 +45,62 @@ from openpyxl import Workbook
 from openpyxl import load_workbook as load_excel_workbook
 from openpyxl.cell.cell import Cell
 from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.xml.functions import fromstring
+from openpyxl.xml.constants import SHEET_MAIN_NS, REL_NS
+from openpyxl.packaging.relationship import (
+    get_rels_path,
+    get_dependents,
+    RelationshipList,
+)
 
 from ruamel.yaml import YAML
+from ruamel.yaml.nodes import Node
+from ruamel.yaml.parser import Parser
+from ruamel.yaml.composer import Composer
+from ruamel.yaml.constructor import BaseConstructor
+from ruamel.yaml.events import (
+    Event,
+    MappingEndEvent,
+    MappingStartEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+    StreamEndEvent,
+)
+
+try:
+    from _ruamel_yaml import CParser
+except ImportError:
+    CParser = None
+
+from tools.lib.list_cache import ListCache, CacheEntry
+from tools.lib.fingerprints import RowFingerprints
+from tools.lib.lookup import LookupTable, normalize_handle
+from tools.lib.bloom import BloomFilter, BLOOM_FALSE_POSITIVE_RATE
+from tools.lib.list_index import CrossListIndex, ListAccounts
+from tools.lib.sketches import MinHashSketch, ListSketches
 
 _LOGGER: Logger = getLogger(__name__)
 
 
 ColumnMap = dict[str, set[int] | int]
 
+# Moderation lists can be stored as a JSON snapshot, which loads and saves
+# much faster than YAML
+SNAPSHOT_FORMAT: str = 'byomod-snapshot'
+SNAPSHOT_VERSION: int = 1
+SNAPSHOT_EXTENSIONS: tuple[str, ...] = ('.json', '.snapshot')
+
+YAML_MAP_TAG: str = 'tag:yaml.org,2002:map'
+
+# Defaults for downloading the lists in a list-of-lists
+LIST_DOWNLOAD_CONCURRENCY: int = 10
+LIST_DOWNLOAD_CONNECTIONS_PER_HOST: int = 4
+LIST_DOWNLOAD_TIMEOUT: float = 30.0
+
+# Each worker for parallel CSV ingestion gets this many shards of the file
+CSV_SHARDS_PER_WORKER: int = 4
+
 
 class SocialPlatform:
     def __init__(self, name: str, url: str,
@@ -40,6 +109,17 @@ class SocialPlatform:
         self.url: str = url
         self.social_url_prefix: str = social_url_prefix or url
 
+    def __reduce__(self) -> tuple:
+        # Social accounts compare and hash their platform by identity, so the
+        # platforms in SOCIAL_PLATFORMS must be unpickled as the same objects
+        key: str = self.name.lower().replace(' ', '')
+        if SOCIAL_PLATFORMS.get(key) is self:
+            return (_social_platform, (key,))
+
+        return (
+            SocialPlatform, (self.name, self.url, self.social_url_prefix)
+        )
+
 
 SOCIAL_PLATFORMS: dict[str, SocialPlatform] = {
     'facebook': SocialPlatform('Facebook', 'https://www.facebook.com/'),
@@ -74,7 +154,123 @@ SOCIAL_PLATFORMS: dict[str, SocialPlatform] = {
 }
 
 
+def _social_platform(key: str) -> SocialPlatform:
+    return SOCIAL_PLATFORMS[key]
+
+
+@dataclass(frozen=True, slots=True)
+class RowPlan:
+    '''
+    The columns of a sheet with moderation entries, compiled from the
+    column map of its header so that the rows can be processed without
+    looking up the columns again for each row
+    '''
+
+    first_name: int | None = None
+    last_name: int | None = None
+    business_name: int | None = None
+    business_type: int | None = None
+    languages: int | None = None
+    categories: int | None = None
+    politician: int | None = None
+    journalist: int | None = None
+    web: tuple[int, ...] = ()
+    # (platform, column, is_primary) for each column with a social account,
+    # ordered by platform
+    socials: tuple[tuple[SocialPlatform, int, bool], ...] = ()
+
+    @staticmethod
+    def from_column_map(column_map: ColumnMap) -> Self:
+        fields: dict[str, int] = {}
+        name: str
+        for name in ('firstname', 'lastname', 'businessname', 'businesstype',
+                     'languages', 'categories', 'politician', 'journalist'):
+            if name in column_map:
+                fields[name] = next(iter(column_map[name]))
+
+        socials: list[tuple[SocialPlatform, int, bool]] = []
+        social: str
+        platform: SocialPlatform
+        for social, platform in SOCIAL_PLATFORMS.items():
+            columns: set[int] = column_map.get(social)
+            if not columns:
+                continue
+
+            primary: int = min(columns)
+            socials.extend(
+                (platform, column, column == primary) for column in columns
+            )
+
+        return RowPlan(
+            first_name=fields.get('firstname'),
+            last_name=fields.get('lastname'),
+            business_name=fields.get('businessname'),
+            business_type=fields.get('businesstype'),
+            languages=fields.get('languages'),
+            categories=fields.get('categories'),
+            politician=fields.get('politician'),
+            journalist=fields.get('journalist'),
+            web=tuple(column_map.get('web', ())),
+            socials=tuple(socials),
+        )
+
+    def identity(self, row_columns: list[str]) -> str:
+        '''
+        Gets the identity of the entry in a row: its name and its primary
+        social accounts
+        '''
+
+        names: list[str] = [
+            str(row_columns[index] or '') if index is not None else ''
+            for index in (self.first_name, self.last_name, self.business_name)
+        ]
+        accounts: list[str] = [
+            f'{platform.name}: {row_columns[index]}'
+            for platform, index, is_primary in self.socials
+            if is_primary and row_columns[index]
+        ]
+
+        return ' '.join(name for name in names if name) + \
+            f' ({", ".join(accounts)})'
+
+
+_EPOCH: datetime = datetime(1970, 1, 1, tzinfo=UTC)
+_ONE_MICROSECOND: timedelta = timedelta(microseconds=1)
+
+
+def _to_epoch_us(timestamp: datetime) -> int:
+    '''
+    Converts a datetime to integer microseconds since the epoch. Naive
+    datetimes are considered to be in UTC.
+    '''
+
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=UTC)
+
+    return (timestamp - _EPOCH) // _ONE_MICROSECOND
+
+
+def _from_epoch_us(epoch_us: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=epoch_us)
+
+
+def _stat_value(value: int | float | None) -> int | None:
+    '''
+    Converts the value of a statistic to an integer. The statistics are
+    counts, but spreadsheets can give them as floats.
+    '''
+
+    if isinstance(value, float):
+        return round(value)
+
+    return value
+
+
 class AccountStat:
+    # Instances are kept for every data point of every account so they
+    # do not get a __dict__ and the timestamp is stored as an integer
+    __slots__ = ('_timestamp', 'followers', 'assets', 'views')
+
     def __init__(self, timestamp: int | float | datetime | None = None,
                  followers: int | None = None,
                  assets: int | None = None,
@@ -94,9 +290,21 @@ class AccountStat:
                 'Either followers,assets, or views must be provided'
             )
 
-        self.followers: int | None = followers
-        self.assets: int | None = assets
-        self.views: int | None = views
+        self.followers: int | None = _stat_value(followers)
+        self.assets: int | None = _stat_value(assets)
+        self.views: int | None = _stat_value(views)
+
+    @property
+    def timestamp(self) -> datetime:
+        '''
+        The time of the data point, as a timezone-aware datetime in UTC
+        '''
+
+        return _from_epoch_us(self._timestamp)
+
+    @timestamp.setter
+    def timestamp(self, value: datetime) -> None:
+        self._timestamp: int = _to_epoch_us(value)
 
     def as_dict(self) -> dict[str, int | datetime]:
         return {
@@ -116,7 +324,243 @@ class AccountStat:
         )
 
 
+def _parse_timestamp(value: str | datetime | None) -> datetime | str | None:
+    '''
+    Converts an ISO 8601 timestamp to a datetime, like the YAML loader does
+    for timestamps. Other values are returned unchanged.
+    '''
+
+    if not isinstance(value, str):
+        return value
+
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return value
+
+
+def parse_entry_timestamps(entry_data: dict[str, any]) -> None:
+    '''
+    Converts the timestamps in the data of an entry, which JSON stores as
+    strings, back to datetimes
+    '''
+
+    account_data: dict[str, any]
+    for account_data in entry_data.get('social_accounts') or []:
+        account_data['last_active'] = _parse_timestamp(
+            account_data.get('last_active')
+        )
+        stat_data: dict[str, any]
+        for stat_data in account_data.get('stats') or []:
+            stat_data['timestamp'] = _parse_timestamp(
+                stat_data.get('timestamp')
+            )
+
+
+# The statistics that are tracked for social accounts
+STAT_COLUMNS: tuple[str, ...] = ('followers', 'assets', 'views')
+
+
+class AccountStats:
+    # One instance per account, with the array only allocated when the
+    # first data point is added
+    __slots__ = ('_data', '_stats_list')
+
+    # Each data point takes _STRIDE consecutive items in the array: the
+    # timestamp, a value for each of the STAT_COLUMNS and a mask with a bit
+    # for each statistic that is present in the data point
+    _STRIDE: int = len(STAT_COLUMNS) + 2
+    _MASK: int = len(STAT_COLUMNS) + 1
+
+    def __init__(self, stats: Iterable[AccountStat] = ()) -> None:
+        '''
+        Time series of the statistics of an account. The data is stored in a
+        single array of integers, with timestamps in microseconds since the
+        epoch, from which each statistic can be sliced out as a column. The
+        data points are kept ordered by timestamp. It can be used as a list
+        of AccountStat instances.
+
+        :param stats: The data points to add
+        '''
+
+        self._data: array | None = None
+
+        # The list with the StatsColumns that include the data points, set
+        # when the columns are built, so that appending a data point only
+        # invalidates the columns of that list
+        self._stats_list: ModerationList | None = None
+
+        stat: AccountStat
+        for stat in stats:
+            self.append(stat)
+
+    def __len__(self) -> int:
+        if self._data is None:
+            return 0
+
+        return len(self._data) // AccountStats._STRIDE
+
+    def __reduce__(self) -> tuple:
+        return (_restore_account_stats, (self._data,))
+
+    def __getitem__(self, index: int) -> AccountStat:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('AccountStats index out of range')
+
+        offset: int = index * AccountStats._STRIDE
+        mask: int = self._data[offset + AccountStats._MASK]
+        values: dict[str, int | None] = {
+            column: self._data[offset + bit + 1] if mask & (1 << bit) else None
+            for bit, column in enumerate(STAT_COLUMNS)
+        }
+
+        return AccountStat(
+            timestamp=_from_epoch_us(self._data[offset]), **values
+        )
+
+    def __iter__(self) -> Iterator[AccountStat]:
+        index: int
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, stat: AccountStat) -> None:
+        '''
+        Adds a data point, after the data points with the same or an
+        earlier timestamp
+        '''
+
+        if self._data is None:
+            self._data = array('q')
+
+        mask: int = 0
+        point: array = array('q', [stat._timestamp])
+        bit: int
+        column: str
+        for bit, column in enumerate(STAT_COLUMNS):
+            value: int | None = _stat_value(getattr(stat, column))
+            if value is not None:
+                mask |= 1 << bit
+            point.append(value or 0)
+        point.append(mask)
+
+        if self._stats_list is not None:
+            self._stats_list._stats_changed()
+
+        size: int = len(self)
+        if not size or self._data[-AccountStats._STRIDE] <= stat._timestamp:
+            self._data.extend(point)
+            return
+
+        index: int = bisect.bisect_right(
+            self.column('timestamp'), stat._timestamp
+        )
+        offset: int = index * AccountStats._STRIDE
+        self._data[offset:offset] = point
+
+    def column(self, column: str) -> array:
+        '''
+        Gets the values of a statistic for all data points, ordered by
+        timestamp. Data points without a value for the statistic have 0 in
+        the column, use mask() to tell them apart.
+
+        :param column: timestamp, followers, assets or views
+        '''
+
+        if self._data is None:
+            return array('q')
+
+        offset: int = 0
+        if column != 'timestamp':
+            offset = STAT_COLUMNS.index(column) + 1
+
+        return self._data[offset::AccountStats._STRIDE]
+
+    def mask(self) -> array:
+        '''
+        Gets the masks of all data points, with bit N set if the data point
+        has a value for STAT_COLUMNS[N]
+        '''
+
+        if self._data is None:
+            return array('q')
+
+        return self._data[AccountStats._MASK::AccountStats._STRIDE]
+
+    def latest(self, column: str = 'followers') -> int | None:
+        '''
+        Gets the most recent value of the statistic
+
+        :param column: followers, assets or views
+        :returns: the value or None if the account has no data for it
+        '''
+
+        if self._data is None:
+            return None
+
+        bit: int = 1 << STAT_COLUMNS.index(column)
+        offset: int = STAT_COLUMNS.index(column) + 1
+        stride: int = AccountStats._STRIDE
+        data: array = self._data
+        index: int
+        for index in range(len(data) - stride, -1, -stride):
+            if data[index + AccountStats._MASK] & bit:
+                return data[index + offset]
+
+        return None
+
+    def growth(self, column: str = 'followers',
+               window: timedelta | None = None,
+               until: datetime | None = None) -> int | None:
+        '''
+        Gets the change in the value of the statistic between the first and
+        the last data point in the window
+
+        :param column: followers, assets or views
+        :param window: The length of the window, defaults to all data points
+        :param until: The end of the window, defaults to the most recent
+        data point
+        :returns: the growth or None if there is no data in the window
+        '''
+
+        if self._data is None:
+            return None
+
+        timestamps: array = self.column('timestamp')
+        end: int = _to_epoch_us(until) if until else timestamps[-1]
+        start: int | None = None
+        if window is not None:
+            start = end - window // _ONE_MICROSECOND
+
+        # The data points in the window
+        first: int = 0
+        if start is not None:
+            first = bisect.bisect_left(timestamps, start)
+        last: int = bisect.bisect_right(timestamps, end)
+
+        bit: int = 1 << STAT_COLUMNS.index(column)
+        values: list[int] = [
+            value for value, mask in zip(
+                self.column(column)[first:last], self.mask()[first:last]
+            )
+            if mask & bit
+        ]
+        if not values:
+            return None
+
+        return values[-1] - values[0]
+
+
 class SocialAccount:
+    # Large lists have many accounts, so they do not get a __dict__, the
+    # handle is interned and the URL is only stored if it can not be
+    # derived from the platform and the handle
+    __slots__ = (
+        'platform', 'handle', '_url', 'account_stats', 'is_primary',
+        'status', 'last_active'
+    )
+
     def __init__(self, platform: str | SocialPlatform, handle: str,
                  url: str, followers: int | None = None,
                  assets: int | None = None, views: int | None = None,
@@ -142,15 +586,17 @@ class SocialAccount:
             platform = SOCIAL_PLATFORMS[platform.lower().replace(' ', '')]
 
         self.platform: SocialPlatform = platform
+        if isinstance(handle, str):
+            handle = sys.intern(handle)
         self.handle: str = handle
 
-        self.url: str = url
-
         # Why do platforms change their domain? This is a hack to fix
-        if 'twitter.com' in url:
-            self.url = url.replace('twitter.com', 'x.com')
+        if url and 'twitter.com' in url:
+            url = url.replace('twitter.com', 'x.com')
+
+        self.url: str = url
 
-        self.account_stats: list[AccountStat] = []
+        self.account_stats: AccountStats = AccountStats()
         if followers or assets or views:
             self.account_stats.append(
                 AccountStat(
@@ -161,6 +607,8 @@ class SocialAccount:
             )
 
         self.is_primary: bool | None = is_primary
+        if isinstance(status, str):
+            status = sys.intern(status)
         self.status: str = status
         self.last_active: datetime | None
         if isinstance(last_active, str) and last_active == 'unknown':
@@ -168,6 +616,20 @@ class SocialAccount:
         else:
             self.last_active: datetime | None = last_active
 
+    @property
+    def url(self) -> str:
+        if self._url is None and isinstance(self.handle, str):
+            return self.platform.social_url_prefix + self.handle
+
+        return self._url
+
+    @url.setter
+    def url(self, value: str) -> None:
+        self._url: str | None = value
+        if (isinstance(self.handle, str)
+                and value == self.platform.social_url_prefix + self.handle):
+            self._url = None
+
     def __repr__(self) -> str:
         return f'{self.platform.name.lower()} {self.url.lower()}'
 
@@ -185,6 +647,16 @@ class SocialAccount:
     def __hash__(self) -> int:
         return hash((self.platform, self.handle))
 
+    def __reduce__(self) -> tuple:
+        # A compact form for pickling, which is much faster than pickling
+        # the slots of each instance
+        return (
+            _restore_social_account, (
+                self.platform, self.handle, self._url, self.account_stats,
+                self.is_primary, self.status, self.last_active
+            )
+        )
+
     def as_dict(self) -> dict[str, str | int | datetime | None]:
         stats: list[dict[str, datetime | int]] = [
             account_stat.as_dict() for account_stat in self.account_stats
@@ -220,7 +692,23 @@ class SocialAccount:
         return account
 
 
+# Returned by ModerationEntry.get_accounts() for platforms without accounts
+_NO_ACCOUNTS: KeysView = {}.keys()
+
+# Entries that share an account on one of these platforms are considered
+# to be the same entry
+IDENTITY_PLATFORMS: tuple[str, ...] = (
+    'twitter', 'youtube', 'facebook', 'instagram'
+)
+
+
 class ModerationEntry:
+    __slots__ = (
+        'first_name', 'last_name', 'business_name', 'business_type',
+        '_platform_accounts', '_primary_accounts',
+        'languages', 'urls', 'categories', 'annotations', '_stats_list'
+    )
+
     def __init__(
         self, first_name: str | None, last_name: str | None,
         business_name: str | None, business_type: str | None,
@@ -235,7 +723,12 @@ class ModerationEntry:
         self.business_name: str | None = business_name
         self.business_type: str | None = business_type
 
-        self.social_accounts: set[SocialAccount] = set()
+        # The social accounts by the name of their platform, in the order
+        # they were added, and a cache of the primary account for platforms
+        # with multiple accounts, which is only allocated when needed. Both
+        # are maintained by add_social_account()
+        self._platform_accounts: dict[str, dict[SocialAccount, None]] = {}
+        self._primary_accounts: dict[str, SocialAccount] | None = None
 
         self.languages: set[str] = \
             ModerationEntry._string_to_set(languages) or set(['en'])
@@ -248,6 +741,20 @@ class ModerationEntry:
             annotations
         )
 
+        # The list with the StatsColumns that include the accounts of the
+        # entry, see AccountStats
+        self._stats_list: ModerationList | None = None
+
+    @property
+    def social_accounts(self) -> 'SocialAccounts':
+        '''
+        All social accounts of the entry, as a set-like view on the index
+        of the accounts by platform. Accounts that are added to or removed
+        from the view are added to or removed from the entry.
+        '''
+
+        return SocialAccounts(self)
+
     def __repr__(self) -> str:
         for platform in 'twitter', 'youtube', 'facebook', 'instagram':
             account: SocialAccount | None = self.get_account(platform)
@@ -269,33 +776,64 @@ class ModerationEntry:
         people to be considered separate.
         '''
 
-        match_found: bool = False
-        if isinstance(other, ModerationEntry):
-            for platform in 'twitter', 'youtube', 'facebook', 'instagram':
-                if self.get_accounts(platform) & other.get_accounts(platform):
-                    match_found = True
-                    break
-
-        if match_found:
-            if ((self.first_name and other.first_name)
-                    and (self.first_name != other.first_name)):
-                return False
-            if ((self.last_name and other.last_name)
-                    and (self.first_name != other.first_name)):
-                return False
-            if ((self.business_name and other.business_name)
-                    and (self.business_name != other.business_name)):
-                return False
-            return True
+        if not isinstance(other, ModerationEntry):
+            return False
+
+        for platform in IDENTITY_PLATFORMS:
+            if self.get_accounts(platform) & other.get_accounts(platform):
+                return self.names_match(other)
 
         return False
 
+    def names_match(self, other: Self) -> bool:
+        '''
+        Checks whether the names of the entries match, for the names that
+        are defined for both entries
+        '''
+
+        if ((self.first_name and other.first_name)
+                and (self.first_name != other.first_name)):
+            return False
+        if ((self.last_name and other.last_name)
+                and (self.last_name != other.last_name)):
+            return False
+        if ((self.business_name and other.business_name)
+                and (self.business_name != other.business_name)):
+            return False
+
+        return True
+
+    def identity_keys(self) -> list[tuple[str, str]]:
+        '''
+        Gets the (platform, handle) keys of the accounts that identify the
+        entry, see IDENTITY_PLATFORMS
+        '''
+
+        keys: list[tuple[str, str]] = []
+        platform: str
+        for platform in IDENTITY_PLATFORMS:
+            account: SocialAccount
+            for account in self.get_accounts(platform):
+                keys.append((platform, account.handle))
+
+        return keys
+
     def __ne__(self, other: Self) -> bool:
         return not self.__eq__(other)
 
     def __hash__(self) -> int:
         return hash((self.first_name, self.last_name, self.business_name))
 
+    def __reduce__(self) -> tuple:
+        return (
+            _restore_moderation_entry, (
+                self.first_name, self.last_name, self.business_name,
+                self.business_type, self.languages, self.urls,
+                self.categories, self.annotations,
+                tuple(self._platform_accounts.values())
+            )
+        )
+
     def __lt__(self, other: Self) -> bool:
         return self.get_name() < other.get_name()
 
@@ -315,26 +853,35 @@ class ModerationEntry:
 
             item = item.strip()
             if convert_case:
-                item = item.lower()
+                # Categories, languages and annotations are shared by many
+                # entries
+                item = sys.intern(item.lower().replace(' ', ''))
+            else:
+                item = item.replace(' ', '')
 
-            values.add(item.replace(' ', ''))
+            values.add(item)
 
         return values
 
     def as_dict(self) -> dict[str, str | dict]:
         accounts: list[dict[str, str | int | datetime | None]] = [
-            account.as_dict() for account in self.social_accounts
+            account.as_dict()
+            for accounts in self._platform_accounts.values()
+            for account in accounts
         ]
 
+        # The order in which sets are iterated depends on the hash seed of
+        # the process and how the set was built, so they are sorted to get
+        # the same output for the same entry
         return {
             'first_name': self.first_name,
             'last_name': self.last_name,
             'business_name': self.business_name,
             'business_type': self.business_type,
-            'urls': list(self.urls),
-            'categories': list(self.categories),
-            'annotations': list(self.annotations),
-            'languages': list(self.languages) or ['en'],
+            'urls': sorted(self.urls),
+            'categories': sorted(self.categories),
+            'annotations': sorted(self.annotations),
+            'languages': sorted(self.languages) or ['en'],
             'social_accounts': accounts
         }
 
@@ -350,7 +897,7 @@ class ModerationEntry:
                 if account:
                     return account.handle
 
-            return list(self.social_accounts)[0].handle
+            return next(iter(self.social_accounts)).handle
 
         return 'unknown'
 
@@ -369,7 +916,7 @@ class ModerationEntry:
 
         for account_data in entry_data.get('social_accounts', []):
             account: SocialAccount = SocialAccount.from_dict(account_data)
-            entry.social_accounts.add(account)
+            entry.add_social_account(account)
 
         return entry
 
@@ -393,9 +940,11 @@ class ModerationEntry:
         self.annotations.update(other.annotations)
         self.urls.update(other.urls)
 
-        for social in other.social_accounts:
-            if social not in self.social_accounts:
-                self.social_accounts.add(social)
+        # The accounts are added in the order of the index of the other
+        # entry, as the order of its set of accounts varies between runs
+        for accounts in other._platform_accounts.values():
+            for social in accounts:
+                self.add_social_account(social)
 
     def add_account(
         self, platform: str | SocialPlatform, handle: str, url: list[str],
@@ -409,7 +958,7 @@ class ModerationEntry:
 
         if isinstance(platform, str):
             platform = SOCIAL_PLATFORMS[platform.lower().replace(' ', '')]
-        self.social_accounts.add(
+        self.add_social_account(
             SocialAccount(
                 platform=platform, handle=handle, url=url,
                 followers=followers, assets=assets, views=views,
@@ -417,6 +966,52 @@ class ModerationEntry:
             )
         )
 
+    def add_social_account(self, account: SocialAccount) -> None:
+        '''
+        Add a social account to the moderation entry, unless the entry
+        already has the account
+
+        :param account: The social account to add
+        '''
+
+        platform_name: str = account.platform.name
+        accounts: dict[SocialAccount, None] | None = \
+            self._platform_accounts.get(platform_name)
+        if accounts is None:
+            self._platform_accounts[platform_name] = {account: None}
+        elif account not in accounts:
+            accounts[account] = None
+            if self._primary_accounts:
+                self._primary_accounts.pop(platform_name, None)
+        else:
+            return
+
+        if self._stats_list is not None:
+            self._stats_list._stats_changed()
+
+    def remove_social_account(self, account: SocialAccount) -> None:
+        '''
+        Removes a social account from the moderation entry, if the entry
+        has the account
+
+        :param account: The social account to remove
+        '''
+
+        platform_name: str = account.platform.name
+        accounts: dict[SocialAccount, None] | None = \
+            self._platform_accounts.get(platform_name)
+        if accounts is None or account not in accounts:
+            return
+
+        del accounts[account]
+        if not accounts:
+            del self._platform_accounts[platform_name]
+        if self._primary_accounts:
+            self._primary_accounts.pop(platform_name, None)
+
+        if self._stats_list is not None:
+            self._stats_list._stats_changed()
+
     def get_account(self, platform: str | SocialPlatform
                     ) -> SocialAccount | None:
         '''
@@ -429,22 +1024,38 @@ class ModerationEntry:
         if isinstance(platform, str):
             platform = SOCIAL_PLATFORMS[platform.lower()]
 
-        accounts: set[SocialAccount] = self.get_accounts(platform)
+        accounts: KeysView[SocialAccount] = self.get_accounts(platform)
 
         if not accounts:
             return None
         elif len(accounts) == 1:
             return next(iter(accounts))
+
+        if self._primary_accounts is None:
+            self._primary_accounts = {}
+
+        primary: SocialAccount | None = self._primary_accounts.get(
+            platform.name
+        )
+        if primary:
+            return primary
+
+        for account in accounts:
+            if account.is_primary:
+                primary = account
+                break
         else:
-            for account in accounts:
-                if account.is_primary:
-                    return account
-            return list(accounts)[0]
+            primary = next(iter(accounts))
+
+        self._primary_accounts[platform.name] = primary
+
+        return primary
 
     def get_accounts(self, platform: str | SocialPlatform
-                     ) -> set[SocialAccount]:
+                     ) -> KeysView[SocialAccount]:
         '''
-        Get all social accounts for the platform
+        Get all social accounts for the platform, as a set-like view on the
+        index maintained by the entry
 
         :param platform: The social platform
         '''
@@ -452,13 +1063,111 @@ class ModerationEntry:
         if isinstance(platform, str):
             platform = SOCIAL_PLATFORMS[platform.lower()]
 
-        accounts: set[SocialAccount] = set()
-        account: SocialAccount
-        for account in self.social_accounts:
-            if account.platform.name == platform.name:
-                accounts.add(account)
+        accounts: dict[SocialAccount, None] | None = \
+            self._platform_accounts.get(platform.name)
+        if accounts is None:
+            return _NO_ACCOUNTS
 
-        return accounts
+        return accounts.keys()
+
+
+class SocialAccounts(MutableSet):
+    __slots__ = ('_entry',)
+
+    def __init__(self, entry: ModerationEntry) -> None:
+        '''
+        The social accounts of a moderation entry, as a mutable set. It
+        reads and updates the index of the accounts of the entry by
+        platform, so it does not copy the accounts.
+
+        :param entry: The moderation entry
+        '''
+
+        self._entry: ModerationEntry = entry
+
+    @classmethod
+    def _from_iterable(cls, accounts: Iterable[SocialAccount]
+                       ) -> set[SocialAccount]:
+        # Set operations like & and | return a new set, not a view
+        return set(accounts)
+
+    def __contains__(self, account: SocialAccount) -> bool:
+        if not isinstance(account, SocialAccount):
+            return False
+
+        accounts: dict[SocialAccount, None] | None = \
+            self._entry._platform_accounts.get(account.platform.name)
+
+        return accounts is not None and account in accounts
+
+    def __iter__(self) -> Iterator[SocialAccount]:
+        accounts: dict[SocialAccount, None]
+        for accounts in self._entry._platform_accounts.values():
+            yield from accounts
+
+    def __len__(self) -> int:
+        return sum(
+            len(accounts)
+            for accounts in self._entry._platform_accounts.values()
+        )
+
+    def __repr__(self) -> str:
+        return f'SocialAccounts({set(self)!r})'
+
+    def add(self, account: SocialAccount) -> None:
+        self._entry.add_social_account(account)
+
+    def discard(self, account: SocialAccount) -> None:
+        self._entry.remove_social_account(account)
+
+
+def _restore_account_stats(data: array | None) -> AccountStats:
+    stats: AccountStats = AccountStats()
+    stats._data = data
+
+    return stats
+
+
+def _restore_social_account(platform: SocialPlatform, handle: str,
+                            url: str | None, account_stats: AccountStats,
+                            is_primary: bool | None, status: str,
+                            last_active: datetime | None) -> SocialAccount:
+    account: SocialAccount = SocialAccount.__new__(SocialAccount)
+    account.platform = platform
+    account.handle = sys.intern(handle) if isinstance(handle, str) else handle
+    account._url = url
+    account.account_stats = account_stats
+    account.is_primary = is_primary
+    account.status = sys.intern(status) if isinstance(status, str) else status
+    account.last_active = last_active
+
+    return account
+
+
+def _restore_moderation_entry(first_name: str | None, last_name: str | None,
+                              business_name: str | None,
+                              business_type: str | None, languages: set[str],
+                              urls: set[str], categories: set[str],
+                              annotations: set[str],
+                              platform_accounts: tuple[dict]
+                              ) -> ModerationEntry:
+    entry: ModerationEntry = ModerationEntry.__new__(ModerationEntry)
+    entry.first_name = first_name
+    entry.last_name = last_name
+    entry.business_name = business_name
+    entry.business_type = business_type
+    entry.languages = languages
+    entry.urls = urls
+    entry.categories = categories
+    entry.annotations = annotations
+    entry._primary_accounts = None
+    entry._stats_list = None
+    entry._platform_accounts = {
+        next(iter(accounts)).platform.name: accounts
+        for accounts in platform_accounts
+    }
+
+    return entry
 
 
 class UserEntry:
@@ -483,6 +1192,104 @@ class UserEntry:
         )
 
 
+class BlockIndex(Protocol):
+    '''
+    A secondary index over the entries of a moderation list, like the
+    ListIndex of tools/lib/query.py. The list calls update_block() for an
+    entry that was added or that other entries were merged into, after
+    calling remove_block() for each entry that was merged into it, and
+    remove_block() for an entry that was removed.
+    '''
+
+    def update_block(self, block_key: str, entry: ModerationEntry) -> None:
+        ...
+
+    def remove_block(self, block_key: str) -> None:
+        ...
+
+
+class StatsColumns:
+    def __init__(self, mod_list: 'ModerationList') -> None:
+        '''
+        The latest value of each statistic of the accounts of a moderation
+        list, in a column per statistic, with the accounts ordered by each
+        statistic when they are first queried. ModerationList.top_accounts()
+        keeps the columns of a list until the entries, accounts or
+        statistics of that list change. The entries and the statistics of
+        the accounts are pointed at the list, so that their changes drop
+        the columns of the list.
+
+        :param mod_list: The moderation list
+        '''
+
+        blocks: dict[str, ModerationEntry] = mod_list.blocks
+
+        self.accounts: list[SocialAccount] = []
+        # The platform of each account
+        self.platforms: list[str] = []
+        # The latest value of each statistic, with 0 for accounts without a
+        # value, and a mask with a bit for each statistic that has a value
+        self.columns: dict[str, array] = {
+            column: array('q') for column in STAT_COLUMNS
+        }
+        self.masks: array = array('q')
+
+        # The positions of the accounts that have a value for a statistic,
+        # by (statistic, platform), ordered by the value, highest first
+        self._orders: dict[tuple[str, str | None], list[int]] = {}
+
+        entry: ModerationEntry
+        for entry in blocks.values():
+            entry._stats_list = mod_list
+            account: SocialAccount
+            for account in entry.social_accounts:
+                account.account_stats._stats_list = mod_list
+                self.accounts.append(account)
+                self.platforms.append(account.platform.name)
+                mask: int = 0
+                bit: int
+                column: str
+                for bit, column in enumerate(STAT_COLUMNS):
+                    value: int | None = account.account_stats.latest(column)
+                    if value is not None:
+                        mask |= 1 << bit
+                    self.columns[column].append(value or 0)
+                self.masks.append(mask)
+
+    def top(self, count: int, column: str = 'followers',
+            platform: str | None = None) -> list[tuple[SocialAccount, int]]:
+        '''
+        Gets the accounts with the highest latest value for the statistic
+
+        :param count: The number of accounts to return
+        :param column: followers, assets or views
+        :param platform: The name of the platform to only consider accounts
+        on
+        :returns: (account, value) tuples, highest value first
+        '''
+
+        order: list[int] | None = self._orders.get((column, platform))
+        if order is None:
+            bit: int = 1 << STAT_COLUMNS.index(column)
+            values: array = self.columns[column]
+            order = sorted(
+                (
+                    position for position, mask in enumerate(self.masks)
+                    if mask & bit and (
+                        platform is None
+                        or self.platforms[position] == platform
+                    )
+                ),
+                key=lambda position: -values[position]
+            )
+            self._orders[(column, platform)] = order
+
+        return [
+            (self.accounts[position], self.columns[column][position])
+            for position in order[:count]
+        ]
+
+
 class ModerationList:
     def __init__(self, list_name: str, author_name: str, author_email: str,
                  author_url: str, list_url: str, download_url: str,
@@ -509,104 +1316,916 @@ class ModerationList:
             last_updated = datetime.fromtimestamp(last_updated, tz=UTC)
         self.last_updated: datetime = last_updated
 
-        self.blocks: dict[ModerationEntry] = {}
+        self._blocks: dict[str, ModerationEntry] = {}
         self.trusts: list[UserEntry] = []
 
+        # Maps the (platform, handle) identity keys of the accounts of the
+        # entries to the key of the entry in self._blocks, so that entries
+        # that share an account are merged when they are added
+        self._account_index: dict[tuple[str, str], str] = {}
+
+        # The order in which the entries in self._blocks were added, so that
+        # a cluster of entries is always merged into the oldest entry
+        self._block_sequence: dict[str, int] = {}
+        self._next_sequence: int = 0
+
+        # With lazy loading, the raw data of the block list is only
+        # converted to ModerationEntry instances when the blocks are accessed
+        self._pending_blocks: list[dict[str, any]] | None = None
+        # Whether add_block() could merge entries of the raw data, see
+        # _pending_may_merge()
+        self._pending_may_merge_cache: bool | None = None
+
+        # Secondary indexes over the entries, which are updated when
+        # entries are added or removed
+        self.indexes: list[BlockIndex] = []
+
+        # The latest statistics of the accounts, see top_accounts()
+        self._stats_columns: StatsColumns | None = None
+
     def __len__(self) -> int:
         return len(self.blocks)
 
-    def add_block(self, entry: ModerationEntry) -> None:
-        # name: str = entry.get_name()
-        block_repr: str = entry.__repr__()
+    def __getstate__(self) -> dict[str, any]:
+        # The unpickled entries and statistics do not point at the list, so
+        # the columns of the latest statistics are built again
+        state: dict[str, any] = self.__dict__.copy()
+        state['_stats_columns'] = None
 
-        if block_repr not in self.blocks:
-            self.blocks[block_repr] = entry
-        else:
-            existing_entry: ModerationEntry = self.blocks[block_repr]
-            existing_entry.merge(entry)
+        return state
 
-        self.last_updated = datetime.now(tz=UTC)
+    def top_accounts(self, count: int = 10, column: str = 'followers',
+                     platform: str | SocialPlatform | None = None
+                     ) -> list[tuple[SocialAccount, int]]:
+        '''
+        Gets the accounts with the highest latest value for the statistic.
+        The latest values are kept in StatsColumns, which are built on the
+        first query and rebuilt after accounts or statistics change.
+
+        :param count: The number of accounts to return
+        :param column: followers, assets or views
+        :param platform: Only consider accounts on this platform
+        :returns: (account, value) tuples, highest value first
+        '''
 
-    def add_trust(self, entry: UserEntry) -> None:
-        self.trusts.append(entry)
-        self.last_updated = datetime.now(tz=UTC)
+        if isinstance(platform, str):
+            platform = SOCIAL_PLATFORMS[platform.lower().replace(' ', '')]
 
-    def as_dict(self) -> dict[str, list[dict[str, str | dict]]]:
-        data: OrderedDict[str, dict[str, any]] = OrderedDict(
-            [
-                (
-                    'meta',
-                    {
-                        'last_updated': self.last_updated,
-                        'list_name': self.list_name,
-                        'author_name': self.author_name,
-                        'author_email': self.author_email,
-                        'author_url': self.author_url,
-                        'download_url': self.download_url,
-                        'disclaimer': self.disclaimer,
-                        'categories': self.categories,
-                    },
-                ),
-                (
-                    'block_list',
-                    [entry.as_dict() for entry in self.blocks.values()],
+        if self._stats_columns is None:
+            self._stats_columns = StatsColumns(self)
 
-                ),
-                (
-                    'trust_list',
-                    [entry.as_dict() for entry in self.trusts],
-                )
-            ]
+        return self._stats_columns.top(
+            count, column, platform.name if platform else None
         )
-        return data
 
-    @staticmethod
-    def from_dict(raw_data) -> Self:
-        modlist = ModerationList(
-            list_name=raw_data['meta'].get('list_name'),
-            list_url=raw_data['meta'].get('list_url'),
-            author_name=raw_data['meta'].get('author_name'),
-            author_email=raw_data['meta'].get('author_email'),
-            author_url=raw_data['meta'].get('author_url'),
-            download_url=raw_data['meta'].get('download_url'),
-            categories=raw_data['meta'].get('categories'),
-            last_updated=raw_data['meta'].get('last_updated')
-        )
+    def _stats_changed(self) -> None:
+        '''
+        Drops the columns of the latest statistics, after the entries,
+        accounts or statistics of the list changed
+        '''
 
-        for entry_data in raw_data.get('block_list', []) or []:
-            entry: ModerationEntry = ModerationEntry.from_dict(entry_data)
-            modlist.add_block(entry)
+        self._stats_columns = None
 
-        for user_entry in raw_data.get('trust_list', []):
-            entry: UserEntry = UserEntry.from_dict(user_entry)
-            modlist.add_trust(entry)
+    @property
+    def blocks(self) -> dict[str, ModerationEntry]:
+        if self._pending_blocks is not None:
+            pending_blocks: list[dict[str, any]] = self._pending_blocks
+            self._pending_blocks = None
+            last_updated: datetime = self.last_updated
+            for entry_data in pending_blocks:
+                self.add_block(ModerationEntry.from_dict(entry_data))
+            self.last_updated = last_updated
 
-        return modlist
+        return self._blocks
 
-    def save(self, filename: str) -> None:
-        yaml: YAML = YAML(typ='safe')
-        yaml.default_flow_style = False
-        yaml.indent(mapping=2, sequence=4, offset=2)
-        yaml.explicit_start = True
-        yaml.explicit_end = True
+    def iter_blocks(self) -> Iterator[ModerationEntry]:
+        '''
+        Iterates over the entries of the list. For a lazily loaded list
+        without entries that add_block() could merge, the entries are
+        created one at a time from the raw data and they are not kept in
+        the list. Otherwise, the entries are created and merged first, so
+        the same entries are returned as for a list that is not lazily
+        loaded.
+        '''
+
+        if self._pending_blocks is None or self._pending_may_merge():
+            yield from self.blocks.values()
+            return
+
+        entry_data: dict[str, any]
+        for entry_data in self._pending_blocks:
+            yield ModerationEntry.from_dict(entry_data)
+
+    def platform_counters(self) -> dict[str, int]:
+        '''
+        Counts the social accounts in the list for each social platform. For
+        a lazily loaded list without entries that add_block() could merge,
+        the accounts are counted from the raw data without creating
+        ModerationEntry or SocialAccount instances.
+
+        :raises: KeyError if an account is on an unknown social platform
+        '''
+
+        counters: dict[str, int] = {
+            platform: 0 for platform in SOCIAL_PLATFORMS
+        }
+
+        if self._pending_blocks is None or self._pending_may_merge():
+            platform: str
+            for platform in SOCIAL_PLATFORMS:
+                entry: ModerationEntry
+                for entry in self.blocks.values():
+                    counters[platform] += len(entry.get_accounts(platform))
+
+            return counters
+
+        entry_data: dict[str, any]
+        for entry_data in self._pending_blocks:
+            handles: dict[any, tuple[str | None, bool]]
+            for platform, handles in \
+                    ModerationList._raw_accounts(entry_data).items():
+                counters[platform] += len(handles)
+
+        return counters
+
+    def platform_accounts(self) -> dict[str, dict[str, set[str]]]:
+        '''
+        Gets the normalised handles of the social accounts in the list for
+        each social platform, with the categories of the entries that have
+        the account. For a lazily loaded list without entries that
+        add_block() could merge, the accounts are read from the raw data
+        without creating ModerationEntry or SocialAccount instances.
+
+        :raises: KeyError if an account is on an unknown social platform
+        '''
+
+        accounts: dict[str, dict[str, set[str]]] = {}
+
+        def add(platform: str, handle: str | None, categories: Iterable[str]
+                ) -> None:
+            handle = normalize_handle(handle)
+            if handle is None:
+                return
+
+            accounts.setdefault(platform, {}).setdefault(
+                handle, set()
+            ).update(categories)
+
+        if self._pending_blocks is None or self._pending_may_merge():
+            entry: ModerationEntry
+            for entry in self.blocks.values():
+                account: SocialAccount
+                for account in entry.social_accounts:
+                    add(
+                        account.platform.name.lower().replace(' ', ''),
+                        account.handle or account.url, entry.categories
+                    )
+
+            return accounts
+
+        entry_data: dict[str, any]
+        for entry_data in self._pending_blocks:
+            categories: set[str] = ModerationEntry._string_to_set(
+                entry_data.get('categories') or set()
+            )
+            platform: str
+            handles: dict[any, tuple[str | None, bool]]
+            for platform, handles in \
+                    ModerationList._raw_accounts(entry_data).items():
+                handle: any
+                url: str | None
+                for handle, (url, _) in handles.items():
+                    add(platform, handle or url, categories)
+
+        return accounts
+
+    def _pending_may_merge(self) -> bool:
+        '''
+        Checks whether add_block() would merge entries of the raw data of a
+        lazily loaded list: entries that share an account on one of the
+        IDENTITY_PLATFORMS and that have matching names, or entries that
+        have the same repr(). For an entry that repr() returns the handle of
+        any of its accounts for, all its handles are compared, so some
+        entries that would not be merged can also be reported.
+        '''
+
+        if self._pending_may_merge_cache is not None:
+            return self._pending_may_merge_cache
+
+        self._pending_may_merge_cache = True
+
+        # The names of the last entry with each identity key, as
+        # add_block() compares an entry with the last entry that has the
+        # key, and the repr() values of the entries
+        identities: dict[tuple[str, any], tuple[any, any, any]] = {}
+        reprs: set[str] = set()
+        entry_data: dict[str, any]
+        for entry_data in self._pending_blocks:
+            names: tuple[any, any, any] = (
+                entry_data.get('first_name'), entry_data.get('last_name'),
+                entry_data.get('business_name')
+            )
+            identity_keys: set[tuple[str, any]]
+            repr_keys: set[str]
+            identity_keys, repr_keys = \
+                ModerationList._raw_merge_keys(entry_data)
+            if not reprs.isdisjoint(repr_keys):
+                return True
+
+            identity_key: tuple[str, any]
+            for identity_key in identity_keys:
+                other: tuple[any, any, any] | None = identities.get(
+                    identity_key
+                )
+                if other is not None and all(
+                        not name or not other_name or name == other_name
+                        for name, other_name in zip(names, other)):
+                    return True
+                identities[identity_key] = names
+
+            reprs.update(repr_keys)
+
+        self._pending_may_merge_cache = False
+
+        return False
+
+    @staticmethod
+    def _raw_accounts(entry_data: dict[str, any]
+                      ) -> dict[str, dict[any, tuple[str | None, bool]]]:
+        '''
+        Gets the accounts of the raw data of an entry, by platform, as the
+        handles with the URL of the account and whether it is the primary
+        account, without the accounts that
+        ModerationEntry.add_social_account() would not add again
+
+        :raises: KeyError if an account is on an unknown social platform
+        '''
+
+        accounts: dict[str, dict[any, tuple[str | None, bool]]] = {}
+        account_data: dict[str, any]
+        for account_data in entry_data.get('social_accounts') or []:
+            platform: str = str(account_data.get('platform'))
+            platform = platform.lower().replace(' ', '')
+            social_platform: SocialPlatform = SOCIAL_PLATFORMS[platform]
+
+            handle: any = account_data.get('handle')
+            handles: dict[any, tuple[str | None, bool]] = \
+                accounts.setdefault(platform, {})
+            if handle in handles:
+                continue
+
+            # The URL as SocialAccount.url returns it
+            url: str | None = account_data.get('url')
+            if url and 'twitter.com' in url:
+                url = url.replace('twitter.com', 'x.com')
+            elif not url and isinstance(handle, str):
+                url = social_platform.social_url_prefix + handle
+            handles[handle] = (url, bool(account_data.get('is_primary')))
+
+        return accounts
+
+    @staticmethod
+    def _raw_merge_keys(entry_data: dict[str, any]
+                        ) -> tuple[set[tuple[str, any]], set[str]]:
+        '''
+        Gets the (platform, handle) keys of the accounts on the
+        IDENTITY_PLATFORMS of the raw data of an entry and the values that
+        repr() of the entry could return
+        '''
+
+        accounts: dict[str, dict[any, tuple[str | None, bool]]] = \
+            ModerationList._raw_accounts(entry_data)
+
+        identity_keys: set[tuple[str, any]] = set()
+        # The handles of the accounts that ModerationEntry.get_account()
+        # returns for the platforms
+        primary_handles: list[any] = []
+        repr_key: str | None = None
+        platform: str
+        for platform in IDENTITY_PLATFORMS:
+            handles: dict[any, tuple[str | None, bool]] = \
+                accounts.get(platform)
+            if not handles:
+                continue
+
+            identity_keys.update((platform, handle) for handle in handles)
+            primary: any = next(
+                (
+                    handle for handle, (_, is_primary) in handles.items()
+                    if is_primary
+                ),
+                next(iter(handles))
+            )
+            primary_handles.append(primary)
+            url: str | None = handles[primary][0]
+            if url and repr_key is None:
+                repr_key = f'{platform} {url.lower()}'
+
+        if repr_key:
+            return identity_keys, {repr_key}
+
+        first_name: str | None = entry_data.get('first_name')
+        last_name: str | None = entry_data.get('last_name')
+        if first_name or last_name:
+            return identity_keys, {f'{first_name} {last_name}'}
+        if entry_data.get('business_name'):
+            return identity_keys, {entry_data['business_name']}
+        if primary_handles:
+            return identity_keys, {primary_handles[0] or 'unknown'}
+
+        # The name is the handle of any of the accounts
+        repr_keys: set[str] = {
+            handle or 'unknown'
+            for handles in accounts.values() for handle in handles
+        }
+
+        return identity_keys, repr_keys or {'unknown'}
+
+    def add_block(self, entry: ModerationEntry) -> None:
+        '''
+        Adds an entry to the list. The entry is merged with the existing
+        entries that have the same key or that share an account on one of
+        the IDENTITY_PLATFORMS with it, and with matching names. If the entry
+        links multiple existing entries, they are all merged into the entry
+        that was added first.
+        '''
+
+        block_repr: str = entry.__repr__()
+        blocks: dict[str, ModerationEntry] = self.blocks
+
+        matches: set[str] = set()
+        if block_repr in blocks:
+            matches.add(block_repr)
+
+        identity_key: tuple[str, str]
+        for identity_key in entry.identity_keys():
+            block_key: str | None = self._account_index.get(identity_key)
+            if (block_key and block_key not in matches
+                    and blocks[block_key].names_match(entry)):
+                matches.add(block_key)
+
+        # The key of the entry that the entry was added or merged to
+        added_key: str = block_repr
+        if not matches:
+            blocks[block_repr] = entry
+            self._block_sequence[block_repr] = self._next_sequence
+            self._next_sequence += 1
+            self._index_block(block_repr, entry)
+        else:
+            ordered_keys: list[str] = sorted(
+                matches, key=self._block_sequence.__getitem__
+            )
+            root_key: str = ordered_keys[0]
+            root_entry: ModerationEntry = blocks[root_key]
+            for block_key in ordered_keys[1:]:
+                existing_entry: ModerationEntry = blocks[block_key]
+                if not root_entry.names_match(existing_entry):
+                    continue
+
+                root_entry.merge(existing_entry)
+                del blocks[block_key]
+                del self._block_sequence[block_key]
+                for index in self.indexes:
+                    index.remove_block(block_key)
+
+            root_entry.merge(entry)
+            self._index_block(root_key, root_entry)
+            added_key = root_key
+
+        index: BlockIndex
+        for index in self.indexes:
+            index.update_block(added_key, blocks[added_key])
+
+        self._stats_changed()
+        self.last_updated = datetime.now(tz=UTC)
+
+    def remove_block(self, block_key: str) -> ModerationEntry:
+        '''
+        Removes an entry from the list
+
+        :param block_key: The key of the entry in the blocks of the list
+        :returns: the removed entry
+        :raises: KeyError if the list does not have the entry
+        '''
+
+        entry: ModerationEntry = self.blocks.pop(block_key)
+        del self._block_sequence[block_key]
+
+        identity_key: tuple[str, str]
+        for identity_key in entry.identity_keys():
+            if self._account_index.get(identity_key) == block_key:
+                del self._account_index[identity_key]
+
+        index: BlockIndex
+        for index in self.indexes:
+            index.remove_block(block_key)
+
+        # Changes to the removed entry no longer affect the list
+        if entry._stats_list is self:
+            entry._stats_list = None
+            account: SocialAccount
+            for account in entry.social_accounts:
+                account.account_stats._stats_list = None
+        self._stats_changed()
+        self.last_updated = datetime.now(tz=UTC)
+
+        return entry
+
+    def _index_block(self, block_key: str, entry: ModerationEntry) -> None:
+        identity_key: tuple[str, str]
+        for identity_key in entry.identity_keys():
+            self._account_index[identity_key] = block_key
+
+    def add_trust(self, entry: UserEntry) -> None:
+        self.trusts.append(entry)
+        self.last_updated = datetime.now(tz=UTC)
+
+    def as_dict(self) -> dict[str, list[dict[str, str | dict]]]:
+        data: OrderedDict[str, dict[str, any]] = OrderedDict(
+            [
+                ('meta', self.meta_as_dict()),
+                (
+                    'block_list',
+                    [entry.as_dict() for entry in self.blocks.values()],
+
+                ),
+                (
+                    'trust_list',
+                    [entry.as_dict() for entry in self.trusts],
+                )
+            ]
+        )
+        return data
+
+    def meta_as_dict(self) -> dict[str, any]:
+        return {
+            'last_updated': self.last_updated,
+            'list_name': self.list_name,
+            'author_name': self.author_name,
+            'author_email': self.author_email,
+            'author_url': self.author_url,
+            'download_url': self.download_url,
+            'disclaimer': self.disclaimer,
+            'categories': self.categories,
+        }
+
+    @staticmethod
+    def from_dict(raw_data, lazy: bool = False) -> Self:
+        '''
+        Factory to create a moderation list from its raw data
+
+        :param raw_data: The data as loaded from the YAML file
+        :param lazy: Only parse the metadata of the list and defer creating
+        the entries of the block list until they are accessed
+        '''
+
+        modlist: ModerationList = ModerationList._from_meta(raw_data['meta'])
+        last_updated: datetime = modlist.last_updated
+
+        if lazy:
+            modlist._pending_blocks = raw_data.get('block_list', []) or []
+        else:
+            for entry_data in raw_data.get('block_list', []) or []:
+                entry: ModerationEntry = ModerationEntry.from_dict(entry_data)
+                modlist.add_block(entry)
+
+        for user_entry in raw_data.get('trust_list', []):
+            entry: UserEntry = UserEntry.from_dict(user_entry)
+            modlist.add_trust(entry)
+
+        # Loading the entries does not modify the list
+        modlist.last_updated = last_updated
+
+        return modlist
+
+    @staticmethod
+    def _from_meta(meta: dict[str, any]) -> Self:
+        return ModerationList(
+            list_name=meta.get('list_name'),
+            list_url=meta.get('list_url'),
+            author_name=meta.get('author_name'),
+            author_email=meta.get('author_email'),
+            author_url=meta.get('author_url'),
+            download_url=meta.get('download_url'),
+            categories=meta.get('categories'),
+            last_updated=meta.get('last_updated')
+        )
+
+    def save(self, filename: str, fmt: str | None = None) -> None:
+        '''
+        Saves the moderation list
+
+        :param filename: The file to save the list to
+        :param fmt: 'yaml' or 'snapshot', by default the format is derived
+        from the extension of the filename
+        '''
+
+        if ModerationList._file_format(filename, fmt) == 'snapshot':
+            snapshot: dict[str, any] = {
+                'format': SNAPSHOT_FORMAT,
+                'version': SNAPSHOT_VERSION,
+                'list': self.as_dict(),
+            }
+            with open(f'{filename}.tmp', 'wb') as file_desc:
+                file_desc.write(orjson.dumps(snapshot))
+            os.replace(f'{filename}.tmp', filename)
+            return
+
+        with open(f'{filename}.tmp', 'w') as file_desc:
+            self.write_yaml(file_desc)
+        os.replace(f'{filename}.tmp', filename)
+
+    def export_lookup(self, directory: str) -> dict[str, str]:
+        '''
+        Exports a lookup table with the normalised handles and the
+        categories of the accounts for each social platform that has
+        accounts in the list
+
+        :param directory: The directory to write the lookup tables to,
+        which must already exist
+        :returns: the filename of the lookup table for each platform
+        '''
+
+        # The bits of the categories are assigned as the categories are
+        # found and are renumbered by the order of the categories at the end
+        bits: dict[str, int] = {}
+        platform_masks: dict[str, dict[str, int]] = {}
+        entry: ModerationEntry
+        for entry in self.iter_blocks():
+            mask: int = 0
+            category: str
+            for category in entry.categories:
+                if category not in bits:
+                    bits[category] = 1 << len(bits)
+                mask |= bits[category]
+
+            account: SocialAccount
+            for account in entry.social_accounts:
+                handle: str | None = normalize_handle(
+                    account.handle or account.url
+                )
+                if handle is None:
+                    continue
+
+                platform: str = account.platform.name.lower().replace(' ', '')
+                masks: dict[str, int] = platform_masks.setdefault(
+                    platform, {}
+                )
+                masks[handle] = masks.get(handle, 0) | mask
+
+        categories: list[str] = sorted(bits)
+        renumbering: list[tuple[int, int]] = [
+            (bits[category], 1 << bit)
+            for bit, category in enumerate(categories)
+        ]
+
+        filenames: dict[str, str] = {}
+        for platform, masks in sorted(platform_masks.items()):
+            handles: list[str] = sorted(masks)
+            table = LookupTable(
+                platform=platform,
+                categories=categories,
+                handles=handles,
+                masks=[
+                    sum(
+                        sorted_bit for found_bit, sorted_bit in renumbering
+                        if masks[handle] & found_bit
+                    )
+                    for handle in handles
+                ],
+                list_name=self.list_name,
+                last_updated=self.last_updated,
+            )
+            filename: str = os.path.join(directory, f'lookup-{platform}.json')
+            table.save(filename)
+            filenames[platform] = filename
+            _LOGGER.debug(f'Exported {len(table)} {platform} handles')
+
+        return filenames
+
+    def write_yaml(self, file_desc: TextIO) -> None:
+        '''
+        Writes the list as a YAML document. The meta section is written
+        first, followed by the entries of the block list, one at a time, so
+        the YAML data for the whole list is never in memory at once.
+
+        :param file_desc: The stream to write to
+        '''
+
+        yaml: YAML = ModerationList.yaml_dumper()
+        ModerationList.write_yaml_document(
+            file_desc, self.meta_as_dict(),
+            (
+                ModerationList.entry_yaml(entry, yaml)
+                for entry in self.blocks.values()
+            ),
+            [entry.as_dict() for entry in self.trusts], yaml
+        )
+
+    @staticmethod
+    def yaml_dumper() -> YAML:
+        '''
+        Gets the YAML instance for writing the parts of a list document
+        '''
+
+        # Each part of the document is dumped separately so the explicit
+        # start and end of the document are written by
+        # write_yaml_document()
+        yaml: YAML = YAML(typ='safe')
+        yaml.default_flow_style = False
+        yaml.indent(mapping=2, sequence=4, offset=2)
+        yaml.explicit_start = False
+        yaml.explicit_end = False
         yaml.allow_unicode = True
         yaml.default_style = None
 
-        data: dict[str, list[dict[str, str | dict]]] = self.as_dict()
-        with open(filename, 'w') as file_desc:
-            yaml.dump(data, file_desc)
+        return yaml
 
     @staticmethod
-    def load(filename: str) -> Self:
-        yaml: YAML = YAML(typ='safe')
+    def entry_yaml(entry: ModerationEntry, yaml: YAML | None = None) -> str:
+        '''
+        Gets the YAML of an entry as it is written in the block list of a
+        list document
+
+        :param entry: The entry
+        :param yaml: The YAML instance from yaml_dumper() to reuse
+        '''
+
+        stream = io.StringIO()
+        (yaml or ModerationList.yaml_dumper()).dump([entry.as_dict()], stream)
+
+        return stream.getvalue()
+
+    @staticmethod
+    def write_yaml_document(file_desc: TextIO, meta: dict[str, any],
+                            block_yaml: Iterable[str],
+                            trust_list: list[dict[str, any]],
+                            yaml: YAML | None = None) -> None:
+        '''
+        Writes a list document from its parts
+
+        :param file_desc: The stream to write to
+        :param meta: The metadata of the list, as from meta_as_dict()
+        :param block_yaml: The YAML of the entries of the block list, as
+        from entry_yaml()
+        :param trust_list: The entries of the trust list, as dicts
+        :param yaml: The YAML instance from yaml_dumper() to reuse
+        '''
+
+        yaml = yaml or ModerationList.yaml_dumper()
+
+        file_desc.write('---\n')
+        yaml.dump({'meta': meta}, file_desc)
+
+        entries: int = 0
+        entry_yaml: str
+        for entry_yaml in block_yaml:
+            if not entries:
+                file_desc.write('block_list:\n')
+            file_desc.write(entry_yaml)
+            entries += 1
+        if not entries:
+            yaml.dump({'block_list': []}, file_desc)
+
+        yaml.dump({'trust_list': trust_list}, file_desc)
+        file_desc.write('...\n')
+
+    @staticmethod
+    def load(filename: str, lazy: bool = False, fmt: str | None = None
+             ) -> Self:
+        '''
+        Loads a moderation list from a YAML file or a snapshot
+
+        :param filename: The file to load
+        :param lazy: Defer creating the entries of the block list until they
+        are accessed. Without it, a YAML file is streamed and each entry is
+        created as soon as it has been read.
+        :param fmt: 'yaml' or 'snapshot', by default the format is derived
+        from the extension of the filename
+        '''
+
+        raw_data: dict[str, dict[str, str | list[dict[str, any]]]]
+        if ModerationList._file_format(filename, fmt) == 'snapshot':
+            with open(filename, 'rb') as file_desc:
+                raw_data = ModerationList._from_snapshot(
+                    orjson.loads(file_desc.read())
+                )
+        elif lazy:
+            yaml: YAML = YAML(typ='safe')
+            with open(filename, 'r') as file_desc:
+                raw_data = yaml.load(file_desc)
+        else:
+            with open(filename, 'r') as file_desc:
+                return ModerationList._load_yaml_stream(file_desc)
+
+        modlist: ModerationList = ModerationList.from_dict(raw_data, lazy=lazy)
+
+        return modlist
+
+    @staticmethod
+    def loads(raw_list: str) -> Self:
+        '''
+        Loads a moderation list from its YAML, like a downloaded list
+
+        :param raw_list: The YAML of the list
+        '''
+
+        return ModerationList._load_yaml_stream(io.StringIO(raw_list))
+
+    @staticmethod
+    def iter_entries(filename: str, fmt: str | None = None
+                     ) -> Iterator[ModerationEntry]:
+        '''
+        Iterates over the entries of the block list of a moderation list
+        file, for consumers that only need a single pass over the entries.
+        For YAML files, the file is streamed and only one entry is kept in
+        memory at a time. Entries are returned as they appear in the file,
+        without merging duplicate entries.
+
+        :param filename: The file to read
+        :param fmt: 'yaml' or 'snapshot', by default the format is derived
+        from the extension of the filename
+        '''
+
+        if ModerationList._file_format(filename, fmt) == 'snapshot':
+            with open(filename, 'rb') as file_desc:
+                raw_data: dict[str, any] = ModerationList._from_snapshot(
+                    orjson.loads(file_desc.read())
+                )
+            for entry_data in raw_data.get('block_list') or []:
+                yield ModerationEntry.from_dict(entry_data)
+            return
+
         with open(filename, 'r') as file_desc:
-            raw_data: dict[str, dict[str, str | list[dict[str, any]]]] = \
-                yaml.load(file_desc)
+            key: str
+            value: any
+            for key, value in ModerationList._iter_yaml(file_desc):
+                if key == 'block':
+                    yield ModerationEntry.from_dict(value)
 
-        modlist: ModerationList = ModerationList.from_dict(raw_data)
+    @staticmethod
+    def _load_yaml_stream(file_desc: TextIO) -> Self:
+        '''
+        Loads a moderation list from a YAML stream, creating each entry of
+        the block list as soon as it has been read
+        '''
+
+        modlist: ModerationList | None = None
+        # Entries that are read before the meta section
+        entries: list[ModerationEntry] = []
+        trust_data: list[dict[str, str]] = []
+
+        key: str
+        value: any
+        for key, value in ModerationList._iter_yaml(file_desc):
+            if key == 'meta':
+                modlist = ModerationList._from_meta(value)
+            elif key == 'block':
+                entry: ModerationEntry = ModerationEntry.from_dict(value)
+                if modlist:
+                    modlist.add_block(entry)
+                else:
+                    entries.append(entry)
+            elif key == 'trust_list':
+                trust_data = value or []
+
+        if modlist is None:
+            raise ValueError('No meta section in the moderation list')
+
+        last_updated: datetime = modlist.last_updated
+        for entry in entries:
+            modlist.add_block(entry)
+
+        for user_data in trust_data:
+            modlist.add_trust(UserEntry.from_dict(user_data))
+
+        # Loading the entries does not modify the list
+        modlist.last_updated = last_updated
 
         return modlist
 
+    @staticmethod
+    def _iter_yaml(file_desc: TextIO) -> Iterator[tuple[str, any]]:
+        '''
+        Parses a YAML moderation list as a stream of events. For the
+        block_list, it yields ('block', data) for each entry, as soon as the
+        mapping of the entry is complete. For the other top-level keys, it
+        yields (key, data).
+
+        Lists saved by earlier versions of save() are '!!omap' documents.
+        A document that is not a plain mapping is loaded as a whole, like
+        YAML.load() does, and then yielded in the same way.
+        '''
+
+        # The composer of the pure-Python loader constructs the document one
+        # node at a time, from the events of the C parser of
+        # ruamel.yaml.clib if it is installed
+        yaml: YAML = YAML(typ='safe', pure=True)
+        constructor: BaseConstructor
+        parser: Parser | CParser
+        if CParser is not None:
+            parser = CParser(file_desc)
+            yaml._parser = parser
+            constructor = yaml.constructor
+        else:
+            constructor, parser = yaml.get_constructor_parser(file_desc)
+        composer: Composer = yaml.composer
+
+        try:
+            parser.get_event()
+            if parser.check_event(StreamEndEvent):
+                raise ValueError('Empty moderation list')
+
+            parser.get_event()
+            event: Event = parser.peek_event()
+            if (not isinstance(event, MappingStartEvent)
+                    or event.tag not in (None, YAML_MAP_TAG)):
+                yield from ModerationList._document_items(
+                    constructor.construct_document(
+                        composer.compose_node(None, None)
+                    )
+                )
+                return
+            parser.get_event()
+
+            while not parser.check_event(MappingEndEvent):
+                key: any = constructor.construct_document(
+                    composer.compose_node(None, None)
+                )
+                if key == 'block_list' and parser.check_event(
+                        SequenceStartEvent):
+                    parser.get_event()
+                    index: int = 0
+                    while not parser.check_event(SequenceEndEvent):
+                        node: Node = composer.compose_node(None, index)
+                        yield 'block', constructor.construct_document(node)
+                        index += 1
+                    parser.get_event()
+                else:
+                    yield key, constructor.construct_document(
+                        composer.compose_node(None, None)
+                    )
+        finally:
+            parser.dispose()
+
+    @staticmethod
+    def _document_items(data: any) -> Iterator[tuple[str, any]]:
+        '''
+        Yields the items of a moderation list that was loaded as a whole,
+        like _iter_yaml() does
+        '''
+
+        if not isinstance(data, dict):
+            raise ValueError('A moderation list must be a YAML mapping')
+
+        key: str
+        value: any
+        for key, value in data.items():
+            if key == 'block_list':
+                entry_data: dict[str, any]
+                for entry_data in value or []:
+                    yield 'block', entry_data
+            else:
+                yield key, value
+
+    @staticmethod
+    def _file_format(filename: str, fmt: str | None) -> str:
+        if fmt is None:
+            extension: str = os.path.splitext(filename)[-1].lower()
+            fmt = 'snapshot' if extension in SNAPSHOT_EXTENSIONS else 'yaml'
+
+        if fmt not in ('yaml', 'snapshot'):
+            raise ValueError(f'Unsupported format for moderation list: {fmt}')
+
+        return fmt
+
+    @staticmethod
+    def _from_snapshot(snapshot: dict[str, any]
+                       ) -> dict[str, dict[str, str | list[dict[str, any]]]]:
+        '''
+        Gets the raw data of the list from a snapshot, with the timestamps,
+        which JSON stores as strings, converted back to datetimes
+        '''
+
+        if (not isinstance(snapshot, dict)
+                or snapshot.get('format') != SNAPSHOT_FORMAT):
+            raise ValueError('Not a moderation list snapshot')
+
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(
+                f'Unsupported snapshot version: {snapshot.get("version")}'
+            )
+
+        raw_data: dict[str, any] = snapshot['list']
+        meta: dict[str, any] = raw_data['meta']
+        meta['last_updated'] = _parse_timestamp(meta.get('last_updated'))
+
+        entry_data: dict[str, any]
+        for entry_data in raw_data.get('block_list') or []:
+            parse_entry_timestamps(entry_data)
+
+        return raw_data
+
     @staticmethod
     def from_workbook(filename: str, list_name: str, list_url: str | None,
                       author_name: str | None, author_email: str | None,
@@ -631,24 +2250,141 @@ class ModerationList:
 
         return mod_list
 
-    def add_csv(self, filename: str) -> None:
+    def add_csv(self, filename: str, workers: int = 1,
+                fingerprints: RowFingerprints | None = None) -> None:
+        '''
+        Adds entries from a CSV file to the moderation list. The file is
+        read as UTF-8.
+
+        :param filename: The CSV file to load
+        :param workers: The number of worker processes. With more than one
+        worker, the file is split into shards on row boundaries and the
+        entries for the rows of each shard are created by a worker. The
+        entries are added to the list in the order of the rows so the
+        result is the same as when the rows are processed in this process.
+        :param fingerprints: Only process the rows that are not in these
+        fingerprints of a previous run. The rows are then read in this
+        process, as most of them are expected to be skipped.
+        '''
+
+        if workers > 1 and not fingerprints:
+            self._add_csv_parallel(filename, workers)
+            return
+
+        with open(filename, encoding='utf-8', newline='') as csv_file:
+            csv_reader = csv.reader(csv_file)
+            headers: list[str] = next(csv_reader)
+            row_plan: RowPlan = ModerationList.discover_row_plan(headers)
+            if fingerprints:
+                fingerprints.set_columns(headers)
+
+            for row in csv_reader:
+                for index in range(len(row)):
+                    if row[index] == '':
+                        row[index] = None
+                self.add_row(row_plan, row, fingerprints)
+
+    def _add_csv_parallel(self, filename: str, workers: int) -> None:
+        shards: list[tuple[int, int]]
+        headers: list[str]
+        headers, shards = ModerationList.csv_shards(
+            filename, workers * CSV_SHARDS_PER_WORKER
+        )
+        if not headers:
+            raise ValueError(f'CSV file {filename} does not have a header')
+
+        row_plan: RowPlan = ModerationList.discover_row_plan(headers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            entries: list[ModerationEntry]
+            for entries in executor.map(
+                    entries_from_csv_shard, [filename] * len(shards),
+                    [start for start, _ in shards],
+                    [end for _, end in shards], [row_plan] * len(shards)):
+                entry: ModerationEntry
+                for entry in entries:
+                    self.add_row_entry(entry)
+
+    @staticmethod
+    def csv_shards(filename: str, shards: int
+                   ) -> tuple[list[str], list[tuple[int, int]]]:
+        '''
+        Splits the rows of a CSV file, after its header, into byte ranges of
+        about the same size. Each range starts and ends on a row boundary: a
+        newline that is not part of a quoted value, which is when the number
+        of quotes before it is even.
+
+        :param filename: The CSV file
+        :param shards: The number of ranges to split the rows into
+        :returns: the header of the file and the (start, end) byte offsets
+        of the ranges
+        '''
+
+        with open(filename, 'rb') as file_desc:
+            if not os.fstat(file_desc.fileno()).st_size:
+                return [], []
+
+            with mmap.mmap(file_desc.fileno(), 0,
+                           access=mmap.ACCESS_READ) as data:
+                size: int = len(data)
+                header_end: int = ModerationList._csv_row_end(data, 0, 0)
+                headers: list[str] = next(
+                    csv.reader(
+                        io.TextIOWrapper(
+                            io.BytesIO(data[:header_end]), encoding='utf-8',
+                            newline=''
+                        )
+                    ),
+                    []
+                )
+
+                boundaries: list[int] = [header_end]
+                shard: int
+                for shard in range(1, shards):
+                    target: int = \
+                        header_end + (size - header_end) * shard // shards
+                    if target <= boundaries[-1]:
+                        continue
+
+                    start: int = boundaries[-1]
+                    boundary: int = ModerationList._csv_row_end(
+                        data, target, data[start:target].count(b'"') % 2
+                    )
+                    if boundary >= size:
+                        break
+
+                    boundaries.append(boundary)
+
+        boundaries.append(size)
+
+        return headers, [
+            (start, end) for start, end in zip(boundaries, boundaries[1:])
+            if end > start
+        ]
+
+    @staticmethod
+    def _csv_row_end(data: mmap.mmap, offset: int, quotes: int) -> int:
         '''
-        Adds entries from a CSV file to the moderation list
+        Finds the end of the row of a CSV file that contains the offset
 
-        :param filename: The CSV file to load
+        :param data: The content of the CSV file
+        :param offset: The offset in the file
+        :param quotes: The parity of the number of quotes in the row before
+        the offset
+        :returns: the offset of the first byte after the row
         '''
 
-        with open(filename) as csv_file:
-            csv_reader = csv.reader(csv_file)
-            headers: list[str] = next(csv_reader)
-            column_map: ColumnMap = ModerationList.discover_columns(headers)
-            for row in csv_reader:
-                for index in range(len(row)):
-                    if row[index] == '':
-                        row[index] = None
-                self.add_row(column_map, row)
+        while True:
+            newline: int = data.find(b'\n', offset)
+            if newline == -1:
+                return len(data)
+
+            quotes = (quotes + data[offset:newline].count(b'"')) % 2
+            offset = newline + 1
+            if not quotes:
+                return offset
 
-    def add_excel(self, filename: str) -> None:
+    def add_excel(self, filename: str,
+                  fingerprints: RowFingerprints | None = None) -> None:
         '''
         Adds entries from an Excel workbook to the moderation list
 
@@ -664,20 +2400,150 @@ class ModerationList:
 
         Column names are case-insensitive and whitespace are ignored
 
+        The workbook is streamed in read-only mode so memory use does not
+        grow with the number of rows. Read-only mode does not provide the
+        hyperlinks of cells so they are read separately from the worksheet
+        and, like in the full mode of openpyxl, the target of a hyperlink
+        replaces the value of its cell.
+
         :param filename: The Excel file to load
+        :param fingerprints: Only process the rows that are not in these
+        fingerprints of a previous run
         '''
 
+        hyperlinks: dict[tuple[int, int], str | None] = \
+            ModerationList.read_excel_hyperlinks(filename, 'moderation')
+
         with warnings.catch_warnings():
             warnings.filterwarnings("ignore", category=UserWarning)
-            wb: Workbook = load_excel_workbook(filename=filename)
-            sheet: Worksheet = wb['moderation']
+            wb: Workbook = load_excel_workbook(
+                filename=filename, read_only=True
+            )
+            try:
+                sheet: Worksheet = wb['moderation']
+
+                headers: tuple[str] = next(
+                    sheet.iter_rows(max_row=1, values_only=True)
+                )
+                row_plan: RowPlan = ModerationList.discover_row_plan(headers)
+                if fingerprints:
+                    fingerprints.set_columns(list(headers))
+
+                # As before, the header row is also processed as an entry
+                row: int
+                values: tuple[any]
+                for row, values in enumerate(
+                        sheet.iter_rows(values_only=True), start=1):
+                    row_columns: list[str] = list(values)
+                    if hyperlinks:
+                        column: int
+                        for column in range(len(row_columns)):
+                            if (row, column + 1) in hyperlinks:
+                                row_columns[column] = \
+                                    hyperlinks[(row, column + 1)]
+
+                    self.add_row(row_plan, row_columns, fingerprints)
+            finally:
+                wb.close()
+
+    @staticmethod
+    def read_excel_hyperlinks(filename: str, sheet_name: str
+                              ) -> dict[tuple[int, int], str | None]:
+        '''
+        Reads the hyperlinks of a worksheet from the XML of the worksheet
+        and its relationships, without loading the cells of the worksheet
+
+        :param filename: The Excel file
+        :param sheet_name: The name of the worksheet
+        :returns: the target of the hyperlink for each (row, column) of a
+        cell with a hyperlink, starting at 1. The target is None for links
+        to locations in the workbook itself.
+        '''
 
-            row_columns: list[Cell]
-            column_map: ColumnMap = ModerationList.discover_excel_columns(
-                next(sheet.rows)
+        hyperlinks: dict[tuple[int, int], str | None] = {}
+        with zipfile.ZipFile(filename) as archive:
+            sheet_path: str = ModerationList._excel_sheet_path(
+                archive, sheet_name
             )
-            for row_columns in sheet.rows:
-                self.add_excel_row(column_map, row_columns)
+
+            # Targets of the relations of the worksheet by their ID
+            sheet_rels: dict[str, str] = {}
+            if get_rels_path(sheet_path) in archive.namelist():
+                sheet_rels = {
+                    rel.Id: rel.Target for rel in get_dependents(
+                        archive, get_rels_path(sheet_path)
+                    )
+                }
+
+            links: list[tuple[str, str | None]] = []
+            merged_cells: list[tuple[int, int, int, int]] = []
+
+            def start_element(name: str, attributes: dict[str, str]
+                              ) -> None:
+                if name == f'{SHEET_MAIN_NS} mergeCell':
+                    merged_cells.append(range_boundaries(attributes['ref']))
+                elif name == f'{SHEET_MAIN_NS} hyperlink':
+                    rel_id: str | None = attributes.get(f'{REL_NS} id')
+                    links.append(
+                        (attributes['ref'], sheet_rels[rel_id] if rel_id
+                         else None)
+                    )
+
+            # The cells of the worksheet are skipped by the parser without
+            # building a tree of elements for them
+            parser = expat.ParserCreate(namespace_separator=' ')
+            parser.StartElementHandler = start_element
+            with archive.open(sheet_path) as file_desc:
+                parser.ParseFile(file_desc)
+
+        ref: str
+        target: str | None
+        for ref, target in links:
+            min_col: int
+            min_row: int
+            max_col: int
+            max_row: int
+            min_col, min_row, max_col, max_row = range_boundaries(ref)
+            if ':' not in ref:
+                # A link to a merged cell belongs to the top-left cell of
+                # the merged cells
+                for merged in merged_cells:
+                    if (merged[0] <= min_col <= merged[2]
+                            and merged[1] <= min_row <= merged[3]):
+                        min_col, min_row, max_col, max_row = \
+                            merged[0], merged[1], merged[0], merged[1]
+                        break
+
+            for row in range(min_row, max_row + 1):
+                for column in range(min_col, max_col + 1):
+                    hyperlinks[(row, column)] = target
+
+        return hyperlinks
+
+    @staticmethod
+    def _excel_sheet_path(archive: zipfile.ZipFile, sheet_name: str) -> str:
+        '''
+        Finds the path in the Excel archive of the XML of a worksheet
+        '''
+
+        workbook_path: str | None = None
+        for rel in get_dependents(archive, '_rels/.rels'):
+            if rel.Type.endswith('/officeDocument'):
+                workbook_path = rel.target
+                break
+
+        if not workbook_path:
+            raise ValueError(f'No workbook found in {archive.filename}')
+
+        workbook = fromstring(archive.read(workbook_path))
+        workbook_rels: RelationshipList = get_dependents(
+            archive, get_rels_path(workbook_path)
+        )
+        for sheet in workbook.iter(f'{{{SHEET_MAIN_NS}}}sheet'):
+            if sheet.get('name') == sheet_name:
+                return workbook_rels.get(sheet.get(f'{{{REL_NS}}}id')).target
+
+        raise KeyError(f'Worksheet {sheet_name} does not exist')
 
     @staticmethod
     def discover_excel_columns(row_columns: list[Cell]) -> ColumnMap:
@@ -689,8 +2555,21 @@ class ModerationList:
 
         return ModerationList.discover_columns(columns)
 
+    @staticmethod
+    def discover_row_plan(columns: list[str]) -> RowPlan:
+        '''
+        Discovers the columns in the header of a sheet
+
+        :returns: the plan for processing the rows of the sheet
+        '''
+
+        return RowPlan.from_column_map(
+            ModerationList.discover_columns(columns)
+        )
+
     @staticmethod
     def discover_columns(columns: list[str]) -> ColumnMap:
+
         column_map: dict[str, set[int]] = {}
         index: int = 0
         column_name: str
@@ -718,8 +2597,8 @@ class ModerationList:
 
         return column_map
 
-    def add_excel_row(self, column_map: ColumnMap, row_columns: list[Cell]
-                      ) -> None:
+    def add_excel_row(self, row_plan: RowPlan | ColumnMap,
+                      row_columns: list[Cell]) -> None:
 
         columns: list[str] = []
         for column in row_columns:
@@ -731,18 +2610,79 @@ class ModerationList:
             else:
                 columns.append(column)
 
-        self.add_row(column_map, columns)
+        self.add_row(row_plan, columns)
+
+    def add_row(self, row_plan: RowPlan | ColumnMap, row_columns: list[str],
+                fingerprints: RowFingerprints | None = None) -> None:
+        '''
+        Adds the entry in a row of a sheet to the moderation list
+
+        :param row_plan: The plan for the columns of the sheet, as returned
+        by discover_row_plan(). A column map, as returned by
+        discover_columns(), is compiled to a plan first.
+        :param row_columns: The values of the row
+        :param fingerprints: Skip the row if it is the same as in the
+        previous run with these fingerprints
+        '''
+
+        if not isinstance(row_plan, RowPlan):
+            row_plan = RowPlan.from_column_map(row_plan)
+
+        if fingerprints and fingerprints.is_unchanged(
+                row_plan.identity(row_columns), row_columns):
+            return
+
+        entry: ModerationEntry | None = ModerationList.entry_from_row(
+            row_plan, row_columns
+        )
+        if entry:
+            self.add_row_entry(entry)
+
+    def add_row_entry(self, entry: ModerationEntry) -> None:
+        '''
+        Adds the entry created from a row of a sheet to the moderation list.
+        The categories of the entry are added to the categories of the list,
+        even if the entry is skipped because it has no social accounts.
+        '''
+
+        # Add the meta level we maintain a list of categories and our
+        # description for them. Here we make sure any category for an entry
+        # is added to the list of categories at that meta level.
+        for category in sorted(entry.categories):
+            if category not in self.categories:
+                self.categories[category] = ''
+
+        if entry._platform_accounts:
+            _LOGGER.debug(f'Adding entry for {entry.get_name()}')
+            self.add_block(entry)
+        else:
+            _LOGGER.debug(
+                f'Skipping entry without social accounts: {entry.get_name()}'
+            )
+
+    @staticmethod
+    def entry_from_row(row_plan: RowPlan | ColumnMap, row_columns: list[str]
+                       ) -> ModerationEntry | None:
+        '''
+        Creates the moderation entry for a row of a sheet
+
+        :param row_plan: The plan for the columns of the sheet
+        :param row_columns: The values of the row
+        :returns: the entry, or None if the row does not have categories
+        '''
+
+        if not isinstance(row_plan, RowPlan):
+            row_plan = RowPlan.from_column_map(row_plan)
 
-    def add_row(self, column_map: ColumnMap, row_columns: list[str]) -> None:
         first_name: str | None = None
         last_name: str | None = None
         business_name: str | None = None
-        if 'firstname' in column_map:
-            first_name = row_columns[next(iter(column_map['firstname']))]
-        if 'lastname' in column_map:
-            last_name = row_columns[next(iter(column_map['lastname']))]
-        if 'businessname' in column_map:
-            business_name = row_columns[next(iter(column_map['businessname']))]
+        if row_plan.first_name is not None:
+            first_name = row_columns[row_plan.first_name]
+        if row_plan.last_name is not None:
+            last_name = row_columns[row_plan.last_name]
+        if row_plan.business_name is not None:
+            business_name = row_columns[row_plan.business_name]
 
         name: str = ''
         if not business_name:
@@ -762,12 +2702,13 @@ class ModerationList:
                 name = business_name
 
         business_type: str | None = None
-        if 'businesstype' in column_map:
-            business_type = row_columns[next(iter(column_map['businesstype']))]
+        if row_plan.business_type is not None:
+            business_type = row_columns[row_plan.business_type]
 
         languages: str | set[str] = set(['en'])
-        if 'languages' in row_columns:
-            languages = row_columns[next(iter(column_map['languages']))]
+        if (row_plan.languages is not None
+                and row_columns[row_plan.languages]):
+            languages = row_columns[row_plan.languages]
             if isinstance(languages, str):
                 languages = set(
                     [
@@ -776,36 +2717,31 @@ class ModerationList:
                     ]
                 )
 
-        categories: str | list[str] = \
-            row_columns[next(iter(column_map.get('categories', set())))]
+        if row_plan.categories is None:
+            raise ValueError('The sheet does not have a categories column')
+
+        categories: str | list[str] = row_columns[row_plan.categories]
         if (not categories
                 or (isinstance(categories, str) and '?' in categories)):
             if name != '(N/A)':
                 _LOGGER.info(
                     f'Skipping entry {name} with no categories'
                 )
-            return
+            return None
 
         categories: set[str] = ModerationEntry._string_to_set(categories)
 
-        # Add the meta level we maintain a list of categories and our
-        # description for them. Here we make sure any category for an entry
-        # is added to the list of categories at that meta level.
-        for category in categories:
-            if category not in self.categories:
-                self.categories[category] = ''
-
         annotations: set[str] = set()
-        if 'politician' in column_map:
-            if row_columns[next(iter(column_map['politician']))]:
+        if row_plan.politician is not None:
+            if row_columns[row_plan.politician]:
                 annotations.add('politician')
 
-        if 'journalist' in column_map:
-            if row_columns[next(iter(column_map['journalist']))]:
+        if row_plan.journalist is not None:
+            if row_columns[row_plan.journalist]:
                 annotations.add('journalist')
 
         urls: set[str] = set()
-        for index in iter(column_map.get('web', set())):
+        for index in row_plan.web:
             if row_columns[index]:
                 urls.add(row_columns[index])
 
@@ -820,24 +2756,19 @@ class ModerationList:
             urls=urls,
         )
 
-        social: str
-        columns: list[int]
-        # for social, columns in column_map.items():
-        for social in SOCIAL_PLATFORMS:
-            columns = column_map.get(social, set([]))
-            self.add_social_from_row(
-                entry, row_columns, social, columns
-            )
+        platform: SocialPlatform
+        column_index: int
+        is_primary: bool
+        for platform, column_index, is_primary in row_plan.socials:
+            if row_columns[column_index]:
+                ModerationList.add_social_from_cell(
+                    entry, row_columns[column_index], platform, is_primary
+                )
 
-        if len(entry.social_accounts):
-            self.add_block(entry)
-        else:
-            _LOGGER.debug(
-                f'Skipping entry without social accounts: {name}'
-            )
+        return entry
 
     def add_social_from_row(self, entry: ModerationEntry,
-                            row_columns: list[int], social: str,
+                            row_columns: list[str], social: str,
                             columns: set[int]) -> None:
         '''
         Adds a social account to the entry, if it exists in the row
@@ -848,33 +2779,86 @@ class ModerationList:
         :param columns: The columns in the row that contain the social accounts
         '''
 
+        if not columns:
+            return
+
+        primary: int = min(columns)
+        column_index: int
         for column_index in columns:
-            value: str = row_columns[column_index]
-            if not value:
-                continue
+            if row_columns[column_index]:
+                ModerationList.add_social_from_cell(
+                    entry, row_columns[column_index],
+                    SOCIAL_PLATFORMS[social], column_index == primary
+                )
+
+    @staticmethod
+    def add_social_from_cell(entry: ModerationEntry, value: str,
+                             platform: SocialPlatform, is_primary: bool
+                             ) -> None:
+        '''
+        Adds the social account in a cell of a row to the entry
+
+        :param entry: The moderation entry to add the social account to
+        :param value: The value of the cell, with the handle or the URL of
+        the account, optionally followed by ' - <status>'
+        :param platform: The social platform
+        :param is_primary: Whether the cell is in the first column for the
+        social platform
+        '''
 
-            account_status: str = 'active'
-            if ' - ' in value:
-                value, account_status = value.split(' - ')
-                if ' ' in account_status:
-                    account_status = account_status.split(' ')[-1].strip()  # noqa
+        handle: str = value
+        account_status: str = 'active'
+        if ' - ' in value:
+            value, account_status = value.split(' - ')
+            if ' ' in account_status:
+                account_status = account_status.split(' ')[-1].strip()
 
-            link: str = value
-            if not value.startswith('https://'):
-                # Let's assume cell value is the handle for
-                # the social account
-                link = \
-                    SOCIAL_PLATFORMS[social].social_url_prefix + value
+        link: str = value
+        if not value.startswith('https://'):
+            # Let's assume cell value is the handle for
+            # the social account
+            link = platform.social_url_prefix + value
 
-            entry.add_account(
-                platform=social,
-                handle=row_columns[column_index],
-                url=link,
-                status=account_status,
-                is_primary=column_index == sorted(columns)[0]
+        entry.add_social_account(
+            SocialAccount(
+                platform=platform, handle=handle, url=link,
+                status=account_status, is_primary=is_primary
             )
-            name: str = entry.get_name()
-            _LOGGER.debug(f'Added {social} account for {name}')
+        )
+
+
+def entries_from_csv_shard(filename: str, start: int, end: int,
+                           row_plan: RowPlan) -> list[ModerationEntry]:
+    '''
+    Creates the entries for the rows in a byte range of a CSV file, in the
+    order of the rows. This function runs in the worker processes for
+    parallel CSV ingestion.
+
+    :param filename: The CSV file
+    :param start: The offset of the first row of the shard
+    :param end: The offset after the last row of the shard
+    :param row_plan: The plan for the columns of the CSV file
+    '''
+
+    with open(filename, 'rb') as file_desc:
+        file_desc.seek(start)
+        data: bytes = file_desc.read(end - start)
+
+    entries: list[ModerationEntry] = []
+    row: list[str]
+    for row in csv.reader(
+            io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', newline='')):
+        for index in range(len(row)):
+            if row[index] == '':
+                row[index] = None
+
+        entry: ModerationEntry | None = ModerationList.entry_from_row(
+            row_plan, row
+        )
+        if entry:
+            entries.append(entry)
+
+    return entries
 
 
 @dataclass
@@ -884,6 +2868,77 @@ class ListStats:
     last_updated: datetime | None = field(default=None)
     categories: list[str] | None = field(default_factory=list)
     counters: dict[str, int] = field(default_factory=dict)
+    # Sketches of the handles on the list, by platform, or None if they
+    # were not requested. They are not part of the list-of-lists file but
+    # are saved with ListOfLists.sketches()
+    sketches: dict[str, MinHashSketch] | None = field(default=None)
+
+    def as_dict(self) -> dict[str, any]:
+        '''
+        Gets the stats for the list-of-lists file, without the sketches
+        '''
+
+        data: dict[str, any] = dict(self.__dict__)
+        data.pop('sketches')
+
+        return data
+
+
+def compute_list_stats(list_stats: ListStats, raw_list: str) -> ListStats:
+    '''
+    Parses a moderation list and updates the stats with its data. This is a
+    module-level function so that it can be run in a worker process.
+
+    :param list_stats: The stats to update
+    :param raw_list: The YAML of the moderation list
+    :returns: the updated stats
+    '''
+
+    return parse_list(list_stats, raw_list)[0]
+
+
+def parse_list(list_stats: ListStats, raw_list: str,
+               index_accounts: bool = False, sketches: bool = False
+               ) -> tuple[ListStats, ListAccounts | None]:
+    '''
+    Parses a moderation list, updates the stats with its data and, if
+    requested, with the sketches of its handles, and collects its accounts
+    for the CrossListIndex. This is a module-level function so that it can
+    be run in a worker process.
+
+    :param list_stats: The stats to update
+    :param raw_list: The YAML of the moderation list
+    :param index_accounts: Whether to collect the accounts of the list
+    :param sketches: Whether to compute the sketches of the handles
+    :returns: the updated stats and the accounts of the list, or None if
+    they were not requested
+    '''
+
+    yaml: YAML = YAML(typ='safe')
+    mod_list: ModerationList = ModerationList.from_dict(
+        yaml.load(raw_list), lazy=True
+    )
+    list_stats.name = mod_list.list_name
+    list_stats.last_updated = mod_list.last_updated
+    list_stats.categories = list(mod_list.categories.keys())
+    list_stats.counters = mod_list.platform_counters()
+
+    # The accounts and the hashes of the handles for the sketches are only
+    # computed when they are needed
+    if not index_accounts and not sketches:
+        return list_stats, None
+
+    accounts: ListAccounts = mod_list.platform_accounts()
+    if sketches:
+        list_stats.sketches = {
+            platform: MinHashSketch.from_handles(handles)
+            for platform, handles in sorted(accounts.items())
+        }
+
+    if not index_accounts:
+        return list_stats, None
+
+    return list_stats, accounts
 
 
 class ListOfLists:
@@ -891,62 +2946,535 @@ class ListOfLists:
         self.filename: str = filename
         self.list_of_lists: list[ListStats] = []
 
+        # Bloom filters of the handles on each social platform in the union
+        # of the lists
+        self.filters: dict[str, BloomFilter] = {}
+
+        # The index of the accounts on the lists, if it was requested
+        self.index: CrossListIndex | None = None
+
     def as_dict(self) -> list[dict[str, any]]:
-        return [list_stats.__dict__ for list_stats in self.list_of_lists]
+        return [list_stats.as_dict() for list_stats in self.list_of_lists]
 
     @staticmethod
-    def load(filename: str, cache_dir: str | None = None) -> Self:
-        if cache_dir and not os.path.exists(cache_dir):
-            raise ValueError(f'Cache directory {cache_dir} does not exist')
+    def load(filename: str, cache_dir: str | None = None,
+             index: CrossListIndex | None = None,
+             sketches: bool = False) -> Self:
+        '''
+        Downloads the lists in the list-of-lists one at a time and
+        collects the stats for each of them
+
+        :param filename: The JSON file with the list of lists
+        :param cache_dir: Directory to cache the downloaded lists in. Lists
+        in the cache are revalidated with conditional GET requests
+        :param index: Index to update with the accounts of the lists. Only
+        lists that changed since they were added to the index are parsed
+        again
+        :param sketches: Whether to compute the sketches of the handles on
+        the lists, for ListOfLists.sketches()
+        '''
 
         self: ListOfLists = ListOfLists(filename)
-        with open(filename, 'r') as f:
-            list_of_list_data: list[dict[str, any]] = orjson.loads(f.read())
-
-        if not isinstance(list_of_list_data, list):
-            raise ValueError('Expected a list of lists in {filename}')
+        self.index = index
+        list_of_list_data: list[dict[str, any]] = \
+            ListOfLists._read_list_data(filename)
 
-        yaml: YAML = YAML(typ='safe')
+        cache: ListCache | None = ListCache(cache_dir) if cache_dir else None
         with httpx.Client() as client:
             for list_data in list_of_list_data:
                 list_stats: ListStats = ListStats(**list_data)
 
-                resp: httpx.Response = client.get(list_stats.url)
-                if resp.status_code != 200:
-                    _LOGGER.info(
-                        f'Failed to download {list_stats.url}: '
-                        f'{resp.status_code}'
-                    )
-                    continue
+                cached: CacheEntry | None = None
+                if cache:
+                    cached = cache.get(list_stats.url)
 
-                raw_list: str = resp.text
-                if cache_dir:
-                    cache_file: str = list_stats.url.split('/')[-1]
-                    with open(f'{cache_dir}/{cache_file}', 'w') as fd:
-                        fd.write(raw_list)
-
-                mod_list: ModerationList = ModerationList.from_dict(
-                    yaml.load(raw_list)
+                resp: httpx.Response = client.get(
+                    list_stats.url,
+                    headers=ListCache.revalidation_headers(cached)
                 )
-                list_stats.name = mod_list.list_name
-                list_stats.last_updated = mod_list.last_updated
-                list_stats.categories = list(mod_list.categories.keys())
-
-                platform: str
-                for platform in SOCIAL_PLATFORMS.keys():
-                    list_stats.counters[platform] = 0
-                    entry: ModerationEntry
-                    for entry in mod_list.blocks.values():
-                        accounts: set[SocialAccount] = entry.get_accounts(
-                            platform
+                if ListOfLists._process_response(
+                        list_stats, resp, cache, cached, index, sketches):
+                    self.list_of_lists.append(list_stats)
+
+        if index is not None:
+            index.retain(
+                [list_data['url'] for list_data in list_of_list_data]
+            )
+
+        return self
+
+    @staticmethod
+    async def load_async(
+        filename: str, cache_dir: str | None = None,
+        concurrency: int = LIST_DOWNLOAD_CONCURRENCY,
+        connections_per_host: int = LIST_DOWNLOAD_CONNECTIONS_PER_HOST,
+        timeout: float = LIST_DOWNLOAD_TIMEOUT, workers: int | None = None,
+        index: CrossListIndex | None = None, sketches: bool = False,
+        transport: httpx.AsyncBaseTransport | None = None
+    ) -> Self:
+        '''
+        Downloads the lists in the list-of-lists concurrently and collects
+        the stats for each of them. The stats are kept in the same order
+        as the lists in the list-of-lists file.
+
+        :param filename: The JSON file with the list of lists
+        :param cache_dir: Directory to cache the downloaded lists in. Lists
+        in the cache are revalidated with conditional GET requests
+        :param concurrency: The maximum number of concurrent downloads
+        :param connections_per_host: The maximum number of concurrent
+        downloads from a single host
+        :param timeout: Timeout in seconds for each download
+        :param workers: The number of worker processes to parse the lists
+        with. If not set, the lists are parsed in the threads of the
+        default executor of the event loop
+        :param index: Index to update with the accounts of the lists. Only
+        lists that changed since they were added to the index are parsed
+        again
+        :param sketches: Whether to compute the sketches of the handles on
+        the lists, for ListOfLists.sketches()
+        :param transport: The transport for the HTTP client, for example
+        to serve lists from memory
+        '''
+
+        if concurrency < 1 or connections_per_host < 1:
+            raise ValueError(
+                'Concurrency and connections per host must be at least 1'
+            )
+
+        self: ListOfLists = ListOfLists(filename)
+        self.index = index
+        list_of_list_data: list[dict[str, any]] = \
+            ListOfLists._read_list_data(filename)
+
+        cache: ListCache | None = ListCache(cache_dir) if cache_dir else None
+
+        semaphore = asyncio.Semaphore(concurrency)
+        host_semaphores: dict[str, asyncio.Semaphore] = {}
+        for list_data in list_of_list_data:
+            host: str = urlparse(list_data['url']).netloc
+            if host not in host_semaphores:
+                host_semaphores[host] = asyncio.Semaphore(connections_per_host)
+
+        limits = httpx.Limits(
+            max_connections=concurrency,
+            max_keepalive_connections=concurrency
+        )
+        executor: ProcessPoolExecutor | None = None
+        if workers:
+            executor = ProcessPoolExecutor(max_workers=workers)
+
+        try:
+            async with httpx.AsyncClient(
+                    timeout=timeout, limits=limits,
+                    transport=transport) as client:
+                results: list[ListStats | None] = await asyncio.gather(
+                    *[
+                        ListOfLists._download_list_stats(
+                            client, ListStats(**list_data), cache,
+                            semaphore,
+                            host_semaphores[urlparse(list_data['url']).netloc],
+                            executor, index, sketches
                         )
+                        for list_data in list_of_list_data
+                    ]
+                )
+        finally:
+            if executor:
+                executor.shutdown()
 
-                        list_stats.counters[platform] += len(accounts or [])
+        self.list_of_lists = [
+            list_stats for list_stats in results if list_stats is not None
+        ]
 
-                self.list_of_lists.append(list_stats)
+        if index is not None:
+            index.retain(
+                [list_data['url'] for list_data in list_of_list_data]
+            )
 
         return self
 
+    @staticmethod
+    async def _download_list_stats(client: httpx.AsyncClient,
+                                   list_stats: ListStats,
+                                   cache: ListCache | None,
+                                   semaphore: asyncio.Semaphore,
+                                   host_semaphore: asyncio.Semaphore,
+                                   executor: ProcessPoolExecutor | None,
+                                   index: CrossListIndex | None = None,
+                                   sketches: bool = False
+                                   ) -> ListStats | None:
+        '''
+        Downloads a list and collects its stats. The cache is read and
+        written and the list is parsed in an executor, so that they do not
+        hold up the downloads of the other lists: in the worker processes
+        of the executor that is passed in or else in the default executor
+        of the event loop.
+
+        :returns: the stats for the list or None if the download failed
+        '''
+
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        cached: CacheEntry | None = None
+        if cache:
+            cached = await loop.run_in_executor(
+                None, cache.get, list_stats.url
+            )
+        headers: dict[str, str] = ListCache.revalidation_headers(cached)
+
+        async with semaphore, host_semaphore:
+            try:
+                resp: httpx.Response = await client.get(
+                    list_stats.url, headers=headers
+                )
+            except httpx.HTTPError as exc:
+                _LOGGER.info(f'Failed to download {list_stats.url}: {exc}')
+                return None
+
+        raw_list: str | None = resp.text
+        if await loop.run_in_executor(
+                None, ListOfLists._reuse_cached_stats, list_stats, resp,
+                cached):
+            raw_list = await loop.run_in_executor(
+                None, ListOfLists._raw_list_to_parse, list_stats, resp,
+                cache, cached, index, sketches
+            )
+        elif resp.status_code != 200:
+            _LOGGER.info(
+                f'Failed to download {list_stats.url}: {resp.status_code}'
+            )
+            return None
+
+        if raw_list is not None:
+            # Only the compact stats and accounts are sent back from a
+            # worker process
+            accounts: ListAccounts | None
+            list_stats, accounts = await loop.run_in_executor(
+                executor, parse_list, list_stats, raw_list,
+                index is not None, sketches
+            )
+
+            if index is not None:
+                content_hash: str = await loop.run_in_executor(
+                    None, ListCache.content_hash, raw_list
+                )
+                index.set_list(list_stats.url, content_hash, accounts)
+
+        await loop.run_in_executor(
+            None, ListOfLists._cache_response, list_stats, resp, cache,
+            raw_list is not None
+        )
+
+        return list_stats
+
+    @staticmethod
+    def _read_list_data(filename: str) -> list[dict[str, any]]:
+        with open(filename, 'r') as f:
+            list_of_list_data: list[dict[str, any]] = orjson.loads(f.read())
+
+        if not isinstance(list_of_list_data, list):
+            raise ValueError(f'Expected a list of lists in {filename}')
+
+        return list_of_list_data
+
+    @staticmethod
+    def _process_response(list_stats: ListStats, resp: httpx.Response,
+                          cache: ListCache | None,
+                          cached: CacheEntry | None,
+                          index: CrossListIndex | None = None,
+                          sketches: bool = False) -> bool:
+        '''
+        Updates the stats for a list, and the index if there is one, from
+        the response to its download
+
+        :param cached: The cache entry that the request headers of the
+        download were taken from
+        :returns: whether stats for the list are available
+        '''
+
+        raw_list: str | None = resp.text
+        if ListOfLists._reuse_cached_stats(list_stats, resp, cached):
+            raw_list = ListOfLists._raw_list_to_parse(
+                list_stats, resp, cache, cached, index, sketches
+            )
+        elif resp.status_code != 200:
+            _LOGGER.info(
+                f'Failed to download {list_stats.url}: {resp.status_code}'
+            )
+            return False
+
+        if raw_list is not None:
+            accounts: ListAccounts | None
+            _, accounts = parse_list(
+                list_stats, raw_list, index is not None, sketches
+            )
+            if index is not None:
+                index.set_list(
+                    list_stats.url, ListCache.content_hash(raw_list), accounts
+                )
+
+        ListOfLists._cache_response(
+            list_stats, resp, cache, raw_list is not None
+        )
+
+        return True
+
+    @staticmethod
+    def _raw_list_to_parse(list_stats: ListStats, resp: httpx.Response,
+                           cache: ListCache | None,
+                           cached: CacheEntry | None,
+                           index: CrossListIndex | None,
+                           sketches: bool = False) -> str | None:
+        '''
+        Gets the content of a list that has not changed since it was
+        cached, if it has to be parsed again because the index does not
+        have the accounts of this content of the list or because the
+        sketches are requested and the cached stats do not have them
+
+        :returns: the content of the list or None if the list does not have
+        to be parsed again
+        '''
+
+        if cached is None:
+            return None
+
+        if ((not sketches or 'sketches' in cached.stats)
+                and (index is None
+                     or index.has_list(list_stats.url, cached.content_hash))):
+            return None
+
+        if resp.status_code == 200:
+            return resp.text
+
+        with open(cache.body_path(list_stats.url), 'r') as file_desc:
+            return file_desc.read()
+
+    @staticmethod
+    def _reuse_cached_stats(list_stats: ListStats, resp: httpx.Response,
+                            cached: CacheEntry | None) -> bool:
+        '''
+        Uses the stats from the cache if the list has not changed since
+        the last download
+
+        :returns: whether the cached stats were used
+        '''
+
+        if not cached or not cached.stats:
+            return False
+
+        if resp.status_code == 304:
+            _LOGGER.debug(f'List {list_stats.url} has not been modified')
+        elif (resp.status_code == 200
+                and cached.content_hash == ListCache.content_hash(resp.text)):
+            _LOGGER.debug(f'Content of {list_stats.url} has not changed')
+        else:
+            return False
+
+        ListOfLists._apply_cached_stats(list_stats, cached.stats)
+
+        return True
+
+    @staticmethod
+    def _cache_response(list_stats: ListStats, resp: httpx.Response,
+                        cache: ListCache | None, parsed: bool) -> None:
+        '''
+        Stores a downloaded list in the cache, with its stats. For a list
+        that was not modified but was parsed again from the cache, only the
+        stats are updated.
+        '''
+
+        if not cache or resp.status_code not in (200, 304):
+            return
+
+        stats: dict[str, any] = list_stats.as_dict()
+        stats.pop('url')
+        if list_stats.sketches is not None:
+            stats['sketches'] = {
+                platform: sketch.as_dict()
+                for platform, sketch in list_stats.sketches.items()
+            }
+        if resp.status_code == 304:
+            if parsed:
+                cache.update_stats(list_stats.url, stats)
+            return
+
+        cache.store(
+            list_stats.url, resp.text, etag=resp.headers.get('etag'),
+            last_modified=resp.headers.get('last-modified'), stats=stats
+        )
+
+    @staticmethod
+    def _apply_cached_stats(list_stats: ListStats, stats: dict[str, any]
+                            ) -> None:
+        list_stats.name = stats.get('name')
+        list_stats.last_updated = stats.get('last_updated')
+        if isinstance(list_stats.last_updated, str):
+            list_stats.last_updated = datetime.fromisoformat(
+                list_stats.last_updated
+            )
+        list_stats.categories = stats.get('categories') or []
+        list_stats.counters = stats.get('counters') or {}
+        list_stats.sketches = None
+        if 'sketches' in stats:
+            list_stats.sketches = {
+                platform: MinHashSketch.from_dict(sketch_data)
+                for platform, sketch_data in stats['sketches'].items()
+            }
+
+    def sketches(self, filename: str | None = None) -> ListSketches:
+        '''
+        Gets the sketches of the handles on the lists, to estimate the
+        overlap of lists and find similar lists
+
+        :param filename: The file to save the sketches to with
+        ListSketches.save()
+        :raises: ValueError if the lists were loaded without their sketches
+        '''
+
+        list_sketches = ListSketches()
+        list_sketches.filename = filename
+        list_stats: ListStats
+        for list_stats in self.list_of_lists:
+            if list_stats.sketches is None:
+                raise ValueError(
+                    f'No sketches for list {list_stats.url}, load the '
+                    'list-of-lists with sketches=True'
+                )
+            list_sketches.set_list(list_stats.url, list_stats.sketches)
+
+        return list_sketches
+
+    def build_filters(self, cache_dir: str,
+                      false_positive_rate: float = BLOOM_FALSE_POSITIVE_RATE
+                      ) -> dict[str, BloomFilter]:
+        '''
+        Builds a Bloom filter for each social platform with the normalised
+        handles of the accounts in all lists of the list-of-lists
+
+        The filters are sized from the counters of the stats of the lists,
+        which count at least as many accounts as there are distinct handles,
+        so the handles are added to the filters as the cached lists are
+        streamed, without collecting them first.
+
+        :param cache_dir: The cache directory that the lists were downloaded
+        to by load() or load_async()
+        :param false_positive_rate: The probability that a handle that is
+        not on any list is found in a filter
+        :returns: the filters, by platform
+        :raises: ValueError if a list is not in the cache or its stats do
+        not count the accounts on a platform that the list has accounts on
+        '''
+
+        capacities: dict[str, int] = {}
+        list_stats: ListStats
+        for list_stats in self.list_of_lists:
+            platform: str
+            count: int
+            for platform, count in list_stats.counters.items():
+                capacities[platform] = capacities.get(platform, 0) + count
+
+        self.filters = {
+            platform: BloomFilter(capacity, false_positive_rate)
+            for platform, capacity in sorted(capacities.items())
+            if capacity
+        }
+
+        cache = ListCache(cache_dir)
+        for list_stats in self.list_of_lists:
+            body_path: str = cache.body_path(list_stats.url)
+            if not cache.get(list_stats.url) or not os.path.exists(body_path):
+                raise ValueError(f'List {list_stats.url} is not in the cache')
+
+            with open(body_path, 'r') as file_desc:
+                key: str
+                entry_data: any
+                for key, entry_data in ModerationList._iter_yaml(file_desc):
+                    if key == 'block':
+                        self._add_to_filters(list_stats, entry_data)
+
+        bloom_filter: BloomFilter
+        for platform, bloom_filter in self.filters.items():
+            _LOGGER.debug(
+                f'Bloom filter for {len(bloom_filter)} {platform} handles: '
+                f'{len(bloom_filter.data)} bytes'
+            )
+
+        return self.filters
+
+    def _add_to_filters(self, list_stats: ListStats,
+                        entry_data: dict[str, any]) -> None:
+        '''
+        Adds the handles of the raw data of an entry to the Bloom filters
+        '''
+
+        platform: str
+        handles: dict[any, tuple[str | None, bool]]
+        for platform, handles in ModerationList._raw_accounts(
+                entry_data).items():
+            bloom_filter: BloomFilter | None = self.filters.get(platform)
+            value: any
+            url: str | None
+            for value, (url, _) in handles.items():
+                handle: str | None = normalize_handle(value or url)
+                if handle is None:
+                    continue
+
+                if bloom_filter is None:
+                    raise ValueError(
+                        f'The stats of list {list_stats.url} do not count '
+                        f'its {platform} accounts'
+                    )
+                bloom_filter.add(handle)
+
+    def may_list(self, platform: str, handle: str) -> bool:
+        '''
+        Checks whether an account may be on one of the lists, using the
+        Bloom filters. An account that is on a list is always found, an
+        account that is not on any list is found with the false-positive
+        rate of the filters.
+
+        :param platform: The social platform
+        :param handle: The handle or the URL of the account
+        '''
+
+        bloom_filter: BloomFilter | None = self.filters.get(
+            platform.lower().replace(' ', '')
+        )
+        handle = normalize_handle(handle)
+        if bloom_filter is None or handle is None:
+            return False
+
+        return handle in bloom_filter
+
+    def save_filters(self, directory: str) -> dict[str, str]:
+        '''
+        Saves the Bloom filters as 'bloom-<platform>.bin' files
+
+        :param directory: The directory to save the filters in, which must
+        already exist
+        :returns: the filename for each platform
+        '''
+
+        filenames: dict[str, str] = {}
+        for platform, bloom_filter in self.filters.items():
+            filename: str = os.path.join(directory, f'bloom-{platform}.bin')
+            bloom_filter.save(filename)
+            filenames[platform] = filename
+
+        return filenames
+
+    def load_filters(self, directory: str) -> None:
+        '''
+        Loads the Bloom filters saved by save_filters()
+        '''
+
+        self.filters = {}
+        for filename in sorted(os.listdir(directory)):
+            if filename.startswith('bloom-') and filename.endswith('.bin'):
+                platform: str = filename[len('bloom-'):-len('.bin')]
+                self.filters[platform] = BloomFilter.load(
+                    os.path.join(directory, filename)
+                )
+
     def save(self, filename: str) -> None:
         with open(f'{filename}.tmp', 'wb') as fd:
             fd.write(
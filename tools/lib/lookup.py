@@ -0,0 +1,211 @@
+'''
+Compact lookup tables of the blocked handles on a social platform
+
+The extension only needs to know whether a handle on a platform is on a
+moderation list and for which categories, so it does not have to load the
+full list with the names, URLs, annotations and statistics of the entries.
+A lookup table is a JSON file with the sorted, normalised handles of the
+accounts on one platform and, for each handle, a bitmask of the categories
+of the entries that have the account:
+
+    {
+        "format": "byomod-lookup", "version": 1, "platform": "twitter",
+        "list_name": "...", "last_updated": "...",
+        "categories": ["alt-right", "conspiracy", ...],
+        "handles": ["aaronjmate", "aei", ...],
+        "masks": [1, 5, ...]
+    }
+
+Bit n of a mask is set for the n-th category in 'categories'. The handles
+are sorted by Unicode code point, so a reader can find a handle with a
+binary search.
+
+Javascript applies bitwise operators to signed 32-bit integers, so a mask
+only holds 31 categories. Tables with more categories have a 'mask_words'
+field with the number of 31-bit words per mask and each mask is a list of
+that many words, with the word for the first 31 categories first.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+
+from bisect import bisect_left
+from typing import Self
+from datetime import datetime
+from urllib.parse import urlparse
+from logging import Logger, getLogger
+
+import orjson
+
+_LOGGER: Logger = getLogger(__name__)
+
+LOOKUP_FORMAT: str = 'byomod-lookup'
+LOOKUP_VERSION: int = 1
+
+# Javascript applies bitwise operators to signed 32-bit integers, so the
+# masks are stored in words of 31 bits
+LOOKUP_MASK_BITS: int = 31
+
+# Path segments of account URLs that precede the handle, ie.
+# https://rumble.com/c/<handle> or https://www.youtube.com/channel/<id>
+_HANDLE_PATH_PREFIXES: frozenset[str] = frozenset(
+    ('c', 'channel', 'profile', 'r', 'u', 'user')
+)
+
+
+def normalize_handle(handle: str | int | None) -> str | None:
+    '''
+    Normalises the handle of a social account for lookups. The handle may
+    be the URL of the account and may be followed by ' - <status>'. The
+    normalised handle is in lower case, without the leading '@'. Numeric
+    handles, ie. from cells of a spreadsheet, are converted to strings.
+
+    :returns: the normalised handle or None if the value has no handle
+    '''
+
+    if handle is None or handle == '':
+        return None
+
+    handle = str(handle).split(' - ')[0].strip()
+    if handle.startswith(('https://', 'http://')):
+        segments: list[str] = [
+            segment for segment in urlparse(handle).path.split('/')
+            if segment
+        ]
+        if len(segments) > 1 and segments[0] in _HANDLE_PATH_PREFIXES:
+            segments = segments[1:]
+        handle = segments[0] if segments else ''
+
+    return handle.lstrip('@').lower() or None
+
+
+class LookupTable:
+    def __init__(self, platform: str, categories: list[str],
+                 handles: list[str], masks: list[int],
+                 list_name: str | None = None,
+                 last_updated: datetime | str | None = None) -> None:
+        '''
+        The blocked handles on a social platform
+
+        :param platform: The key of the platform in SOCIAL_PLATFORMS
+        :param categories: The categories for the bits of the masks
+        :param handles: The sorted, normalised handles
+        :param masks: The bitmask of the categories for each handle
+        :param list_name: The name of the moderation list
+        :param last_updated: When the moderation list was last updated
+        '''
+
+        if len(handles) != len(masks):
+            raise ValueError('Handles and masks must have the same length')
+
+        self.platform: str = platform
+        self.categories: list[str] = categories
+        self.handles: list[str] = handles
+        self.masks: list[int] = masks
+        self.list_name: str | None = list_name
+        self.last_updated: datetime | str | None = last_updated
+
+    def __len__(self) -> int:
+        return len(self.handles)
+
+    def __contains__(self, handle: str) -> bool:
+        return self._index(handle) is not None
+
+    def _index(self, handle: str) -> int | None:
+        handle = normalize_handle(handle)
+        if handle is None:
+            return None
+
+        index: int = bisect_left(self.handles, handle)
+        if index < len(self.handles) and self.handles[index] == handle:
+            return index
+
+        return None
+
+    def mask(self, handle: str) -> int:
+        '''
+        Gets the bitmask of the categories of a handle
+
+        :returns: the bitmask, which is 0 if the handle is not in the table
+        '''
+
+        index: int | None = self._index(handle)
+        if index is None:
+            return 0
+
+        return self.masks[index]
+
+    def get(self, handle: str) -> list[str] | None:
+        '''
+        Gets the categories of a handle
+
+        :returns: the categories or None if the handle is not in the table
+        '''
+
+        index: int | None = self._index(handle)
+        if index is None:
+            return None
+
+        mask: int = self.masks[index]
+        return [
+            category for bit, category in enumerate(self.categories)
+            if mask & (1 << bit)
+        ]
+
+    def save(self, filename: str) -> None:
+        data: dict[str, any] = {
+            'format': LOOKUP_FORMAT,
+            'version': LOOKUP_VERSION,
+            'platform': self.platform,
+            'list_name': self.list_name,
+            'last_updated': self.last_updated,
+            'categories': self.categories,
+            'handles': self.handles,
+            'masks': self.masks,
+        }
+
+        words: int = -(-len(self.categories) // LOOKUP_MASK_BITS)
+        if words > 1:
+            word_mask: int = (1 << LOOKUP_MASK_BITS) - 1
+            data['mask_words'] = words
+            data['masks'] = [
+                [
+                    (mask >> (word * LOOKUP_MASK_BITS)) & word_mask
+                    for word in range(words)
+                ]
+                for mask in self.masks
+            ]
+        with open(f'{filename}.tmp', 'wb') as file_desc:
+            file_desc.write(orjson.dumps(data))
+        os.replace(f'{filename}.tmp', filename)
+
+    @staticmethod
+    def load(filename: str) -> Self:
+        with open(filename, 'rb') as file_desc:
+            data: dict[str, any] = orjson.loads(file_desc.read())
+
+        if (data.get('format') != LOOKUP_FORMAT
+                or data.get('version') != LOOKUP_VERSION):
+            raise ValueError(f'{filename} is not a lookup table')
+
+        masks: list[int] | list[list[int]] = data['masks']
+        if data.get('mask_words'):
+            masks = [
+                sum(
+                    value << (word * LOOKUP_MASK_BITS)
+                    for word, value in enumerate(words)
+                )
+                for words in masks
+            ]
+
+        return LookupTable(
+            platform=data['platform'],
+            categories=data['categories'],
+            handles=data['handles'],
+            masks=masks,
+            list_name=data.get('list_name'),
+            last_updated=data.get('last_updated'),
+        )
@@ -0,0 +1,263 @@
+'''
+Publishes files to a directory for a static host, with content-hashed
+filenames and precompressed variants
+
+For each published file, the directory has a copy named after the SHA-256
+hash of its content, '<name>.<hash><extension>', and variants of the copy
+compressed with gzip, zstd and brotli. The 'zstandard' and 'brotli'
+packages are optional: without them, a warning is logged and the zstd or
+brotli variants are not published. As the content of a file with a given
+name never changes, the host can let CDNs and browsers cache them for a
+long time. The 'publish.json' pointer manifest in the directory has, for
+each published file, the name, hash and size of the current copy and of
+its compressed variants. Only the manifest should be served with a short
+cache lifetime.
+
+Files are only written when their content changed. The files of the
+previous version of each published file are kept, for clients that still
+have the previous manifest.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import gzip
+import hashlib
+
+from typing import Callable
+from dataclasses import field, dataclass
+from logging import Logger, getLogger
+
+import orjson
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_LOGGER: Logger = getLogger(__name__)
+
+PUBLISH_FORMAT: str = 'byomod-publish'
+PUBLISH_VERSION: int = 1
+
+PUBLISH_MANIFEST: str = 'publish.json'
+
+# Number of hex digits of the content hash in the filenames
+HASH_LENGTH: int = 16
+
+# The compressions to publish variants with by default
+PUBLISH_ENCODINGS: tuple[str, ...] = ('gzip', 'zstd', 'br')
+
+# The optional packages that provide the compressions
+ENCODING_PACKAGES: dict[str, str] = {
+    'zstd': 'zstandard',
+    'br': 'brotli',
+}
+
+
+def _compressors() -> dict[str, tuple[str, Callable[[bytes], bytes]]]:
+    '''
+    Gets the available compressors, with the extension of the files they
+    create
+    '''
+
+    compressors: dict[str, tuple[str, Callable[[bytes], bytes]]] = {
+        # Without a timestamp in the header, the output only depends on the
+        # content
+        'gzip': (
+            '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+        ),
+    }
+    if zstandard:
+        compressors['zstd'] = (
+            '.zst', zstandard.ZstdCompressor(level=19).compress
+        )
+    if brotli:
+        compressors['br'] = (
+            '.br', lambda data: brotli.compress(data, quality=11)
+        )
+
+    return compressors
+
+
+@dataclass
+class PublishedFile:
+    name: str
+    file: str
+    hash: str
+    size: int
+    # The file and size of the variant for each compression
+    encodings: dict[str, dict[str, str | int]] = field(default_factory=dict)
+    # The files of the previous version
+    previous: list[str] = field(default_factory=list)
+
+    def files(self) -> list[str]:
+        return [self.file] + [
+            encoding['file'] for encoding in self.encodings.values()
+        ]
+
+
+class Publisher:
+    def __init__(self, directory: str,
+                 encodings: tuple[str, ...] = PUBLISH_ENCODINGS) -> None:
+        '''
+        Publishes files to a directory
+
+        :param directory: The directory to publish to, which must already
+        exist
+        :param encodings: The compressions to publish variants with. A
+        warning is logged for compressions whose package is not installed
+        :raises: ValueError if the directory does not exist or a
+        compression is not supported
+        '''
+
+        if not os.path.isdir(directory):
+            raise ValueError(f'Publish directory {directory} does not exist')
+
+        available: dict[str, tuple[str, Callable[[bytes], bytes]]] = \
+            _compressors()
+        self.compressors: dict[str, tuple[str, Callable[[bytes], bytes]]] = {}
+        encoding: str
+        for encoding in encodings:
+            if encoding in available:
+                self.compressors[encoding] = available[encoding]
+            elif encoding in ENCODING_PACKAGES:
+                _LOGGER.warning(
+                    f'Not publishing {encoding} variants, install the '
+                    f'{ENCODING_PACKAGES[encoding]} package to publish them'
+                )
+            else:
+                raise ValueError(f'Unsupported compression: {encoding}')
+
+        self.directory: str = directory
+        self.files: dict[str, PublishedFile] = {}
+
+        manifest_path: str = os.path.join(directory, PUBLISH_MANIFEST)
+        try:
+            with open(manifest_path, 'rb') as file_desc:
+                manifest: dict[str, any] = orjson.loads(file_desc.read())
+            self.files = {
+                name: PublishedFile(**data)
+                for name, data in manifest.get('files', {}).items()
+            }
+        except FileNotFoundError:
+            pass
+        except (OSError, orjson.JSONDecodeError, TypeError) as exc:
+            _LOGGER.warning(f'Ignoring invalid publish manifest: {exc}')
+
+    def publish(self, filename: str, name: str | None = None
+                ) -> PublishedFile:
+        '''
+        Publishes a file, unless the same content has already been
+        published under the name
+
+        :param filename: The file to publish
+        :param name: The name to publish the file under, by default the
+        basename of the file
+        :returns: the published file
+        '''
+
+        name = name or os.path.basename(filename)
+        with open(filename, 'rb') as file_desc:
+            content: bytes = file_desc.read()
+
+        content_hash: str = hashlib.sha256(content).hexdigest()
+        current: PublishedFile | None = self.files.get(name)
+        if (current and current.hash == content_hash
+                and set(current.encodings) == set(self.compressors)
+                and all(self._exists(file) for file in current.files())):
+            _LOGGER.debug(f'{name} is unchanged')
+            return current
+
+        stem: str
+        extension: str
+        stem, extension = os.path.splitext(name)
+        published = PublishedFile(
+            name=name,
+            file=f'{stem}.{content_hash[:HASH_LENGTH]}{extension}',
+            hash=content_hash,
+            size=len(content),
+        )
+        self._write(published.file, content)
+
+        encoding: str
+        suffix: str
+        compress: Callable[[bytes], bytes]
+        for encoding, (suffix, compress) in self.compressors.items():
+            compressed_file: str = f'{published.file}{suffix}'
+            compressed: bytes = compress(content)
+            self._write(compressed_file, compressed)
+            published.encodings[encoding] = {
+                'file': compressed_file,
+                'size': len(compressed),
+            }
+
+        if current and current.hash == content_hash:
+            # Files of the current version were missing
+            published.previous = current.previous
+        elif current:
+            published.previous = [
+                file for file in current.files()
+                if file not in published.files()
+            ]
+            # Only the files of the previous version are kept
+            for file in current.previous:
+                if (file not in published.files()
+                        and file not in published.previous):
+                    self._remove(file)
+
+        self.files[name] = published
+        self._write_manifest()
+
+        sizes: str = ', '.join(
+            f'{encoding} {data["size"]}'
+            for encoding, data in published.encodings.items()
+        )
+        _LOGGER.info(
+            f'Published {name} as {published.file}: {published.size} bytes, '
+            f'{sizes}'
+        )
+
+        return published
+
+    def _exists(self, file: str) -> bool:
+        return os.path.exists(os.path.join(self.directory, file))
+
+    def _write(self, file: str, content: bytes) -> None:
+        # A file with the same name has the same content
+        if self._exists(file):
+            return
+
+        path: str = os.path.join(self.directory, file)
+        with open(f'{path}.tmp', 'wb') as file_desc:
+            file_desc.write(content)
+        os.replace(f'{path}.tmp', path)
+
+    def _remove(self, file: str) -> None:
+        try:
+            os.remove(os.path.join(self.directory, file))
+        except FileNotFoundError:
+            pass
+
+    def _write_manifest(self) -> None:
+        manifest: dict[str, any] = {
+            'format': PUBLISH_FORMAT,
+            'version': PUBLISH_VERSION,
+            'files': {
+                name: published.__dict__
+                for name, published in sorted(self.files.items())
+            },
+        }
+        path: str = os.path.join(self.directory, PUBLISH_MANIFEST)
+        with open(f'{path}.tmp', 'wb') as file_desc:
+            file_desc.write(
+                orjson.dumps(manifest, option=orjson.OPT_INDENT_2)
+            )
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,458 @@
+'''
+Queries over the social accounts of a moderation list, with secondary
+indexes
+
+A ListIndex has, for each value of the category, language, platform,
+status and annotation fields, the set of ids of the accounts with that
+value, and the accounts sorted by their latest follower count. The
+categories, languages and annotations of an entry apply to all its
+accounts. Predicates are combined with & (and), | (or) and ~ (not):
+
+    index = ListIndex(mod_list)
+    page = index.query(
+        Platform('twitter') & Status('active') & Category('conspiracy')
+        & Language('de') & Followers(minimum=10000),
+        limit=20
+    )
+
+The index registers itself with the list, so it is updated when entries
+are added to or removed from the list with add_block() and remove_block().
+Entries that are changed in another way can be re-indexed with
+update_block().
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from logging import Logger, getLogger
+
+from tools.lib.lists import (
+    ModerationEntry,
+    ModerationList,
+    SocialAccount,
+)
+
+_LOGGER: Logger = getLogger(__name__)
+
+QUERY_FIELDS: tuple[str, ...] = (
+    'category', 'language', 'platform', 'status', 'annotation'
+)
+
+QUERY_DEFAULT_LIMIT: int = 100
+
+
+@dataclass(frozen=True, slots=True)
+class QueryResult:
+    block_key: str
+    entry: ModerationEntry
+    account: SocialAccount
+    followers: int | None
+
+
+@dataclass(slots=True)
+class QueryPage:
+    # The number of accounts that match the query
+    total: int
+    offset: int
+    results: list[QueryResult]
+
+    @property
+    def next_offset(self) -> int | None:
+        '''
+        The offset of the next page or None if this is the last page
+        '''
+
+        if self.offset + len(self.results) >= self.total:
+            return None
+
+        return self.offset + len(self.results)
+
+
+class Predicate(ABC):
+    @abstractmethod
+    def evaluate(self, index: 'ListIndex') -> set[int]:
+        '''
+        Gets the ids of the accounts that match the predicate
+        '''
+
+    @abstractmethod
+    def matches(self, entry: ModerationEntry, account: SocialAccount
+                ) -> bool:
+        '''
+        Checks whether an account of an entry matches the predicate,
+        without an index
+        '''
+
+    def __and__(self, other: 'Predicate') -> 'Predicate':
+        return And(self, other)
+
+    def __or__(self, other: 'Predicate') -> 'Predicate':
+        return Or(self, other)
+
+    def __invert__(self) -> 'Predicate':
+        return Not(self)
+
+
+class And(Predicate):
+    def __init__(self, *predicates: Predicate) -> None:
+        self.predicates: tuple[Predicate, ...] = predicates
+
+    def evaluate(self, index: 'ListIndex') -> set[int]:
+        # The smallest sets are intersected first
+        results: list[set[int]] = sorted(
+            (predicate.evaluate(index) for predicate in self.predicates),
+            key=len
+        )
+        if not results:
+            return index.all_ids()
+
+        return results[0].intersection(*results[1:])
+
+    def matches(self, entry: ModerationEntry, account: SocialAccount
+                ) -> bool:
+        return all(
+            predicate.matches(entry, account)
+            for predicate in self.predicates
+        )
+
+    def __repr__(self) -> str:
+        return f'({" & ".join(repr(pred) for pred in self.predicates)})'
+
+
+class Or(Predicate):
+    def __init__(self, *predicates: Predicate) -> None:
+        self.predicates: tuple[Predicate, ...] = predicates
+
+    def evaluate(self, index: 'ListIndex') -> set[int]:
+        return set().union(
+            *(predicate.evaluate(index) for predicate in self.predicates)
+        )
+
+    def matches(self, entry: ModerationEntry, account: SocialAccount
+                ) -> bool:
+        return any(
+            predicate.matches(entry, account)
+            for predicate in self.predicates
+        )
+
+    def __repr__(self) -> str:
+        return f'({" | ".join(repr(pred) for pred in self.predicates)})'
+
+
+class Not(Predicate):
+    def __init__(self, predicate: Predicate) -> None:
+        self.predicate: Predicate = predicate
+
+    def evaluate(self, index: 'ListIndex') -> set[int]:
+        return index.all_ids() - self.predicate.evaluate(index)
+
+    def matches(self, entry: ModerationEntry, account: SocialAccount
+                ) -> bool:
+        return not self.predicate.matches(entry, account)
+
+    def __repr__(self) -> str:
+        return f'~{self.predicate!r}'
+
+
+class FieldIs(Predicate):
+    def __init__(self, field: str, value: str) -> None:
+        if field not in QUERY_FIELDS:
+            raise ValueError(f'Unknown query field: {field}')
+
+        self.field: str = field
+        self.value: str = value
+
+    def evaluate(self, index: 'ListIndex') -> set[int]:
+        # The postings of the index must not be modified by the caller
+        return set(index.postings[self.field].get(self.value, ()))
+
+    def matches(self, entry: ModerationEntry, account: SocialAccount
+                ) -> bool:
+        return (self.field, self.value) in ListIndex.field_values(
+            entry, account
+        )
+
+    def __repr__(self) -> str:
+        return f'{self.field}={self.value}'
+
+
+class Category(FieldIs):
+    def __init__(self, category: str) -> None:
+        super().__init__('category', category)
+
+
+class Language(FieldIs):
+    def __init__(self, language: str) -> None:
+        super().__init__('language', language)
+
+
+class Platform(FieldIs):
+    def __init__(self, platform: str) -> None:
+        super().__init__('platform', platform.lower().replace(' ', ''))
+
+
+class Status(FieldIs):
+    def __init__(self, status: str) -> None:
+        super().__init__('status', status)
+
+
+class Annotation(FieldIs):
+    def __init__(self, annotation: str) -> None:
+        super().__init__('annotation', annotation)
+
+
+class Followers(Predicate):
+    def __init__(self, minimum: int | None = None,
+                 maximum: int | None = None) -> None:
+        '''
+        Matches the accounts with a latest follower count in a range.
+        Accounts without a follower count never match.
+
+        :param minimum: The lowest follower count, inclusive
+        :param maximum: The highest follower count, inclusive
+        '''
+
+        self.minimum: int | None = minimum
+        self.maximum: int | None = maximum
+
+    def evaluate(self, index: 'ListIndex') -> set[int]:
+        start: int = 0
+        if self.minimum is not None:
+            start = bisect_left(index.followers, (self.minimum, -1))
+        end: int = len(index.followers)
+        if self.maximum is not None:
+            end = bisect_right(
+                index.followers, (self.maximum, index.next_id)
+            )
+
+        return {
+            account_id for _, account_id in index.followers[start:end]
+        }
+
+    def matches(self, entry: ModerationEntry, account: SocialAccount
+                ) -> bool:
+        followers: int | None = account.account_stats.latest()
+
+        return (
+            followers is not None
+            and (self.minimum is None or followers >= self.minimum)
+            and (self.maximum is None or followers <= self.maximum)
+        )
+
+    def __repr__(self) -> str:
+        return f'followers[{self.minimum}:{self.maximum}]'
+
+
+@dataclass(slots=True)
+class IndexedAccount:
+    block_key: str
+    account: SocialAccount
+    # The (field, value) tuples and the follower count that the account was
+    # indexed with, as the entry may change after it was indexed
+    values: list[tuple[str, str]]
+    followers: int | None
+
+
+class ListIndex:
+    def __init__(self, mod_list: ModerationList) -> None:
+        '''
+        Indexes the social accounts of a moderation list and registers the
+        index with the list, so it is updated when the list changes
+
+        :param mod_list: The list to index
+        '''
+
+        self.mod_list: ModerationList = mod_list
+
+        # The ids of the accounts are assigned in the order in which the
+        # accounts are indexed
+        self.accounts: dict[int, IndexedAccount] = {}
+        self.block_accounts: dict[str, list[int]] = {}
+        self.next_id: int = 0
+
+        self.postings: dict[str, dict[str, set[int]]] = {
+            field: {} for field in QUERY_FIELDS
+        }
+        # (followers, account id) tuples, sorted
+        self.followers: list[tuple[int, int]] = []
+
+        # While the index is built, the follower counts are sorted once at
+        # the end
+        self._building: bool = True
+        block_key: str
+        entry: ModerationEntry
+        for block_key, entry in mod_list.blocks.items():
+            self.update_block(block_key, entry)
+        self.followers.sort()
+        self._building = False
+
+        mod_list.indexes.append(self)
+
+    def close(self) -> None:
+        '''
+        Stops updating the index when the list changes
+        '''
+
+        self.mod_list.indexes.remove(self)
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def all_ids(self) -> set[int]:
+        return set(self.accounts)
+
+    @staticmethod
+    def field_values(entry: ModerationEntry, account: SocialAccount
+                     ) -> list[tuple[str, str]]:
+        '''
+        Gets the (field, value) tuples that an account of an entry is
+        indexed with
+        '''
+
+        values: list[tuple[str, str]] = [
+            ('platform', account.platform.name.lower().replace(' ', ''))
+        ]
+        if account.status:
+            values.append(('status', account.status))
+
+        values.extend(('category', category) for category in entry.categories)
+        # Like in the YAML file, entries without languages are in English
+        values.extend(
+            ('language', language) for language in entry.languages or ('en',)
+        )
+        values.extend(
+            ('annotation', annotation) for annotation in entry.annotations
+        )
+
+        return values
+
+    def update_block(self, block_key: str, entry: ModerationEntry) -> None:
+        '''
+        Indexes the accounts of an entry, replacing the accounts that were
+        indexed for the entry before
+        '''
+
+        self.remove_block(block_key)
+
+        account_ids: list[int] = []
+        account: SocialAccount
+        for account in entry.social_accounts:
+            account_id: int = self.next_id
+            self.next_id += 1
+            account_ids.append(account_id)
+
+            indexed = IndexedAccount(
+                block_key=block_key, account=account,
+                values=ListIndex.field_values(entry, account),
+                followers=account.account_stats.latest()
+            )
+            self.accounts[account_id] = indexed
+
+            field: str
+            value: str
+            for field, value in indexed.values:
+                self.postings[field].setdefault(value, set()).add(account_id)
+
+            if indexed.followers is None:
+                pass
+            elif self._building:
+                self.followers.append((indexed.followers, account_id))
+            else:
+                insort(self.followers, (indexed.followers, account_id))
+
+        self.block_accounts[block_key] = account_ids
+
+    def remove_block(self, block_key: str) -> None:
+        '''
+        Removes the accounts of an entry from the index
+        '''
+
+        account_id: int
+        for account_id in self.block_accounts.pop(block_key, ()):
+            indexed: IndexedAccount = self.accounts.pop(account_id)
+
+            field: str
+            value: str
+            for field, value in indexed.values:
+                postings: set[int] = self.postings[field][value]
+                postings.discard(account_id)
+                if not postings:
+                    del self.postings[field][value]
+
+            if indexed.followers is not None:
+                position: int = bisect_left(
+                    self.followers, (indexed.followers, account_id)
+                )
+                del self.followers[position]
+
+    def values(self, field: str) -> dict[str, int]:
+        '''
+        Gets the number of accounts for each value of a field
+        '''
+
+        return {
+            value: len(account_ids)
+            for value, account_ids in sorted(self.postings[field].items())
+        }
+
+    def query(self, predicate: Predicate | None = None, offset: int = 0,
+              limit: int = QUERY_DEFAULT_LIMIT, sort: str | None = None
+              ) -> QueryPage:
+        '''
+        Gets a page of the accounts that match a predicate
+
+        :param predicate: The predicate, by default all accounts match
+        :param offset: The number of matching accounts to skip
+        :param limit: The maximum number of accounts to return
+        :param sort: 'followers' to sort the accounts by their follower
+        count, highest first, with the accounts without a follower count
+        last. By default, accounts are returned in the order they were
+        indexed in.
+        :returns: the page of results
+        '''
+
+        if offset < 0 or limit < 0:
+            raise ValueError('Offset and limit must not be negative')
+        if sort not in (None, 'followers'):
+            raise ValueError(f'Unknown sort order: {sort}')
+
+        account_ids: set[int]
+        if predicate is None:
+            account_ids = self.all_ids()
+        else:
+            account_ids = predicate.evaluate(self)
+
+        ordered: list[int]
+        if sort == 'followers':
+            ordered = [
+                account_id for _, account_id in reversed(self.followers)
+                if account_id in account_ids
+            ]
+            ordered.extend(
+                sorted(
+                    account_id for account_id in account_ids
+                    if self.accounts[account_id].followers is None
+                )
+            )
+        else:
+            ordered = sorted(account_ids)
+
+        results: list[QueryResult] = []
+        account_id: int
+        for account_id in ordered[offset:offset + limit]:
+            indexed: IndexedAccount = self.accounts[account_id]
+            results.append(
+                QueryResult(
+                    block_key=indexed.block_key,
+                    entry=self.mod_list.blocks[indexed.block_key],
+                    account=indexed.account,
+                    followers=indexed.followers,
+                )
+            )
+
+        return QueryPage(total=len(account_ids), offset=offset,
+                         results=results)
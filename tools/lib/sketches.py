@@ -0,0 +1,375 @@
+'''
+MinHash sketches of the handles on moderation lists, to estimate how much
+lists overlap without comparing all their accounts
+
+A bottom-k sketch keeps the k smallest 64-bit hashes of the normalised
+handles of a list. The hash of a handle is the first 8 bytes of its SHA-256
+hash, read as a little-endian integer, like the Bloom filters. The sketch
+of a list with fewer than k handles has all their hashes and is exact.
+
+For a set of lists, the k smallest hashes of the union of their sketches
+are the sketch of the union of the lists. The fraction of those hashes
+that is in the sketches of all lists estimates the Jaccard similarity of
+the lists. If the k-th smallest hash, as a fraction of 2^64, is u, the
+union has about (k - 1) / u handles. The relative error of both estimates
+is about 1 / sqrt(k), so sketches of 256 hashes are accurate to about 6%,
+for 2 kB per platform per list.
+
+The sketches of the lists in a list-of-lists are stored next to it in a
+JSON file, with the hashes of each sketch as base64 of little-endian 64-bit
+integers:
+
+    {
+        "format": "byomod-list-sketches", "version": 1,
+        "lists": {"<url>": {"twitter": {"size": 256, "hashes": "..."}}}
+    }
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import heapq
+import base64
+import struct
+import hashlib
+
+from typing import Self
+from typing import Iterable
+from dataclasses import dataclass
+from logging import Logger, getLogger
+
+import orjson
+
+_LOGGER: Logger = getLogger(__name__)
+
+SKETCHES_FORMAT: str = 'byomod-list-sketches'
+SKETCHES_VERSION: int = 1
+
+SKETCH_SIZE: int = 256
+
+_HASH_RANGE: int = 2**64
+
+
+def handle_hash(handle: str) -> int:
+    '''
+    Gets the 64-bit hash of a normalised handle
+    '''
+
+    return int.from_bytes(
+        hashlib.sha256(handle.encode('utf-8')).digest()[:8], 'little'
+    )
+
+
+class MinHashSketch:
+    __slots__ = ('size', 'hashes')
+
+    def __init__(self, size: int = SKETCH_SIZE,
+                 hashes: Iterable[int] = ()) -> None:
+        '''
+        A bottom-k sketch of a set of handles
+
+        :param size: The maximum number of hashes in the sketch
+        :param hashes: Hashes to add to the sketch
+        '''
+
+        if size < 2:
+            raise ValueError('The size of a sketch must be at least 2')
+
+        self.size: int = size
+        # The smallest hashes, sorted
+        self.hashes: list[int] = heapq.nsmallest(size, set(hashes))
+
+    @staticmethod
+    def from_handles(handles: Iterable[str], size: int = SKETCH_SIZE
+                     ) -> Self:
+        '''
+        Creates the sketch of a set of normalised handles
+        '''
+
+        return MinHashSketch(size, (handle_hash(handle) for handle in handles))
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __eq__(self, other: Self) -> bool:
+        return self.size == other.size and self.hashes == other.hashes
+
+    def __reduce__(self) -> tuple:
+        return (MinHashSketch, (self.size, self.hashes))
+
+    def update(self, handles: Iterable[str]) -> None:
+        self.hashes = heapq.nsmallest(
+            self.size,
+            set(self.hashes).union(handle_hash(handle) for handle in handles)
+        )
+
+    @property
+    def is_exact(self) -> bool:
+        '''
+        Whether the sketch has the hashes of all handles of the set
+        '''
+
+        return len(self.hashes) < self.size
+
+    def cardinality(self) -> float:
+        '''
+        Estimates the number of handles in the set
+        '''
+
+        if self.is_exact:
+            return float(len(self.hashes))
+
+        return (self.size - 1) / ((self.hashes[-1] + 1) / _HASH_RANGE)
+
+    def as_dict(self) -> dict[str, int | str]:
+        return {
+            'size': self.size,
+            'hashes': base64.b64encode(
+                struct.pack(f'<{len(self.hashes)}Q', *self.hashes)
+            ).decode('ascii'),
+        }
+
+    @staticmethod
+    def from_dict(data: dict[str, int | str]) -> Self:
+        raw: bytes = base64.b64decode(data['hashes'])
+        if len(raw) % 8 or len(raw) // 8 > data['size']:
+            raise ValueError('Invalid hashes for a sketch')
+
+        hashes: tuple[int, ...] = struct.unpack(f'<{len(raw) // 8}Q', raw)
+        sketch: MinHashSketch = MinHashSketch.__new__(MinHashSketch)
+        sketch.size = data['size']
+        sketch.hashes = sorted(hashes)
+
+        return sketch
+
+
+@dataclass(frozen=True, slots=True)
+class OverlapEstimate:
+    # The estimated number of handles on any of the lists
+    union: float
+    # The estimated number of handles on all of the lists
+    intersection: float
+    jaccard: float
+
+
+def estimate_overlap(sketches: list[MinHashSketch | None]
+                     ) -> OverlapEstimate:
+    '''
+    Estimates the overlap of a set of lists from their sketches
+
+    :param sketches: The sketches of the lists, with None for a list that
+    has no handles
+    :returns: the estimates
+    '''
+
+    if not sketches:
+        raise ValueError('No sketches to estimate the overlap of')
+
+    if any(sketch is None or not sketch.hashes for sketch in sketches):
+        present: list[MinHashSketch] = [
+            sketch for sketch in sketches
+            if sketch is not None and sketch.hashes
+        ]
+        union: float = 0.0
+        if present:
+            union = estimate_overlap(present).union
+
+        return OverlapEstimate(union=union, intersection=0.0, jaccard=0.0)
+
+    # All hashes of a set that are not larger than the k-th smallest hash
+    # of the union are in the sketch of the set, as the sketches have at
+    # least k hashes
+    size: int = min(sketch.size for sketch in sketches)
+    union_hashes: list[int] = sorted(
+        set().union(*(sketch.hashes for sketch in sketches))
+    )
+    del union_hashes[size:]
+    threshold: int = union_hashes[-1]
+    shared: int = sum(
+        1 for value in set(sketches[0].hashes).intersection(
+            *(sketch.hashes for sketch in sketches[1:])
+        )
+        if value <= threshold
+    )
+
+    jaccard: float = shared / len(union_hashes)
+    union_size: float
+    if len(union_hashes) < size:
+        union_size = float(len(union_hashes))
+    else:
+        union_size = (size - 1) / ((threshold + 1) / _HASH_RANGE)
+
+    return OverlapEstimate(
+        union=union_size, intersection=jaccard * union_size, jaccard=jaccard
+    )
+
+
+def combine_estimates(estimates: Iterable[OverlapEstimate]
+                      ) -> OverlapEstimate:
+    '''
+    Combines the estimates for the platforms of a set of lists. As the
+    handles of different platforms do not overlap, the sizes add up.
+    '''
+
+    union: float = 0.0
+    intersection: float = 0.0
+    estimate: OverlapEstimate
+    for estimate in estimates:
+        union += estimate.union
+        intersection += estimate.intersection
+
+    return OverlapEstimate(
+        union=union, intersection=intersection,
+        jaccard=intersection / union if union else 0.0
+    )
+
+
+class ListSketches:
+    def __init__(self, filename: str | None = None) -> None:
+        '''
+        The sketches of the handles on the lists of a list-of-lists, by
+        social platform
+
+        :param filename: The file that the sketches are loaded from, if it
+        exists, and saved to
+        '''
+
+        self.filename: str | None = filename
+
+        # url -> platform -> sketch, in the order of the list-of-lists
+        self.lists: dict[str, dict[str, MinHashSketch]] = {}
+
+        if filename:
+            self.load(filename)
+
+    def load(self, filename: str) -> None:
+        try:
+            with open(filename, 'rb') as file_desc:
+                data: dict[str, any] = orjson.loads(file_desc.read())
+        except FileNotFoundError:
+            return
+        except (OSError, orjson.JSONDecodeError) as exc:
+            _LOGGER.warning(f'Ignoring invalid list sketches: {exc}')
+            return
+
+        if (data.get('format') != SKETCHES_FORMAT
+                or data.get('version') != SKETCHES_VERSION):
+            _LOGGER.warning(f'Ignoring {filename}, it has no list sketches')
+            return
+
+        self.lists = {
+            url: {
+                platform: MinHashSketch.from_dict(sketch_data)
+                for platform, sketch_data in platforms.items()
+            }
+            for url, platforms in data['lists'].items()
+        }
+
+    def save(self, filename: str | None = None) -> None:
+        filename = filename or self.filename
+        if not filename:
+            raise ValueError('No filename for the list sketches')
+
+        data: dict[str, any] = {
+            'format': SKETCHES_FORMAT,
+            'version': SKETCHES_VERSION,
+            'lists': {
+                url: {
+                    platform: sketch.as_dict()
+                    for platform, sketch in sorted(platforms.items())
+                }
+                for url, platforms in self.lists.items()
+            },
+        }
+        with open(f'{filename}.tmp', 'wb') as file_desc:
+            file_desc.write(orjson.dumps(data))
+        os.replace(f'{filename}.tmp', filename)
+
+    def set_list(self, url: str, sketches: dict[str, MinHashSketch]) -> None:
+        self.lists[url] = sketches
+
+    def estimate(self, urls: list[str], platform: str | None = None
+                 ) -> OverlapEstimate:
+        '''
+        Estimates the overlap of a set of lists
+
+        :param urls: The URLs of the lists
+        :param platform: Only compare the handles on this platform. By
+        default, the handles on all platforms are compared
+        :returns: the estimates
+        :raises: KeyError if there are no sketches for a list
+        '''
+
+        sketches: list[dict[str, MinHashSketch]] = [
+            self.lists[url] for url in urls
+        ]
+
+        platforms: set[str]
+        if platform:
+            platforms = {platform.lower().replace(' ', '')}
+        else:
+            platforms = set().union(*sketches)
+
+        return combine_estimates(
+            estimate_overlap(
+                [list_sketches.get(platform) for list_sketches in sketches]
+            )
+            for platform in sorted(platforms)
+        )
+
+    def similar(self, url: str, count: int = 10, platform: str | None = None
+                ) -> list[tuple[str, OverlapEstimate]]:
+        '''
+        Finds the lists that are most similar to a list
+
+        :param url: The URL of the list
+        :param count: The maximum number of lists to return
+        :param platform: Only compare the handles on this platform
+        :returns: (url, estimate) tuples for the lists that share handles
+        with the list, with the highest Jaccard similarity first
+        '''
+
+        results: list[tuple[str, OverlapEstimate]] = []
+        other_url: str
+        for other_url in self.lists:
+            if other_url == url:
+                continue
+
+            estimate: OverlapEstimate = self.estimate(
+                [url, other_url], platform
+            )
+            if estimate.intersection:
+                results.append((other_url, estimate))
+
+        return heapq.nlargest(
+            count, results, key=lambda result: result[1].jaccard
+        )
+
+    def duplicates(self, threshold: float = 0.9,
+                   platform: str | None = None
+                   ) -> list[tuple[str, str, OverlapEstimate]]:
+        '''
+        Finds the pairs of lists that have mostly the same handles
+
+        :param threshold: The minimum estimated Jaccard similarity
+        :param platform: Only compare the handles on this platform
+        :returns: (url, other url, estimate) tuples, in the order of the
+        lists
+        '''
+
+        urls: list[str] = list(self.lists)
+        results: list[tuple[str, str, OverlapEstimate]] = []
+        position: int
+        url: str
+        for position, url in enumerate(urls):
+            other_url: str
+            for other_url in urls[position + 1:]:
+                estimate: OverlapEstimate = self.estimate(
+                    [url, other_url], platform
+                )
+                if estimate.jaccard >= threshold:
+                    results.append((url, other_url, estimate))
+
+        return results
@@ -0,0 +1,569 @@
+'''
+Stores a moderation list in a SQLite database, so that a large list can be
+edited without loading and saving the whole list
+
+Each entry is stored as a row with its data as JSON, in the same form as
+in a snapshot, so the list can be exported to YAML without any changes.
+The accounts, categories and languages of the entries are stored in
+separate tables, with indexes to find the entries by (platform, handle),
+category and language. The identities table has the same function as the
+account index of ModerationList: it maps the accounts of the entries on the
+IDENTITY_PLATFORMS to the entry that they were last added to, so that
+add_block() merges the entries in the same way as ModerationList does.
+
+Every change to the store is a single transaction. Adding an entry only
+reads and writes the entries that it is merged with.
+
+The YAML of each entry, as it is written in the block list of a YAML file,
+is kept with the entry once the list has been exported to YAML. Changing
+an entry clears its YAML, so exporting the list again only converts the
+entries that changed since the previous export.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import sqlite3
+
+from typing import Self
+from typing import Iterator
+from typing import TextIO
+from datetime import UTC
+from datetime import datetime
+from contextlib import contextmanager
+from logging import Logger, getLogger
+
+import orjson
+
+from ruamel.yaml import YAML
+
+from tools.lib.lists import (
+    ModerationEntry,
+    ModerationList,
+    parse_entry_timestamps,
+)
+
+_LOGGER: Logger = getLogger(__name__)
+
+STORE_SCHEMA_VERSION: int = 1
+
+# Number of entries to convert to YAML in each query of an export
+_YAML_BATCH_SIZE: int = 1000
+
+_SCHEMA: tuple[str, ...] = (
+    '''
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS entries (
+        block_key TEXT PRIMARY KEY,
+        sequence INTEGER NOT NULL UNIQUE,
+        data BLOB NOT NULL,
+        yaml TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS accounts (
+        block_key TEXT NOT NULL,
+        platform TEXT NOT NULL,
+        handle TEXT,
+        url TEXT,
+        status TEXT,
+        is_primary INTEGER
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS accounts_handle ON accounts(platform, handle)',
+    'CREATE INDEX IF NOT EXISTS accounts_block ON accounts(block_key)',
+    '''
+    CREATE TABLE IF NOT EXISTS categories (
+        block_key TEXT NOT NULL,
+        category TEXT NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS categories_category ON categories(category)',
+    'CREATE INDEX IF NOT EXISTS categories_block ON categories(block_key)',
+    '''
+    CREATE TABLE IF NOT EXISTS languages (
+        block_key TEXT NOT NULL,
+        language TEXT NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS languages_language ON languages(language)',
+    'CREATE INDEX IF NOT EXISTS languages_block ON languages(block_key)',
+    '''
+    CREATE TABLE IF NOT EXISTS identities (
+        identity BLOB PRIMARY KEY,
+        block_key TEXT NOT NULL
+    )
+    ''',
+)
+
+
+class ListStore:
+    def __init__(self, filename: str) -> None:
+        '''
+        A moderation list stored in a SQLite database. The database is
+        created if it does not exist.
+
+        :param filename: The file of the database
+        '''
+
+        self.filename: str = filename
+
+        # Transactions are started explicitly, see _transaction()
+        self.connection: sqlite3.Connection = sqlite3.connect(
+            filename, isolation_level=None
+        )
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+        with self._transaction():
+            for statement in _SCHEMA:
+                self.connection.execute(statement)
+
+            version: int | None = self._get_meta('schema_version')
+            if version is None:
+                self._set_meta('schema_version', STORE_SCHEMA_VERSION)
+            elif version != STORE_SCHEMA_VERSION:
+                raise ValueError(
+                    f'Unsupported schema version of {filename}: {version}'
+                )
+
+            # Stores created before the YAML of the entries was kept
+            columns: set[str] = {
+                row[1] for row in self.connection.execute(
+                    'PRAGMA table_info(entries)'
+                )
+            }
+            if 'yaml' not in columns:
+                self.connection.execute(
+                    'ALTER TABLE entries ADD COLUMN yaml TEXT'
+                )
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM entries'
+        ).fetchone()[0]
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+
+        self.connection.execute('COMMIT')
+
+    def _get_meta(self, key: str) -> any:
+        row: tuple | None = self.connection.execute(
+            'SELECT value FROM meta WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        return orjson.loads(row[0])
+
+    def _set_meta(self, key: str, value: any) -> None:
+        self.connection.execute(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+            (key, orjson.dumps(value))
+        )
+
+    def _touch(self) -> None:
+        meta: dict[str, any] | None = self._get_meta('list')
+        if meta is None:
+            raise ValueError(f'{self.filename} does not have a list')
+
+        meta['last_updated'] = datetime.now(tz=UTC)
+        self._set_meta('list', meta)
+
+    def has_list(self) -> bool:
+        return self._get_meta('list') is not None
+
+    def meta(self) -> dict[str, any]:
+        '''
+        Gets the metadata of the list, as in ModerationList.meta_as_dict()
+        '''
+
+        meta: dict[str, any] | None = self._get_meta('list')
+        if meta is None:
+            raise ValueError(f'{self.filename} does not have a list')
+
+        meta['last_updated'] = datetime.fromisoformat(meta['last_updated'])
+
+        return meta
+
+    def get(self, block_key: str) -> ModerationEntry | None:
+        '''
+        Gets an entry of the list
+
+        :param block_key: The key of the entry in the blocks of the list
+        :returns: the entry or None if the list does not have it
+        '''
+
+        row: tuple | None = self.connection.execute(
+            'SELECT data FROM entries WHERE block_key = ?', (block_key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        return ListStore._entry(row[0])
+
+    @staticmethod
+    def _entry(data: bytes) -> ModerationEntry:
+        entry_data: dict[str, any] = orjson.loads(data)
+        parse_entry_timestamps(entry_data)
+
+        return ModerationEntry.from_dict(entry_data)
+
+    def find_account(self, platform: str, handle: str) -> list[str]:
+        '''
+        Gets the keys of the entries that have an account
+
+        :param platform: The social platform
+        :param handle: The handle of the account
+        '''
+
+        return [
+            row[0] for row in self.connection.execute(
+                '''
+                SELECT DISTINCT block_key FROM accounts
+                WHERE platform = ? AND handle = ?
+                ''',
+                (platform.lower().replace(' ', ''), handle)
+            )
+        ]
+
+    def iter_category(self, category: str
+                      ) -> Iterator[tuple[str, ModerationEntry]]:
+        '''
+        Iterates over the (key, entry) tuples of the entries with a
+        category, in the order of the list
+        '''
+
+        yield from self._iter_entries(
+            '''
+            SELECT block_key, data FROM entries WHERE block_key IN (
+                SELECT block_key FROM categories WHERE category = ?
+            ) ORDER BY sequence
+            ''',
+            (category,)
+        )
+
+    def iter_language(self, language: str
+                      ) -> Iterator[tuple[str, ModerationEntry]]:
+        '''
+        Iterates over the (key, entry) tuples of the entries with a
+        language, in the order of the list
+        '''
+
+        yield from self._iter_entries(
+            '''
+            SELECT block_key, data FROM entries WHERE block_key IN (
+                SELECT block_key FROM languages WHERE language = ?
+            ) ORDER BY sequence
+            ''',
+            (language,)
+        )
+
+    def iter_blocks(self) -> Iterator[tuple[str, ModerationEntry]]:
+        '''
+        Iterates over the (key, entry) tuples of the list, in the order of
+        the list
+        '''
+
+        yield from self._iter_entries(
+            'SELECT block_key, data FROM entries ORDER BY sequence', ()
+        )
+
+    def _iter_entries(self, query: str, parameters: tuple
+                      ) -> Iterator[tuple[str, ModerationEntry]]:
+        block_key: str
+        data: bytes
+        for block_key, data in self.connection.execute(query, parameters):
+            yield block_key, ListStore._entry(data)
+
+    def add_block(self, entry: ModerationEntry) -> None:
+        '''
+        Adds an entry to the list, merging it with existing entries in the
+        same way as ModerationList.add_block()
+        '''
+
+        with self._transaction():
+            self._add_block(entry)
+            self._touch()
+
+    def merge(self, mod_list: ModerationList) -> None:
+        '''
+        Adds the entries and the categories of another list to the list, in
+        a single transaction
+        '''
+
+        with self._transaction():
+            meta: dict[str, any] = self._get_meta('list')
+            category: str
+            description: str
+            for category, description in (mod_list.categories or {}).items():
+                if category not in meta['categories']:
+                    meta['categories'][category] = description
+            self._set_meta('list', meta)
+
+            entry: ModerationEntry
+            for entry in mod_list.blocks.values():
+                self._add_block(entry)
+            self._touch()
+
+    def remove_block(self, block_key: str) -> ModerationEntry:
+        '''
+        Removes an entry from the list
+
+        :param block_key: The key of the entry in the blocks of the list
+        :returns: the removed entry
+        :raises: KeyError if the list does not have the entry
+        '''
+
+        with self._transaction():
+            entry: ModerationEntry | None = self.get(block_key)
+            if entry is None:
+                raise KeyError(block_key)
+
+            self._delete(block_key)
+            self.connection.execute(
+                'DELETE FROM identities WHERE block_key = ?', (block_key,)
+            )
+            self._touch()
+
+        return entry
+
+    def _add_block(self, entry: ModerationEntry) -> None:
+        block_repr: str = entry.__repr__()
+
+        # The entries that were read from the database, as merging modifies
+        # them
+        entries: dict[str, ModerationEntry] = {}
+        existing: ModerationEntry | None = self.get(block_repr)
+        if existing:
+            entries[block_repr] = existing
+
+        identity_key: tuple[str, str]
+        for identity_key in entry.identity_keys():
+            row: tuple | None = self.connection.execute(
+                'SELECT block_key FROM identities WHERE identity = ?',
+                (orjson.dumps(identity_key),)
+            ).fetchone()
+            if row is None or row[0] in entries:
+                continue
+
+            existing = self.get(row[0])
+            if existing and existing.names_match(entry):
+                entries[row[0]] = existing
+
+        if not entries:
+            sequence: int = self._get_meta('next_sequence') or 0
+            self._set_meta('next_sequence', sequence + 1)
+            self._insert(block_repr, sequence, entry)
+            self._index(block_repr, entry)
+            return
+
+        sequences: dict[str, int] = {
+            block_key: self.connection.execute(
+                'SELECT sequence FROM entries WHERE block_key = ?',
+                (block_key,)
+            ).fetchone()[0]
+            for block_key in entries
+        }
+        ordered_keys: list[str] = sorted(entries, key=sequences.__getitem__)
+        root_key: str = ordered_keys[0]
+        root_entry: ModerationEntry = entries[root_key]
+        for block_key in ordered_keys[1:]:
+            if not root_entry.names_match(entries[block_key]):
+                continue
+
+            root_entry.merge(entries[block_key])
+            # Like ModerationList, the identities of the merged entry are
+            # moved to the root entry by _index()
+            self._delete(block_key)
+
+        root_entry.merge(entry)
+        self._delete(root_key)
+        self._insert(root_key, sequences[root_key], root_entry)
+        self._index(root_key, root_entry)
+
+    def _insert(self, block_key: str, sequence: int, entry: ModerationEntry
+                ) -> None:
+        self.connection.execute(
+            'INSERT INTO entries (block_key, sequence, data) VALUES (?, ?, ?)',
+            (block_key, sequence, orjson.dumps(entry.as_dict()))
+        )
+        self.connection.executemany(
+            '''
+            INSERT INTO accounts
+            (block_key, platform, handle, url, status, is_primary)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''',
+            [
+                (
+                    block_key, account.platform.name.lower().replace(' ', ''),
+                    account.handle, account.url, account.status,
+                    account.is_primary
+                )
+                for account in entry.social_accounts
+            ]
+        )
+        self.connection.executemany(
+            'INSERT INTO categories (block_key, category) VALUES (?, ?)',
+            [(block_key, category) for category in entry.categories]
+        )
+        self.connection.executemany(
+            'INSERT INTO languages (block_key, language) VALUES (?, ?)',
+            [(block_key, language) for language in entry.languages]
+        )
+
+    def _delete(self, block_key: str) -> None:
+        table: str
+        for table in ('entries', 'accounts', 'categories', 'languages'):
+            self.connection.execute(
+                f'DELETE FROM {table} WHERE block_key = ?', (block_key,)
+            )
+
+    def _index(self, block_key: str, entry: ModerationEntry) -> None:
+        self.connection.executemany(
+            '''
+            INSERT OR REPLACE INTO identities (identity, block_key)
+            VALUES (?, ?)
+            ''',
+            [
+                (orjson.dumps(identity_key), block_key)
+                for identity_key in entry.identity_keys()
+            ]
+        )
+
+    def import_list(self, mod_list: ModerationList) -> None:
+        '''
+        Replaces the list in the store with a moderation list
+        '''
+
+        with self._transaction():
+            table: str
+            for table in ('meta', 'entries', 'accounts', 'categories',
+                          'languages', 'identities'):
+                self.connection.execute(f'DELETE FROM {table}')
+
+            self._set_meta('schema_version', STORE_SCHEMA_VERSION)
+            self._set_meta('list', mod_list.meta_as_dict())
+            self._set_meta(
+                'trust_list', [entry.as_dict() for entry in mod_list.trusts]
+            )
+
+            sequence: int
+            block_key: str
+            entry: ModerationEntry
+            for sequence, (block_key, entry) in enumerate(
+                    mod_list.blocks.items()):
+                self._insert(block_key, sequence, entry)
+                self._index(block_key, entry)
+            self._set_meta('next_sequence', len(mod_list))
+
+    def to_list(self) -> ModerationList:
+        '''
+        Creates a moderation list with the entries in the store, in the
+        order of the list, in the same way as loading the list from a file
+        '''
+
+        raw_data: dict[str, any] = {
+            'meta': self.meta(),
+            'block_list': [
+                entry.as_dict() for _, entry in self.iter_blocks()
+            ],
+            'trust_list': self._get_meta('trust_list') or [],
+        }
+
+        return ModerationList.from_dict(raw_data)
+
+    def export(self, filename: str, fmt: str | None = None) -> None:
+        '''
+        Saves the list in the store as a moderation list file. A YAML file
+        is written from the YAML of the entries in the store, so only the
+        entries that changed since the previous export are converted.
+
+        :param filename: The file to save the list to
+        :param fmt: 'yaml' or 'snapshot', by default the format is derived
+        from the extension of the filename
+        '''
+
+        if ModerationList._file_format(filename, fmt) == 'snapshot':
+            self.to_list().save(filename, fmt)
+            return
+
+        with open(f'{filename}.tmp', 'w') as file_desc:
+            self.write_yaml(file_desc)
+        os.replace(f'{filename}.tmp', filename)
+
+    def write_yaml(self, file_desc: TextIO) -> None:
+        '''
+        Writes the list in the store as a YAML document, in the same way as
+        ModerationList.write_yaml()
+
+        :param file_desc: The stream to write to
+        '''
+
+        yaml: YAML = ModerationList.yaml_dumper()
+        self._update_yaml(yaml)
+
+        ModerationList.write_yaml_document(
+            file_desc, self.meta(),
+            (
+                row[0] for row in self.connection.execute(
+                    'SELECT yaml FROM entries ORDER BY sequence'
+                )
+            ),
+            self._get_meta('trust_list') or [], yaml
+        )
+
+    def _update_yaml(self, yaml: YAML) -> None:
+        '''
+        Converts the entries that changed since the previous export to YAML
+        '''
+
+        with self._transaction():
+            updated: int = 0
+            while True:
+                rows: list[tuple[str, bytes]] = self.connection.execute(
+                    'SELECT block_key, data FROM entries WHERE yaml IS NULL '
+                    'LIMIT ?',
+                    (_YAML_BATCH_SIZE,)
+                ).fetchall()
+                if not rows:
+                    break
+
+                self.connection.executemany(
+                    'UPDATE entries SET yaml = ? WHERE block_key = ?',
+                    [
+                        (
+                            ModerationList.entry_yaml(
+                                ListStore._entry(data), yaml
+                            ),
+                            block_key
+                        )
+                        for block_key, data in rows
+                    ]
+                )
+                updated += len(rows)
+
+        _LOGGER.debug(f'Converted {updated} entries to YAML')
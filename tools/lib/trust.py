@@ -0,0 +1,424 @@
+'''
+Resolves the trust list of a moderation list into the effective block list:
+the entries of the list and of all lists that it trusts, directly or
+through the lists that those lists trust
+
+The trust graph is walked breadth-first. The lists at the same depth are
+downloaded concurrently and each URL is downloaded at most once, so a list
+that is trusted by multiple lists, or that trusts a list that trusts it
+back, is only merged once. Trust relations that lead back to a list that
+trusts the list, directly or indirectly, are reported as cycles.
+
+The walk stops at a maximum depth and after a maximum number of lists. The
+lists are merged in the order of the walk, so the result does not depend
+on the order in which the downloads complete. Parsed lists are kept by the
+hash of their content, so a list that has not changed since an earlier
+resolve, or that is served from multiple URLs, is only parsed once. The
+lists are parsed in an executor, so the parsing of a list does not hold up
+the downloads of the other lists.
+
+    resolver = TrustResolver(max_depth=2)
+    resolved = asyncio.run(resolver.resolve_list(my_list))
+    for block_key, entry in resolved.mod_list.blocks.items():
+        print(block_key, resolved.provenance[block_key])
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import asyncio
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import field, dataclass
+from logging import Logger, getLogger
+
+import httpx
+
+from ruamel.yaml import YAMLError
+
+from tools.lib.lists import (
+    LIST_DOWNLOAD_CONCURRENCY,
+    LIST_DOWNLOAD_TIMEOUT,
+    ModerationEntry,
+    ModerationList,
+    UserEntry,
+)
+from tools.lib.list_cache import ListCache
+
+_LOGGER: Logger = getLogger(__name__)
+
+TRUST_MAX_DEPTH: int = 3
+TRUST_MAX_LISTS: int = 100
+
+
+@dataclass(slots=True)
+class TrustedList:
+    url: str
+    # The number of trust relations from the root list, which has depth 0
+    depth: int
+    # The URL of the list that the list was first found in the trust list
+    # of, None for the root list
+    trusted_by: str | None
+    content_hash: str | None
+    mod_list: ModerationList
+
+
+@dataclass(slots=True)
+class ResolvedTrust:
+    # The merged entries of all lists, with the meta data of the root list
+    mod_list: ModerationList
+    # The lists that were merged, in the order they were merged in
+    lists: list[TrustedList] = field(default_factory=list)
+    # The URLs of the lists that each entry of the merged list came from
+    provenance: dict[str, list[str]] = field(default_factory=dict)
+    # The (list, trusted list) URLs of the trust relations that lead back
+    # to a list that trusts the list
+    cycles: list[tuple[str, str]] = field(default_factory=list)
+    # The URLs of the lists that were not downloaded because of the depth
+    # or the list budget
+    skipped: list[str] = field(default_factory=list)
+    # The error for each list that could not be downloaded or parsed
+    errors: dict[str, str] = field(default_factory=dict)
+
+
+class ProvenanceIndex:
+    def __init__(self) -> None:
+        '''
+        Keeps track of the lists that the entries of a merged list came
+        from. Like the ListIndex of tools/lib/query.py, it is registered in
+        the indexes of the list, so it follows the entries when add_block()
+        merges them.
+        '''
+
+        # The URL of the list that entries are being added from
+        self.source: str | None = None
+        self.sources: dict[str, list[str]] = {}
+
+        # The keys of the entries that add_block() merged into the entry
+        # that it updates next
+        self._merged_keys: list[str] = []
+
+    def update_block(self, block_key: str, entry: ModerationEntry) -> None:
+        urls: list[str] = self.sources.setdefault(block_key, [])
+        merged_key: str
+        for merged_key in self._merged_keys:
+            url: str
+            for url in self.sources.pop(merged_key, []):
+                if url not in urls:
+                    urls.append(url)
+        self._merged_keys = []
+
+        if self.source not in urls:
+            urls.append(self.source)
+
+    def remove_block(self, block_key: str) -> None:
+        self._merged_keys.append(block_key)
+
+
+class TrustResolver:
+    def __init__(self, max_depth: int = TRUST_MAX_DEPTH,
+                 max_lists: int = TRUST_MAX_LISTS,
+                 concurrency: int = LIST_DOWNLOAD_CONCURRENCY,
+                 timeout: float = LIST_DOWNLOAD_TIMEOUT,
+                 transport: httpx.AsyncBaseTransport | None = None,
+                 workers: int | None = None) -> None:
+        '''
+        Resolves trust lists into effective block lists
+
+        :param max_depth: The maximum number of trust relations to follow
+        from the root list
+        :param max_lists: The maximum number of trusted lists to download
+        :param concurrency: The maximum number of concurrent downloads
+        :param timeout: Timeout in seconds for each download
+        :param transport: The transport for the HTTP client, for example
+        to serve lists from memory
+        :param workers: The number of worker processes to parse the lists
+        in. Without workers, the lists are parsed in the default executor
+        of the event loop
+        '''
+
+        if max_depth < 0 or max_lists < 0:
+            raise ValueError('The depth and list budgets must not be negative')
+        if concurrency < 1:
+            raise ValueError('Concurrency must be at least 1')
+        if workers is not None and workers < 1:
+            raise ValueError('Workers must be at least 1')
+
+        self.max_depth: int = max_depth
+        self.max_lists: int = max_lists
+        self.concurrency: int = concurrency
+        self.timeout: float = timeout
+        self.transport: httpx.AsyncBaseTransport | None = transport
+        self.workers: int | None = workers
+
+        # The parsed lists, by the hash of their content. They are kept
+        # between calls of resolve() and must not be modified
+        self.parsed: dict[str, ModerationList] = {}
+        self.parse_count: int = 0
+
+        # The lists that are being parsed, by the hash of their content, so
+        # that content downloaded from multiple URLs is parsed once
+        self._parsing: dict[str, asyncio.Future[ModerationList]] = {}
+
+    async def resolve(self, url: str) -> ResolvedTrust:
+        '''
+        Downloads a list and resolves its trust list
+
+        :param url: The URL of the list
+        :returns: the merged list with the provenance of its entries
+        :raises: httpx.HTTPError, ValueError or YAMLError if the list can
+        not be downloaded or parsed
+        '''
+
+        executor: Executor | None = self._executor()
+        try:
+            async with self._client() as client:
+                content_hash: str
+                mod_list: ModerationList
+                content_hash, mod_list = await self._fetch(
+                    client, asyncio.Semaphore(1), executor, url
+                )
+                root = TrustedList(
+                    url=url, depth=0, trusted_by=None,
+                    content_hash=content_hash, mod_list=mod_list
+                )
+
+                return await self._resolve(client, executor, root)
+        finally:
+            if executor:
+                executor.shutdown()
+
+    async def resolve_list(self, mod_list: ModerationList,
+                           url: str | None = None) -> ResolvedTrust:
+        '''
+        Resolves the trust list of a list that is already loaded
+
+        :param mod_list: The list
+        :param url: The URL of the list, to use in the provenance and to
+        detect trust relations back to the list. Defaults to the download
+        URL of the list
+        :returns: the merged list with the provenance of its entries
+        '''
+
+        url = url or mod_list.download_url
+        if not url:
+            raise ValueError('The URL of the list is not known')
+
+        root = TrustedList(
+            url=url, depth=0, trusted_by=None, content_hash=None,
+            mod_list=mod_list
+        )
+        executor: Executor | None = self._executor()
+        try:
+            async with self._client() as client:
+                return await self._resolve(client, executor, root)
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def _executor(self) -> Executor | None:
+        if not self.workers:
+            return None
+
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def _client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency
+        )
+
+        return httpx.AsyncClient(
+            timeout=self.timeout, limits=limits, transport=self.transport
+        )
+
+    async def _resolve(self, client: httpx.AsyncClient,
+                       executor: Executor | None, root: TrustedList
+                       ) -> ResolvedTrust:
+        '''
+        Walks the trust graph from the root list, one depth at a time
+        '''
+
+        resolved = ResolvedTrust(mod_list=TrustResolver._empty_list(root))
+        resolved.lists.append(root)
+
+        # The URLs that were found so far, with the URL of the list they
+        # were first found in, to find the lists that trust a list
+        parents: dict[str, str | None] = {root.url: None}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        # The (trusted URL, trusting URL) tuples to download at the next
+        # depth, in the order of the trust lists
+        frontier: list[tuple[str, str]] = TrustResolver._trusted_urls(root)
+        depth: int = 1
+        downloads: int = 0
+        while frontier:
+            pending: list[tuple[str, str]] = []
+            url: str
+            trusted_by: str
+            for url, trusted_by in frontier:
+                if url in parents:
+                    if TrustResolver._trusts(parents, url, trusted_by):
+                        resolved.cycles.append((trusted_by, url))
+                    continue
+
+                parents[url] = trusted_by
+                if depth > self.max_depth or downloads >= self.max_lists:
+                    resolved.skipped.append(url)
+                    continue
+
+                pending.append((url, trusted_by))
+                downloads += 1
+
+            results: list[tuple[str, ModerationList] | BaseException] = \
+                await asyncio.gather(
+                    *(
+                        self._fetch(client, semaphore, executor, url)
+                        for url, _ in pending
+                    ),
+                    return_exceptions=True
+                )
+
+            frontier = []
+            result: tuple[str, ModerationList] | BaseException
+            for (url, trusted_by), result in zip(pending, results):
+                if isinstance(
+                        result, (httpx.HTTPError, ValueError, YAMLError)):
+                    _LOGGER.info(f'Failed to resolve trusted list {url}')
+                    resolved.errors[url] = str(result) or type(result).__name__
+                    continue
+                if isinstance(result, BaseException):
+                    raise result
+
+                trusted_list = TrustedList(
+                    url=url, depth=depth, trusted_by=trusted_by,
+                    content_hash=result[0], mod_list=result[1]
+                )
+                resolved.lists.append(trusted_list)
+                frontier.extend(TrustResolver._trusted_urls(trusted_list))
+
+            depth += 1
+
+        TrustResolver._merge(resolved)
+
+        return resolved
+
+    async def _fetch(self, client: httpx.AsyncClient,
+                     semaphore: asyncio.Semaphore, executor: Executor | None,
+                     url: str) -> tuple[str, ModerationList]:
+        '''
+        Downloads and parses a list, unless a list with the same content
+        was parsed before or is being parsed
+
+        :param executor: The executor to parse the list in, None for the
+        default executor of the event loop
+        :returns: the hash of the content of the list and the list
+        '''
+
+        async with semaphore:
+            resp: httpx.Response = await client.get(url)
+        if resp.status_code != 200:
+            raise ValueError(f'HTTP status {resp.status_code}')
+
+        raw_list: str = resp.text
+        content_hash: str = ListCache.content_hash(raw_list)
+        mod_list: ModerationList | None = self.parsed.get(content_hash)
+        if mod_list is not None:
+            _LOGGER.debug(f'List {url} was already parsed')
+            return content_hash, mod_list
+
+        parsing: asyncio.Future[ModerationList] | None = \
+            self._parsing.get(content_hash)
+        if parsing is not None:
+            _LOGGER.debug(f'List {url} is already being parsed')
+            return content_hash, await parsing
+
+        # Parsing is CPU-bound, so it is not run on the event loop
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        parsing = loop.run_in_executor(
+            executor, ModerationList.loads, raw_list
+        )
+        self._parsing[content_hash] = parsing
+        try:
+            mod_list = await parsing
+        finally:
+            del self._parsing[content_hash]
+
+        self.parsed[content_hash] = mod_list
+        self.parse_count += 1
+
+        return content_hash, mod_list
+
+    @staticmethod
+    def _trusted_urls(trusted_list: TrustedList) -> list[tuple[str, str]]:
+        user: UserEntry
+        return [
+            (user.url.strip(), trusted_list.url)
+            for user in trusted_list.mod_list.trusts
+            if user.url and user.url.strip()
+        ]
+
+    @staticmethod
+    def _trusts(parents: dict[str, str | None], url: str, trusted_by: str
+                ) -> bool:
+        '''
+        Checks whether the list with the URL trusts the list that trusts
+        it, through the lists that the lists were first found in
+        '''
+
+        ancestor: str | None = trusted_by
+        while ancestor is not None:
+            if ancestor == url:
+                return True
+            ancestor = parents[ancestor]
+
+        return False
+
+    @staticmethod
+    def _empty_list(root: TrustedList) -> ModerationList:
+        mod_list: ModerationList = root.mod_list
+        merged = ModerationList(
+            list_name=mod_list.list_name, author_name=mod_list.author_name,
+            author_email=mod_list.author_email,
+            author_url=mod_list.author_url, list_url=mod_list.list_url,
+            download_url=mod_list.download_url,
+            categories=dict(mod_list.categories),
+            last_updated=mod_list.last_updated
+        )
+        merged.disclaimer = mod_list.disclaimer
+        for user in mod_list.trusts:
+            merged.add_trust(user)
+
+        return merged
+
+    @staticmethod
+    def _merge(resolved: ResolvedTrust) -> None:
+        '''
+        Merges the entries of the lists in the order they were found in.
+        The entries are copied, as the parsed lists are kept for later
+        resolves.
+        '''
+
+        merged: ModerationList = resolved.mod_list
+        last_updated = merged.last_updated
+        provenance = ProvenanceIndex()
+        merged.indexes.append(provenance)
+
+        trusted_list: TrustedList
+        for trusted_list in resolved.lists:
+            mod_list: ModerationList = trusted_list.mod_list
+            provenance.source = trusted_list.url
+            for category, description in mod_list.categories.items():
+                merged.categories.setdefault(category, description)
+
+            entry: ModerationEntry
+            for entry in mod_list.blocks.values():
+                merged.add_block(ModerationEntry.from_dict(entry.as_dict()))
+
+            if mod_list.last_updated > last_updated:
+                last_updated = mod_list.last_updated
+
+        merged.indexes.remove(provenance)
+        merged.last_updated = last_updated
+        resolved.provenance = provenance.sources
@@ -0,0 +1,391 @@
+'''
+Imports the accounts that a user blocks on X into a moderation list
+
+The importer pages through the blocks/list.json endpoint of the X API with
+its cursor. Instead of sleeping a fixed time between requests, it uses the
+x-rate-limit-remaining and x-rate-limit-reset headers of the responses: it
+only waits when the rate limit of the current window is used up, or after a
+'429 Too Many Requests' response, and then until the window resets.
+
+Every page is appended to a checkpoint file, a JSON document per line with
+the cursor of the page, the cursor of the next page and the users on the
+page. An interrupted import resumes from the checkpoint: the users of the
+pages in the checkpoint are added to the list again and the import
+continues with the cursor after the last page. A partial last line, from
+an interruption while the line was written, is removed.
+
+The HTTP transport, the sleep function and the clock can be replaced, so
+that the importer can be run against a fake API without waiting.
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import time
+
+from typing import Callable
+from dataclasses import dataclass
+from logging import Logger, getLogger
+
+import httpx
+import orjson
+
+from tools.lib.lists import (
+    LIST_DOWNLOAD_TIMEOUT,
+    ModerationEntry,
+    ModerationList,
+    SocialAccount,
+)
+
+_LOGGER: Logger = getLogger(__name__)
+
+X_BLOCKS_URL: str = 'https://api.x.com/1.1/blocks/list.json'
+
+X_CHECKPOINT_FORMAT: str = 'byomod-x-blocks'
+X_CHECKPOINT_VERSION: int = 1
+
+# Seconds to wait after a 429 response without rate-limit headers
+X_RATE_LIMIT_FALLBACK_WAIT: float = 15.0
+# Seconds to wait after the reset time of the rate-limit window, as the
+# clocks of the client and the server may differ
+X_RATE_LIMIT_MARGIN: float = 1.0
+# Retries of a page after a 429 or 5xx response or a network error
+X_MAX_RETRIES: int = 5
+
+# The fields of the users that are kept in the checkpoint
+X_USER_FIELDS: tuple[str, ...] = (
+    'id_str', 'screen_name', 'name', 'followers_count', 'statuses_count'
+)
+
+
+def x_headers(bearer_token: str, csrf_token: str, auth_token: str
+              ) -> dict[str, str]:
+    '''
+    Gets the headers for the X API with the tokens of a logged-in session
+
+    :param bearer_token: The bearer token of the web client
+    :param csrf_token: The value of the 'ct0' cookie
+    :param auth_token: The value of the 'auth_token' cookie
+    '''
+
+    return {
+        'authorization': f'Bearer {bearer_token.removeprefix("Bearer ")}',
+        'cookie': f'ct0={csrf_token}; auth_token={auth_token}',
+        'x-csrf-token': csrf_token,
+    }
+
+
+@dataclass(slots=True)
+class XImportResult:
+    # The pages that were downloaded and the pages that were read from the
+    # checkpoint
+    pages: int
+    resumed_pages: int
+    users: int
+    requests: int
+    # The number of seconds that the importer waited for the rate limit
+    waited: float
+    # Whether the last page of blocks was reached
+    complete: bool
+
+
+class XBlockImporter:
+    def __init__(self, headers: dict[str, str],
+                 checkpoint: str | None = None, url: str = X_BLOCKS_URL,
+                 transport: httpx.BaseTransport | None = None,
+                 sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.time,
+                 timeout: float = LIST_DOWNLOAD_TIMEOUT,
+                 max_retries: int = X_MAX_RETRIES) -> None:
+        '''
+        Imports the blocked accounts of an X user
+
+        :param headers: The headers to authenticate with, see x_headers()
+        :param checkpoint: The file to keep the downloaded pages in, to
+        resume an interrupted import
+        :param url: The URL of the blocks/list.json endpoint
+        :param transport: The transport for the HTTP client
+        :param sleep: The function to wait with
+        :param clock: The function that gets the current time as a UNIX
+        timestamp, to compare with the reset time of the rate limit
+        :param timeout: Timeout in seconds for each request
+        :param max_retries: The maximum number of retries of a page
+        '''
+
+        self.headers: dict[str, str] = headers
+        self.checkpoint: str | None = checkpoint
+        self.url: str = url
+        self.transport: httpx.BaseTransport | None = transport
+        self.sleep: Callable[[float], None] = sleep
+        self.clock: Callable[[], float] = clock
+        self.timeout: float = timeout
+        self.max_retries: int = max_retries
+
+    def import_blocks(self, mod_list: ModerationList,
+                      categories: set[str] | None = None,
+                      languages: set[str] | None = None,
+                      max_pages: int | None = None) -> XImportResult:
+        '''
+        Adds the blocked accounts to a moderation list, one entry for each
+        account, resuming from the checkpoint if there is one
+
+        :param mod_list: The list to add the accounts to
+        :param categories: The categories of the entries, which are added
+        to the categories of the list
+        :param languages: The languages of the entries
+        :param max_pages: Stop after downloading this many pages
+        :returns: the result of the import
+        :raises: httpx.HTTPError if a page can not be downloaded
+        '''
+
+        categories = categories or set()
+        for category in sorted(categories):
+            if category not in mod_list.categories:
+                mod_list.categories[category] = ''
+
+        result = XImportResult(
+            pages=0, resumed_pages=0, users=0, requests=0, waited=0.0,
+            complete=False
+        )
+
+        cursor: int = -1
+        page: dict[str, any]
+        for page in self._read_checkpoint():
+            self._add_users(mod_list, page['users'], categories, languages)
+            result.resumed_pages += 1
+            result.users += len(page['users'])
+            cursor = page['next_cursor']
+
+        if not cursor:
+            result.complete = True
+            return result
+
+        if result.resumed_pages:
+            _LOGGER.info(
+                f'Resuming import of blocks after {result.resumed_pages} '
+                f'pages with {result.users} users'
+            )
+        elif self.checkpoint:
+            self._write_checkpoint(
+                {
+                    'format': X_CHECKPOINT_FORMAT,
+                    'version': X_CHECKPOINT_VERSION,
+                    'url': self.url,
+                },
+                truncate=True
+            )
+
+        # The time until which no requests can be made
+        wait_until: float | None = None
+        with httpx.Client(headers=self.headers, timeout=self.timeout,
+                          transport=self.transport) as client:
+            while cursor and (max_pages is None or result.pages < max_pages):
+                data: dict[str, any]
+                data, wait_until = self._get_page(
+                    client, cursor, wait_until, result
+                )
+                users: list[dict[str, any]] = [
+                    {key: user.get(key) for key in X_USER_FIELDS}
+                    for user in data.get('users') or []
+                ]
+                next_cursor: int = data.get('next_cursor') or 0
+                if self.checkpoint:
+                    self._write_checkpoint(
+                        {
+                            'cursor': cursor, 'next_cursor': next_cursor,
+                            'users': users,
+                        }
+                    )
+
+                self._add_users(mod_list, users, categories, languages)
+                result.pages += 1
+                result.users += len(users)
+                _LOGGER.debug(
+                    f'Received {len(users)} blocked users, '
+                    f'next cursor {next_cursor}'
+                )
+                cursor = next_cursor
+
+        result.complete = not cursor
+
+        return result
+
+    def _get_page(self, client: httpx.Client, cursor: int,
+                  wait_until: float | None, result: XImportResult
+                  ) -> tuple[dict[str, any], float | None]:
+        '''
+        Downloads a page of blocks, waiting for the rate limit and retrying
+        after 429 and 5xx responses and network errors
+
+        :returns: the data of the page and the time until which no more
+        requests can be made, or None if requests can be made right away
+        '''
+
+        retries: int = 0
+        while True:
+            if wait_until is not None:
+                self._wait(wait_until, result)
+                wait_until = None
+
+            result.requests += 1
+            resp: httpx.Response | None = None
+            try:
+                resp = client.get(
+                    self.url,
+                    params={
+                        'cursor': cursor, 'skip_status': 'true',
+                        'include_entities': 'false',
+                    }
+                )
+            except httpx.TransportError as exc:
+                _LOGGER.info(f'Failed to get blocks: {exc}')
+
+            if resp is not None and resp.status_code == 200:
+                return resp.json(), self._rate_limit_reset(resp)
+
+            if (resp is not None and resp.status_code != 429
+                    and resp.status_code < 500):
+                resp.raise_for_status()
+
+            retries += 1
+            if retries > self.max_retries:
+                if resp is None:
+                    raise httpx.TransportError(
+                        f'Failed to get blocks after {retries} attempts'
+                    )
+                resp.raise_for_status()
+
+            if resp is not None and resp.status_code == 429:
+                wait_until = self._rate_limit_reset(resp)
+                _LOGGER.info(
+                    f'Rate limited, waiting until {wait_until:.0f}'
+                )
+            else:
+                # Exponential backoff for server and network errors, unless
+                # the rate limit requires a longer wait
+                wait_until = self.clock() + 2 ** (retries - 1)
+                if resp is not None:
+                    wait_until = max(
+                        wait_until, self._rate_limit_reset(resp) or 0
+                    )
+
+    def _rate_limit_reset(self, resp: httpx.Response) -> float | None:
+        '''
+        Gets the time until which no requests can be made from the headers
+        of a response. After a 429 response, the Retry-After header takes
+        precedence over the reset time of the rate-limit window, as the
+        request may have been limited for other reasons than the window,
+        unless the window has no requests left.
+
+        :returns: the time or None if requests can be made right away
+        '''
+
+        remaining: int | None = _int_header(resp, 'x-rate-limit-remaining')
+        reset: int | None = _int_header(resp, 'x-rate-limit-reset')
+        if resp.status_code != 429:
+            if remaining == 0 and reset is not None:
+                return reset + X_RATE_LIMIT_MARGIN
+
+            return None
+
+        retry_after: int | None = _int_header(resp, 'retry-after')
+        if retry_after is not None:
+            wait_until: float = self.clock() + retry_after
+            if remaining == 0 and reset is not None:
+                wait_until = max(wait_until, reset + X_RATE_LIMIT_MARGIN)
+
+            return wait_until
+
+        if reset is not None:
+            return reset + X_RATE_LIMIT_MARGIN
+
+        return self.clock() + X_RATE_LIMIT_FALLBACK_WAIT
+
+    def _wait(self, wait_until: float, result: XImportResult) -> None:
+        delay: float = wait_until - self.clock()
+        if delay > 0:
+            _LOGGER.debug(f'Waiting {delay:.1f}s for the rate limit')
+            self.sleep(delay)
+            result.waited += delay
+
+    @staticmethod
+    def _add_users(mod_list: ModerationList, users: list[dict[str, any]],
+                   categories: set[str], languages: set[str] | None
+                   ) -> None:
+        '''
+        Adds an entry for each user. X display names are not split into
+        first and last names, so the entries only have the X account.
+        '''
+
+        user: dict[str, any]
+        for user in users:
+            handle: str | None = user.get('screen_name')
+            if not handle:
+                continue
+
+            entry = ModerationEntry(
+                first_name=None, last_name=None, business_name=None,
+                business_type=None, languages=languages or set(),
+                categories=set(categories), annotations=[], urls=[]
+            )
+            entry.add_social_account(
+                SocialAccount(
+                    'twitter', handle, f'https://x.com/{handle}',
+                    followers=user.get('followers_count'),
+                    assets=user.get('statuses_count'), is_primary=True
+                )
+            )
+            mod_list.add_block(entry)
+
+    def _read_checkpoint(self) -> list[dict[str, any]]:
+        '''
+        Reads the pages in the checkpoint. A partial last line is removed
+        from the file, so that the next page is appended after the last
+        complete page.
+
+        :returns: the pages, in the order they were downloaded
+        :raises: ValueError if the checkpoint is for another endpoint
+        '''
+
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return []
+
+        with open(self.checkpoint, 'rb+') as file_desc:
+            data: bytes = file_desc.read()
+            if data and not data.endswith(b'\n'):
+                _LOGGER.warning(
+                    f'Removing partial page from {self.checkpoint}'
+                )
+                data = data[:data.rfind(b'\n') + 1]
+                file_desc.truncate(len(data))
+
+        lines: list[bytes] = data.splitlines()
+        if not lines:
+            return []
+
+        header: dict[str, any] = orjson.loads(lines[0])
+        if (header.get('format') != X_CHECKPOINT_FORMAT
+                or header.get('version') != X_CHECKPOINT_VERSION):
+            raise ValueError(f'{self.checkpoint} is not an X checkpoint')
+        if header.get('url') != self.url:
+            raise ValueError(
+                f'{self.checkpoint} is a checkpoint for {header.get("url")}'
+            )
+
+        return [orjson.loads(line) for line in lines[1:]]
+
+    def _write_checkpoint(self, data: dict[str, any], truncate: bool = False
+                          ) -> None:
+        with open(self.checkpoint, 'wb' if truncate else 'ab') as file_desc:
+            file_desc.write(orjson.dumps(data) + b'\n')
+            file_desc.flush()
+            os.fsync(file_desc.fileno())
+
+
+def _int_header(resp: httpx.Response, name: str) -> int | None:
+    try:
+        return int(resp.headers[name])
+    except (KeyError, ValueError):
+        return None
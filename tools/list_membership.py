@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+'''
+Answers questions about the lists in a list-of-lists with the index of
+their accounts, which tools/augment_lists.py updates with --index
+
+To find the lists that have an account, with the categories that each
+list assigns to it:
+    pipenv run python tools/list_membership.py --index list-index.json \
+        --platform twitter --handle https://x.com/someone
+
+To show how much each pair of lists overlaps:
+    pipenv run python tools/list_membership.py --index list-index.json \
+        --overlap
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import sys
+import logging
+import argparse
+
+from logging import Logger, getLogger
+
+from tools.lib.list_index import CrossListIndex
+
+
+_LOGGER: Logger = getLogger(__name__)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--index', '-i', type=str, required=True)
+    parser.add_argument('--platform', '-p', type=str, default=None)
+    parser.add_argument(
+        '--handle', type=str, default=None,
+        help='The handle or the URL of the account'
+    )
+    parser.add_argument(
+        '--overlap', action='store_true',
+        help='Show the number of accounts that each pair of lists share'
+    )
+    args: argparse.Namespace = parser.parse_args(sys.argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if not args.overlap and not (args.platform and args.handle):
+        parser.error('Use --platform and --handle, or --overlap')
+
+    index = CrossListIndex(args.index)
+
+    if args.platform and args.handle:
+        lists: dict[str, list[str]] = index.find(args.platform, args.handle)
+        for url, categories in lists.items():
+            print(f'{url}: {", ".join(categories) or "no categories"}')
+        print(f'{args.handle} is on {len(lists)} of {len(index.lists)} lists')
+
+    if args.overlap:
+        sizes: dict[str, int] = index.list_sizes()
+        for (url, other_url), shared in index.overlaps().items():
+            union: int = sizes[url] + sizes[other_url] - shared
+            print(
+                f'{url} ({sizes[url]} accounts) and {other_url} '
+                f'({sizes[other_url]} accounts): {shared} shared, '
+                f'Jaccard similarity {shared / union:.3f}'
+            )
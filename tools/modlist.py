@@ -20,6 +20,51 @@
 #
 # In any case, ping me about your list so I can include it in the list-of-lists
 # at https://byomod.org/lists/list-of-lists.json
+#
+# When you regenerate a large list often, you can keep a snapshot of the list,
+# which loads and saves much faster than YAML, and only write the YAML file
+# when you want to publish it:
+#     pipenv run python tools/modlist.py --workbook my_blocklist.csv \
+#         --snapshot my_blocklist.json --no-yaml
+#
+# Large CSV files can be read by multiple processes, which gives the same
+# list as reading the file in a single process:
+#     pipenv run python tools/modlist.py --workbook my_blocklist.csv \
+#         --workers 4
+#
+# With --incremental, the fingerprints of the rows are saved next to the list
+# and the next run only processes the rows that were added or changed. The
+# fingerprints are kept next to the store or the snapshot if one is used, and
+# otherwise next to the YAML file, which must then also be the output file:
+#     pipenv run python tools/modlist.py --workbook my_blocklist.csv \
+#         --incremental
+#
+# Subscribers can update their copy of the list with only the changes since
+# the version they have, by publishing the list to a delta feed:
+#     pipenv run python tools/modlist.py --workbook my_blocklist.csv \
+#         --deltas my_blocklist-deltas --max-deltas 30
+#
+# To upload the list to a static host, --publish writes a copy of the list
+# with the hash of its content in its name, compressed variants of it and a
+# publish.json file that points to them:
+#     pipenv run python tools/modlist.py --workbook my_blocklist.csv \
+#         --publish public/lists
+#
+# The extension only needs the handles on each platform and their categories,
+# which --lookup exports as a small lookup table per platform. With --publish,
+# the lookup tables are published as well:
+#     pipenv run python tools/modlist.py --workbook my_blocklist.csv \
+#         --lookup my_blocklist-lookup
+#
+# A large list can be kept in a SQLite database with --store. The list is
+# imported into the database on the first run. After that, only the rows of
+# the workbook are loaded and merged into the database, and the YAML file is
+# exported from the database unless --no-yaml is used. The database keeps the
+# YAML of each entry, so the export only converts the entries that changed.
+# --snapshot, --deltas and --lookup need the whole list, which is then loaded
+# from the database:
+#     pipenv run python tools/modlist.py --workbook my_blocklist.csv \
+#         --store my_blocklist.db --incremental
 
 import os
 import sys
@@ -31,6 +76,10 @@ from logging import Logger, getLogger
 from tools.lib.lists import (
     ModerationList,
 )
+from tools.lib.fingerprints import RowFingerprints
+from tools.lib.deltas import DeltaFeed
+from tools.lib.publish import Publisher
+from tools.lib.store import ListStore
 
 
 _LOGGER: Logger = getLogger(__name__)
@@ -42,6 +91,19 @@ TEST_CSV: str = f'{FILE_DIR}/content-moderation - CSV.csv'
 TEST_YAML = 'tests/collateral/dathes.yaml'
 
 
+def new_list() -> ModerationList:
+    return ModerationList(
+        list_name='TBD',
+        author_name='TBD',
+        author_email='TBD',
+        author_url='TBD',
+        list_url='TBD',
+        download_url='TBD',
+        categories={},
+        last_updated=None,
+    )
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--yaml', '-y', type=str, default=TEST_YAML)
@@ -49,30 +111,143 @@ if __name__ == '__main__':
         '--workbook', '-w', type=str, default=TEST_EXCEL
     )
     parser.add_argument('--output', '-o', type=str, default=None)
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Number of processes to read a CSV file with'
+    )
+    parser.add_argument(
+        '--snapshot', '-s', type=str, default=None,
+        help='Snapshot of the list to load, if it exists, and to save'
+    )
+    parser.add_argument(
+        '--no-yaml', action='store_true',
+        help='Only save the snapshot, not the YAML file'
+    )
+    parser.add_argument(
+        '--incremental', '-i', action='store_true',
+        help='Only process the rows of the workbook that changed since the '
+        'previous run with this option'
+    )
+    parser.add_argument(
+        '--deltas', '-d', type=str, default=None,
+        help='Directory of the delta feed to publish the list to'
+    )
+    parser.add_argument(
+        '--max-deltas', type=int, default=0,
+        help='Combine the oldest deltas in the feed to keep at most this '
+        'number of deltas'
+    )
+    parser.add_argument(
+        '--publish', '-p', type=str, default=None,
+        help='Directory to publish the list to, with content-hashed and '
+        'compressed files'
+    )
+    parser.add_argument(
+        '--lookup', '-l', type=str, default=None,
+        help='Directory to export the lookup tables of the list to'
+    )
+    parser.add_argument(
+        '--store', type=str, default=None,
+        help='SQLite database to keep the list in'
+    )
     args: argparse.Namespace = parser.parse_args(sys.argv[1:])
     if args.output is None:
         args.output = args.yaml
+    if args.no_yaml and not args.snapshot and not args.store:
+        parser.error('--no-yaml requires --snapshot or --store')
+    if (args.incremental and not args.snapshot and not args.store
+            and args.output != args.yaml):
+        parser.error(
+            '--incremental requires --snapshot or --store when --output '
+            'differs from --yaml'
+        )
 
     logging.basicConfig(level=logging.INFO)
 
+    store: ListStore | None = None
+    if args.store:
+        store = ListStore(args.store)
+
+    # The fingerprints of the rows are kept next to the list that the rows
+    # are added to and that the next run loads. If that list does not exist,
+    # the rows of the previous run are not in the list that is loaded
+    fingerprints: RowFingerprints | None = None
+    if args.incremental:
+        list_file: str = args.store or args.snapshot or args.yaml
+        fingerprints = RowFingerprints(f'{list_file}.rows.json')
+        if not (store.has_list() if store else os.path.exists(list_file)):
+            fingerprints.clear()
+
     mod: ModerationList
-    if os.path.exists(args.yaml):
+    if store and store.has_list():
+        # The rows of the workbook are merged into the list in the store
+        mod = new_list()
+    elif args.snapshot and os.path.exists(args.snapshot):
+        mod = ModerationList.load(args.snapshot, fmt='snapshot')
+    elif os.path.exists(args.yaml):
         mod = ModerationList.load(args.yaml)
     else:
         _LOGGER.info(f'Creating a new moderation list: {args.output}')
-        mod = ModerationList(
-            list_name='TBD',
-            author_name='TBD',
-            author_email='TBD',
-            author_url='TBD',
-            download_url='TBD',
-            categories=[],
-        )
+        mod = new_list()
+
+    if store and not store.has_list():
+        _LOGGER.info(f'Importing the moderation list into {args.store}')
+        store.import_list(mod)
+        mod = new_list()
 
     extension: str = os.path.splitext(args.workbook)[-1]
     if extension in ('.xlsx', '.xls'):
-        mod.add_excel(args.workbook)
+        mod.add_excel(args.workbook, fingerprints=fingerprints)
     if extension in ('.csv'):
-        mod.add_csv(args.workbook)
+        mod.add_csv(
+            args.workbook, workers=args.workers, fingerprints=fingerprints
+        )
+
+    if fingerprints:
+        _LOGGER.info(
+            f'Processed {fingerprints.changed_rows} new or changed rows out '
+            f'of {fingerprints.rows} rows'
+        )
+        # Entries are not removed from the list when their row is removed
+        # from the workbook
+        for identity in fingerprints.removed():
+            _LOGGER.warning(f'Row removed from the workbook: {identity}')
+
+    if store:
+        store.merge(mod)
+        if not args.no_yaml:
+            store.export(args.output, fmt='yaml')
+        if args.snapshot or args.deltas or args.lookup:
+            mod = store.to_list()
+        store.close()
+    elif not args.no_yaml:
+        mod.save(args.output, fmt='yaml')
+
+    if args.snapshot:
+        mod.save(args.snapshot, fmt='snapshot')
+    if fingerprints:
+        fingerprints.save()
+
+    if args.deltas:
+        if not os.path.exists(args.deltas):
+            os.makedirs(args.deltas)
+        feed: DeltaFeed = DeltaFeed(args.deltas)
+        feed.publish(mod)
+        feed.compact(args.max_deltas)
+
+    lookup_files: dict[str, str] = {}
+    if args.lookup:
+        if not os.path.exists(args.lookup):
+            os.makedirs(args.lookup)
+        lookup_files = mod.export_lookup(args.lookup)
 
-    mod.save(args.output)
+    if args.publish:
+        if not os.path.exists(args.publish):
+            os.makedirs(args.publish)
+        publisher: Publisher = Publisher(args.publish)
+        if not args.no_yaml:
+            publisher.publish(args.output)
+        if args.snapshot:
+            publisher.publish(args.snapshot)
+        for filename in lookup_files.values():
+            publisher.publish(filename)
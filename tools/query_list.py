@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+'''
+Queries the social accounts of a moderation list
+
+Values of the same option are combined with 'or', different options with
+'and'. To find the active Twitter accounts of politicians in the
+conspiracy category, with more than 10000 followers:
+
+    pipenv run python tools/query_list.py --yaml my_blocklist.yaml \
+        --platform twitter --status active --category conspiracy \
+        --annotation politician --min-followers 10000 --sort followers
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import sys
+import logging
+import argparse
+
+from logging import Logger, getLogger
+
+import orjson
+
+from tools.lib.lists import ModerationList
+from tools.lib.query import (
+    QUERY_DEFAULT_LIMIT,
+    And,
+    Or,
+    Annotation,
+    Category,
+    Followers,
+    Language,
+    ListIndex,
+    Platform,
+    Predicate,
+    QueryPage,
+    Status,
+)
+
+
+_LOGGER: Logger = getLogger(__name__)
+
+TEST_YAML: str = 'tests/collateral/dathes.yaml'
+
+
+def build_predicate(args: argparse.Namespace) -> Predicate | None:
+    predicates: list[Predicate] = []
+
+    option: str
+    predicate_class: type
+    for option, predicate_class in (
+            ('category', Category), ('language', Language),
+            ('platform', Platform), ('status', Status),
+            ('annotation', Annotation)):
+        values: list[str] = getattr(args, option) or []
+        if values:
+            predicates.append(
+                Or(*(predicate_class(value) for value in values))
+            )
+
+    if args.exclude_category:
+        predicates.append(
+            ~Or(*(Category(value) for value in args.exclude_category))
+        )
+
+    if args.min_followers is not None or args.max_followers is not None:
+        predicates.append(Followers(args.min_followers, args.max_followers))
+
+    if not predicates:
+        return None
+
+    return And(*predicates)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--yaml', '-y', type=str, default=TEST_YAML,
+        help='The moderation list, as YAML or as snapshot'
+    )
+    parser.add_argument('--category', '-c', action='append')
+    parser.add_argument('--exclude-category', action='append')
+    parser.add_argument('--language', '-l', action='append')
+    parser.add_argument('--platform', '-p', action='append')
+    parser.add_argument('--status', '-s', action='append')
+    parser.add_argument(
+        '--annotation', '-a', action='append',
+        help='politician or journalist'
+    )
+    parser.add_argument('--min-followers', type=int, default=None)
+    parser.add_argument('--max-followers', type=int, default=None)
+    parser.add_argument('--sort', choices=['followers'], default=None)
+    parser.add_argument('--offset', type=int, default=0)
+    parser.add_argument('--limit', type=int, default=QUERY_DEFAULT_LIMIT)
+    parser.add_argument(
+        '--json', action='store_true', help='Print the results as JSON'
+    )
+    args: argparse.Namespace = parser.parse_args(sys.argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+
+    mod_list: ModerationList = ModerationList.load(args.yaml)
+    index = ListIndex(mod_list)
+    predicate: Predicate | None = build_predicate(args)
+    page: QueryPage = index.query(
+        predicate, offset=args.offset, limit=args.limit, sort=args.sort
+    )
+
+    if args.json:
+        print(
+            orjson.dumps(
+                {
+                    'query': repr(predicate),
+                    'total': page.total,
+                    'offset': page.offset,
+                    'next_offset': page.next_offset,
+                    'results': [
+                        {
+                            'name': result.entry.get_name(),
+                            'followers': result.followers,
+                        } | result.account.as_dict()
+                        for result in page.results
+                    ],
+                },
+                option=orjson.OPT_INDENT_2
+            ).decode('utf-8')
+        )
+    else:
+        for result in page.results:
+            print(
+                f'{result.entry.get_name()}: '
+                f'{result.account.platform.name} {result.account.url} '
+                f'({result.account.status}, followers: {result.followers})'
+            )
+        print(
+            f'{len(page.results)} of {page.total} accounts, '
+            f'offset {page.offset}, next offset {page.next_offset}'
+        )
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+'''
+Resolves the trust list of a moderation list into the effective block list,
+with the entries of the list and of the lists that it trusts, directly or
+indirectly
+
+To resolve the trust list of a local list and save the merged list, with
+the URLs of the lists that each of its entries came from:
+    pipenv run python tools/resolve_trust.py --yaml my_blocklist.yaml \
+        --output effective.yaml --provenance provenance.json --max-depth 2
+
+To resolve the trust list of a published list:
+    pipenv run python tools/resolve_trust.py \
+        --url https://byomod.org/lists/dathes.yaml
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import os
+import sys
+import asyncio
+import logging
+import argparse
+
+from logging import Logger, getLogger
+
+import orjson
+
+from tools.lib.lists import ModerationList
+from tools.lib.lists import LIST_DOWNLOAD_CONCURRENCY
+from tools.lib.trust import (
+    TRUST_MAX_DEPTH,
+    TRUST_MAX_LISTS,
+    ResolvedTrust,
+    TrustResolver,
+)
+
+
+_LOGGER: Logger = getLogger(__name__)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--yaml', '-y', type=str, default=None,
+        help='The moderation list, as YAML or as snapshot'
+    )
+    parser.add_argument(
+        '--url', '-u', type=str, default=None,
+        help='The URL of the moderation list. With --yaml, the URL is used '
+        'instead of the download URL of the list'
+    )
+    parser.add_argument('--max-depth', type=int, default=TRUST_MAX_DEPTH)
+    parser.add_argument('--max-lists', type=int, default=TRUST_MAX_LISTS)
+    parser.add_argument(
+        '--concurrency', type=int, default=LIST_DOWNLOAD_CONCURRENCY,
+        help='Maximum number of lists to download concurrently'
+    )
+    parser.add_argument(
+        '--output', '-o', type=str, default=None,
+        help='File to save the merged list to, as YAML or as snapshot'
+    )
+    parser.add_argument(
+        '--provenance', '-p', type=str, default=None,
+        help='JSON file to save the lists that each entry came from to'
+    )
+    args: argparse.Namespace = parser.parse_args(sys.argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if not args.yaml and not args.url:
+        parser.error('Use --yaml or --url')
+
+    resolver = TrustResolver(
+        max_depth=args.max_depth, max_lists=args.max_lists,
+        concurrency=args.concurrency
+    )
+    resolved: ResolvedTrust
+    if args.yaml:
+        resolved = asyncio.run(
+            resolver.resolve_list(ModerationList.load(args.yaml), args.url)
+        )
+    else:
+        resolved = asyncio.run(resolver.resolve(args.url))
+
+    for trusted_list in resolved.lists:
+        trusted_by: str = ''
+        if trusted_list.trusted_by:
+            trusted_by = f', trusted by {trusted_list.trusted_by}'
+        print(
+            f'{trusted_list.url}: depth {trusted_list.depth}, '
+            f'{len(trusted_list.mod_list)} entries{trusted_by}'
+        )
+    for url, trusted_url in resolved.cycles:
+        print(f'Cycle: {url} trusts {trusted_url}')
+    for url in resolved.skipped:
+        print(f'Skipped: {url}')
+    for url, error in resolved.errors.items():
+        print(f'Failed: {url}: {error}')
+    print(f'{len(resolved.mod_list)} entries in the merged list')
+
+    if args.output:
+        resolved.mod_list.save(args.output)
+
+    if args.provenance:
+        with open(f'{args.provenance}.tmp', 'wb') as file_desc:
+            file_desc.write(
+                orjson.dumps(resolved.provenance, option=orjson.OPT_INDENT_2)
+            )
+        os.replace(f'{args.provenance}.tmp', args.provenance)
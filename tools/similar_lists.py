@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+'''
+Finds similar and duplicate lists in a list-of-lists with the sketches of
+their handles, which tools/augment_lists.py saves with --sketches
+
+To find the lists with the most handles in common with a list:
+    pipenv run python tools/similar_lists.py --sketches list-sketches.json \
+        --similar https://example.org/my_blocklist.yaml
+
+To find the pairs of lists that have mostly the same Twitter handles:
+    pipenv run python tools/similar_lists.py --sketches list-sketches.json \
+        --duplicates 0.9 --platform twitter
+
+:maintainer: Steven Hessing
+:copyright: Copyright 2024
+:licence: GPLv3.0
+'''
+
+import sys
+import logging
+import argparse
+
+from logging import Logger, getLogger
+
+from tools.lib.sketches import ListSketches, OverlapEstimate
+
+
+_LOGGER: Logger = getLogger(__name__)
+
+
+def describe(estimate: OverlapEstimate) -> str:
+    return (
+        f'Jaccard similarity {estimate.jaccard:.3f}, '
+        f'about {estimate.intersection:.0f} of {estimate.union:.0f} '
+        'handles shared'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sketches', '-s', type=str, required=True)
+    parser.add_argument(
+        '--platform', '-p', type=str, default=None,
+        help='Only compare the handles on this platform'
+    )
+    parser.add_argument(
+        '--similar', type=str, default=None,
+        help='The URL of the list to find similar lists for'
+    )
+    parser.add_argument('--count', '-c', type=int, default=10)
+    parser.add_argument(
+        '--duplicates', type=float, default=None,
+        help='Show the pairs of lists with at least this Jaccard similarity'
+    )
+    args: argparse.Namespace = parser.parse_args(sys.argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if not args.similar and args.duplicates is None:
+        parser.error('Use --similar or --duplicates')
+
+    list_sketches = ListSketches(args.sketches)
+
+    if args.similar:
+        if args.similar not in list_sketches.lists:
+            parser.error(f'No sketches for {args.similar}')
+
+        url: str
+        estimate: OverlapEstimate
+        for url, estimate in list_sketches.similar(
+                args.similar, args.count, args.platform):
+            print(f'{url}: {describe(estimate)}')
+
+    if args.duplicates is not None:
+        other_url: str
+        for url, other_url, estimate in list_sketches.duplicates(
+                args.duplicates, args.platform):
+            print(f'{url} and {other_url}: {describe(estimate)}')